@@ -1,6 +1,27 @@
 from django.contrib import admin
 
-from auth_app.models import CustomUser
+from auth_app import user_cache
+from auth_app.models import CustomUser, OutboundEmail
+
+
+@admin.action(description='Deactivate selected users')
+def deactivate_users(modeladmin, request, queryset):
+    # A plain queryset update would leave them signed in until their cached snapshot expires
+    count = user_cache.deactivate(queryset)
+    modeladmin.message_user(request, f'Deactivated {count} user(s)')
+
+
+class CustomUserAdmin(admin.ModelAdmin):
+    actions = [deactivate_users]
+
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to', 'subject', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status']
+    # Bodies carry OTPs and reset codes until they are sent
+    exclude = ['body']
+
 
 # Register your models here.
-admin.site.register([CustomUser])
\ No newline at end of file
+admin.site.register(CustomUser, CustomUserAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
@@ -0,0 +1,183 @@
+"""
+Async variants of the signup and OTP endpoints.
+
+``RegisterView``, ``OtpRequestView`` and ``ForgotPasswordView`` spend nearly
+all their time waiting on the database and the cache. These coroutine
+versions await the async ORM (``aget``, ``asave``, ``acreate_user``), the
+async cache API and ``aqueue_mail``, so under the ASGI application one
+worker keeps serving other requests while a signup waits on I/O. The
+responses are the same as the ``APIView`` versions.
+
+``auth_app.urls`` routes to them when ``AUTH_ASYNC_VIEWS`` is set. Under
+WSGI each call would need its own event loop, so it is off by default.
+Serializer validation can query the database (unique checks), so it runs
+through ``sync_to_async``.
+"""
+import json
+import logging
+import random
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from backend import throttling
+from auth_app.mail import aqueue_mail
+from auth_app.models import CustomUser
+from auth_app.serializers import ForgotPasswordSerializer, OTPRequestSerializer, UserRegisterSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def async_api_view(throttle_scope):
+    """
+    POST-only, CSRF-exempt like an ``APIView``, rejects bad JSON with 400, and
+    throttled like the ``APIView`` with the same ``throttle_scope``.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            if request.content_type == 'application/json':
+                try:
+                    request.data = json.loads(request.body or b'{}')
+                except ValueError:
+                    return JsonResponse({'detail': 'JSON parse error'}, status=400)
+            else:
+                request.data = request.POST
+            throttled = await sync_to_async(throttling.check)(request, throttle_scope, throttling.AUTH_THROTTLES)
+            if throttled is not None:
+                return throttled
+            return await view(request)
+        return csrf_exempt(require_POST(wrapper))
+    return decorator
+
+
+def new_otp():
+    return str(random.randint(100000, 999999))
+
+
+@async_api_view('register')
+async def register(request):
+    email = request.data.get('email')
+    try:
+        existing_user = await CustomUser.objects.aget(email=email)
+    except CustomUser.DoesNotExist:
+        existing_user = None
+
+    if existing_user is not None and existing_user.is_verified:
+        return JsonResponse({
+            'error': 'User with this email is already registered and verified'
+        }, status=400)
+
+    if existing_user is not None:
+        logger.info(f"Updating existing unverified user: {email}")
+    serializer = UserRegisterSerializer(existing_user, data=request.data, partial=existing_user is not None)
+    if not await sync_to_async(serializer.is_valid)():
+        if existing_user is not None:
+            logger.error(f"User update validation failed for {email}: {serializer.errors}")
+        else:
+            logger.error(f"User registration validation failed for {email}: {serializer.errors}")
+        return JsonResponse(serializer.errors, status=400)
+
+    data = serializer.validated_data
+    if existing_user is not None:
+        for attr, value in data.items():
+            setattr(existing_user, attr, value)
+        await existing_user.asave()
+        user = existing_user
+    else:
+        user = await CustomUser.objects.acreate_user(
+            email=data['email'],
+            username=data['username'],
+            password=None,
+        )
+
+    otp = new_otp()
+    await cache.aset(f'otp_{user.email}_register', otp, timeout=600)
+    status = 200 if existing_user is not None else 201
+    user_data = UserRegisterSerializer(user).data
+    try:
+        await aqueue_mail(
+            subject='Your OTP for Our Application',
+            message=f'Your OTP for registration is {otp}',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[user.email],
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue OTP email for user {user.email}: {str(e)}")
+        message = (
+            'User information updated, but failed to send OTP email' if existing_user is not None
+            else 'User registered, but failed to send OTP email'
+        )
+        return JsonResponse({'user': user_data, 'message': message}, status=status)
+
+    logger.info(f"OTP queued for user: {user.email}")
+    message = (
+        'User information updated. Please verify using OTP' if existing_user is not None
+        else 'User registration successful. Now verify using OTP'
+    )
+    return JsonResponse({'user': user_data, 'message': message}, status=status)
+
+
+@async_api_view('otp')
+async def otp_request(request):
+    serializer = OTPRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        logger.error(f"OTP request validation failed: {serializer.errors}")
+        return JsonResponse(serializer.errors, status=400)
+
+    email = serializer.validated_data['email']
+    if not await CustomUser.objects.filter(email=email).aexists():
+        logger.error(f"User not found for OTP request: {email}")
+        return JsonResponse({'error': 'User not found.'}, status=400)
+
+    otp = new_otp()
+    context = request.data.get('context', 'register')
+    await cache.aset(f'otp_{email}_{context}', otp, timeout=600)
+    subject = (
+        'Your OTP for Registration' if context == 'register'
+        else 'Your OTP for Password Reset'
+    )
+    try:
+        await aqueue_mail(
+            subject=subject,
+            message=f'Your OTP is: {otp}. It is valid for 10 minutes.',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[email],
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue OTP email for {context} to {email}: {str(e)}")
+        raise
+    logger.info(f"OTP queued for {context} to {email}")
+    return JsonResponse({'message': 'OTP sent to email.'})
+
+
+@async_api_view('forgot_password')
+async def forgot_password(request):
+    logger.info(f"Password reset request for email: {request.data.get('email')}")
+    serializer = ForgotPasswordSerializer(data=request.data)
+    if not serializer.is_valid():
+        logger.error(f"Password reset request validation failed: {serializer.errors}")
+        return JsonResponse(serializer.errors, status=400)
+
+    email = serializer.validated_data['email']
+    if not await CustomUser.objects.filter(email=email).aexists():
+        logger.error(f"User not found for password reset: {email}")
+        return JsonResponse({'error': 'User not found.'}, status=400)
+
+    otp = new_otp()
+    await cache.aset(f'otp_{email}_forgot_password', otp, timeout=600)
+    try:
+        await aqueue_mail(
+            subject='Your OTP for Password Reset',
+            message=f'Your OTP for password reset is: {otp}. It is valid for 10 minutes.',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[email],
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue password reset OTP for {email}: {str(e)}")
+        raise
+    logger.info(f"Password reset OTP queued for {email}")
+    return JsonResponse({'message': 'Password reset OTP sent to email.'})
@@ -1,5 +1,8 @@
+from functools import partial
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from . import user_cache
 
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -15,4 +18,11 @@ class CookieJWTAuthentication(JWTAuthentication):
         except InvalidToken as e:
             raise AuthenticationFailed('Invalid or expired token')
         except Exception as e:
-            raise AuthenticationFailed('Authentication failed')
\ No newline at end of file
+            raise AuthenticationFailed('Authentication failed')
+
+    def get_user(self, validated_token):
+        # Serve the user from the cache; only a miss pays the primary-key query
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        return user_cache.get_user(user_id, partial(super().get_user, validated_token))
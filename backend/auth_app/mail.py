@@ -0,0 +1,146 @@
+"""
+Outbound email queue.
+
+Views call ``queue_mail()`` instead of ``send_mail()``: it stores the message
+in the ``OutboundEmail`` outbox and returns at once. The ``send_queued_mail``
+management command drains the outbox with ``send_pending()``. It claims a
+batch of due messages, sends them over a single SMTP connection, and
+reschedules failures with exponential backoff until
+``EMAIL_QUEUE_MAX_ATTEMPTS`` is reached.
+
+Bodies hold OTPs and reset codes, so they are cleared once a message is sent
+or given up on. ``prune()`` deletes those finished rows after
+``EMAIL_QUEUE_RETENTION_DAYS``; the worker runs it every ``PRUNE_INTERVAL``.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# A message left in 'sending' this long belongs to a worker that died
+STALE_LOCK = timedelta(minutes=10)
+# How often a long-running send_queued_mail prunes finished messages
+PRUNE_INTERVAL = timedelta(hours=1)
+
+
+def _outbound(subject, message, from_email, recipient_list):
+    return OutboundEmail(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(recipient_list),
+    )
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Queue a plain-text email; same arguments as ``django.core.mail.send_mail``."""
+    email = _outbound(subject, message, from_email, recipient_list)
+    email.save(force_insert=True)
+    return email
+
+
+async def aqueue_mail(subject, message, from_email, recipient_list):
+    """Async ``queue_mail()``, for the views in ``auth_app.async_views``."""
+    email = _outbound(subject, message, from_email, recipient_list)
+    await email.asave(force_insert=True)
+    return email
+
+
+def claim_batch(batch_size):
+    """Mark up to ``batch_size`` due messages as sending and return them."""
+    now = timezone.now()
+    due = Q(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now) | Q(
+        status=OutboundEmail.STATUS_SENDING, locked_at__lt=now - STALE_LOCK
+    )
+    with transaction.atomic():
+        # skip_locked lets several workers drain the outbox side by side
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status=OutboundEmail.STATUS_SENDING, locked_at=now
+        )
+    return batch
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_pending(batch_size=50):
+    """Send one batch of due messages. Returns ``(sent, failed)`` counts."""
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open email connection: {str(e)}")
+        for email in batch:
+            _record_failure(email, e)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=email.to.split(','),
+                    connection=connection,
+                ).send()
+            except Exception as e:
+                failed += 1
+                _record_failure(email, e)
+            else:
+                sent += 1
+                _record_success(email)
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _record_success(email):
+    email.attempts += 1
+    email.status = OutboundEmail.STATUS_SENT
+    email.locked_at = None
+    email.sent_at = timezone.now()
+    email.body = ''
+    email.save(update_fields=['attempts', 'status', 'locked_at', 'sent_at', 'body'])
+    logger.info(f"Email {email.pk} sent to {email.to}")
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.locked_at = None
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        email.status = OutboundEmail.STATUS_FAILED
+        email.body = ''
+        logger.error(f"Giving up on email {email.pk} to {email.to}: {str(error)}")
+    else:
+        email.status = OutboundEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning(f"Email {email.pk} to {email.to} failed, will retry: {str(error)}")
+    email.save(update_fields=['attempts', 'status', 'locked_at', 'last_error', 'next_attempt_at', 'body'])
+
+
+def prune():
+    """Delete sent and failed messages older than ``EMAIL_QUEUE_RETENTION_DAYS``. Returns the count."""
+    cutoff = timezone.now() - timedelta(days=settings.EMAIL_QUEUE_RETENTION_DAYS)
+    deleted, _ = OutboundEmail.objects.filter(
+        status__in=[OutboundEmail.STATUS_SENT, OutboundEmail.STATUS_FAILED], created_at__lt=cutoff,
+    ).delete()
+    return deleted
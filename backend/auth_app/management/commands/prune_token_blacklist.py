@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from auth_app import revocation
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWT refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep running and prune every INTERVAL seconds',
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='First reload unexpired blacklisted tokens into the revocation cache',
+        )
+
+    def handle(self, *args, **options):
+        if options['warm']:
+            count = revocation.warm(batch_size=options['batch_size'])
+            self.stdout.write(f'Loaded {count} revoked token(s) into the cache')
+
+        while True:
+            total = 0
+            while True:
+                deleted = revocation.prune_expired(batch_size=options['batch_size'])
+                total += deleted
+                if deleted < options['batch_size']:
+                    break
+            if total:
+                self.stdout.write(f'Pruned {total} expired token(s)')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from auth_app import mail
+
+
+class Command(BaseCommand):
+    help = 'Send queued OTP and password reset emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep running and poll the outbox every INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        pruned_at = None
+        while True:
+            if pruned_at is None or timezone.now() - pruned_at >= mail.PRUNE_INTERVAL:
+                pruned = mail.prune()
+                pruned_at = timezone.now()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} finished email(s)')
+            sent, failed = mail.send_pending(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed')
+            if sent + failed == options['batch_size']:
+                # A full batch means more are probably due; don't wait
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
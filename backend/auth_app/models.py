@@ -1,13 +1,58 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 # Create your models here.
 class CustomUser(AbstractUser):
     username = models.CharField(max_length=100, blank=True, null= True, unique=True)
     email = models.EmailField(unique= True)
     is_verified = models.BooleanField(default=False)
+    # Denormalized count of blog_app.Follow rows naming this user as author;
+    # decides whether their posts are fanned out (blog_app.timelines)
+    follower_count = models.PositiveIntegerField(default=0)
     USERNAME_FIELD ='email'
     REQUIRED_FIELDS=[]
 
     def __str__(self):
         return self.email
-    
\ No newline at end of file
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Lets blog_app.signals tell whether a save changed what posts show
+        user._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return user
+
+class OutboundEmail(models.Model):
+    """A message waiting in the outbox for the send_queued_mail worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.TextField(help_text='Comma separated recipient addresses')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
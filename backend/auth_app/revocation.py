@@ -0,0 +1,94 @@
+"""
+Revoked refresh tokens, kept in the cache.
+
+simplejwt checks every refresh token against ``BlacklistedToken`` with a join
+on ``OutstandingToken``, and both tables only ever grow. Instead each
+blacklisted ``jti`` is written to the ``revoked`` cache alias with a timeout
+equal to the token's remaining lifetime, so the check is a single key lookup
+and the entry disappears once the token would have expired anyway.
+
+``RevocableRefreshToken`` uses that check. Entries are added by a
+``post_save`` handler on ``BlacklistedToken`` in ``auth_app.signals``. A
+token with no entry at all (never checked, evicted, or lost in a cache
+flush) is looked up in ``BlacklistedToken`` once and the answer cached, so
+an eviction can't let a revoked token through. ``manage.py
+prune_token_blacklist --warm`` preloads the entries after a flush. Removing
+a blacklist entry in the admin does not un-revoke the token until its cache
+entry expires.
+
+``prune_expired`` trims both tables down to tokens that are still valid.
+"""
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+cache = ConnectionProxy(caches, 'revoked')
+
+REVOKED_KEY = 'revoked_jti:{jti}'
+
+
+def revoke(jti, expires_at):
+    timeout = int((expires_at - aware_utcnow()).total_seconds()) + 1
+    if timeout > 0:
+        cache.set(REVOKED_KEY.format(jti=jti), 1, timeout=timeout)
+
+
+def is_revoked(jti, expires_at):
+    key = REVOKED_KEY.format(jti=jti)
+    revoked = cache.get(key)
+    if revoked is None:
+        revoked = int(BlacklistedToken.objects.filter(token__jti=jti).exists())
+        timeout = int((expires_at - aware_utcnow()).total_seconds()) + 1
+        if timeout > 0:
+            # add(), not set(): a revoke() landing after the lookup must win
+            cache.add(key, revoked, timeout=timeout)
+    return bool(revoked)
+
+
+def warm(batch_size=1000):
+    """Load every unexpired blacklisted token into the cache."""
+    tokens = BlacklistedToken.objects.filter(
+        token__expires_at__gt=aware_utcnow(),
+    ).values_list('token__jti', 'token__expires_at')
+    count = 0
+    for jti, expires_at in tokens.iterator(chunk_size=batch_size):
+        revoke(jti, expires_at)
+        count += 1
+    return count
+
+
+def prune_expired(batch_size=1000):
+    """
+    Delete up to ``batch_size`` expired outstanding tokens and their blacklist
+    rows. Returns the number of outstanding tokens deleted.
+
+    Tokens share one lifetime, so expired rows are the oldest ids. Walking the
+    primary key finds them without an index on ``expires_at``, and each batch
+    is its own short transaction so no lock is held for long.
+    """
+    ids = list(
+        OutstandingToken.objects.filter(expires_at__lte=aware_utcnow())
+        .order_by('pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    with transaction.atomic():
+        # BlacklistedToken rows go with them as one cascaded DELETE
+        OutstandingToken.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+class RevocableRefreshToken(RefreshToken):
+    """A ``RefreshToken`` whose blacklist check reads the cache, not the database."""
+
+    def check_blacklist(self):
+        expires_at = datetime_from_epoch(self.payload['exp'])
+        if is_revoked(self.payload[api_settings.JTI_CLAIM], expires_at):
+            raise TokenError(_('Token is blacklisted'))
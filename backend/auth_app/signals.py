@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import CustomUser
+from . import revocation, user_cache
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def revoke_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        revocation.revoke(instance.token.jti, instance.token.expires_at)
@@ -1,3 +1,468 @@
-from django.test import TestCase
+"""
+Endpoint performance regression suite for ``auth_app.urls``; see
+``blog_app.tests`` for the budgets, settings and report.
 
-# Create your tests here.
+Passwords are hashed with MD5 here. The production hasher is deliberately
+slow and would dominate the latency of every endpoint that sets or checks a
+password, hiding the regressions this suite is meant to catch.
+
+``UserCacheTests`` covers the cached ``request.user`` lookup and
+``RevocationTests`` the cached refresh token blacklist and its pruning.
+``MailQueueTests`` checks the outbox against Django's locmem email backend.
+``AsyncAuthViewTests`` repeats the signup and OTP checks against
+``auth_app.async_views``.
+"""
+import importlib
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+from django.conf import settings
+from django.core import mail as outbox
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from auth_app import async_views, mail, revocation, user_cache
+from auth_app import urls as auth_urls
+from auth_app.models import CustomUser, OutboundEmail
+from auth_app.views import LoginView
+from backend import urls as backend_urls
+from blog_app.tests import CacheTestCase, EndpointPerformanceTestCase, WRITE_LATENCY, seed
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthEndpointTests(EndpointPerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users, _ = seed()
+        cls.user = users[0]
+        cls.user.set_password('Password123')
+        cls.user.save()
+
+    def test_register(self):
+        self.measure(
+            'auth.register', self.client_for(), 'post', '/api/auth/register/', queries=5,
+            latency=WRITE_LATENCY, data={'email': 'new@example.invalid', 'username': 'newuser'},
+        )
+
+    def test_otp_request(self):
+        self.measure(
+            'auth.otp_request', self.client_for(), 'post', '/api/auth/otp/request/', queries=2,
+            latency=WRITE_LATENCY, data={'email': self.user.email},
+        )
+
+    def test_otp_verify(self):
+        cache.set(f'otp_{self.user.email}_register', '123456')
+        self.measure(
+            'auth.otp_verify', self.client_for(), 'post', '/api/auth/otp/verify/', queries=2,
+            latency=WRITE_LATENCY, runs=1, status=200,
+            data={'email': self.user.email, 'code': '123456', 'password': 'Password456'},
+        )
+
+    def test_login(self):
+        self.measure(
+            'auth.login', self.client_for(), 'post', '/api/auth/login/', queries=2,
+            latency=WRITE_LATENCY, data={'email': self.user.email, 'password': 'Password123'},
+        )
+
+    def test_logout(self):
+        client = self.client_for(self.user)
+        client.cookies['refresh_token'] = str(RefreshToken.for_user(self.user))
+        self.measure('auth.logout', client, 'post', '/api/auth/logout/', queries=8, latency=WRITE_LATENCY)
+
+    def test_profile(self):
+        self.measure('auth.profile', self.client_for(self.user), 'get', '/api/auth/profile/', queries=1)
+
+    def test_profile_update(self):
+        self.measure(
+            'auth.profile update', self.client_for(self.user), 'put', '/api/auth/profile/', queries=4,
+            latency=WRITE_LATENCY, data={'username': 'renamed'},
+        )
+
+    def test_bulk_deactivation_signs_out_cached_users(self):
+        client = self.client_for(self.user)
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 200)
+        user_cache.deactivate(type(self.user).objects.filter(pk=self.user.pk))
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 401)
+
+    def test_token_refresh(self):
+        client = self.client_for()
+        client.cookies['refresh_token'] = str(RefreshToken.for_user(self.user))
+        self.measure('auth.token_refresh', client, 'post', '/api/auth/token/refresh/', queries=1)
+
+    def test_revoked_token_stays_revoked_after_a_cache_flush(self):
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+        revocation.cache.clear()
+        client = self.client_for()
+        client.cookies['refresh_token'] = str(refresh)
+        self.assertEqual(client.post('/api/auth/token/refresh/').status_code, 401)
+
+    def test_forgot_password(self):
+        self.measure(
+            'auth.forgot_password', self.client_for(), 'post', '/api/auth/forgot-password/', queries=2,
+            latency=WRITE_LATENCY, data={'email': self.user.email},
+        )
+
+    def test_forgot_password_reset(self):
+        cache.set(f'otp_{self.user.email}_forgot_password', '654321')
+        self.measure(
+            'auth.forgot_password_reset', self.client_for(), 'post', '/api/auth/forgot-password/reset/',
+            queries=2, latency=WRITE_LATENCY, runs=1, status=200,
+            data={'email': self.user.email, 'code': '654321', 'password': 'Password789'},
+        )
+
+    @override_settings(THROTTLE_ENABLED=True)
+    def test_otp_request_throttled(self):
+        client = self.client_for()
+        for _ in range(5):
+            client.post('/api/auth/otp/request/', {'email': self.user.email})
+        response = self.measure(
+            'auth.otp_request throttled', client, 'post', '/api/auth/otp/request/', queries=0,
+            status=429, data={'email': self.user.email},
+        )
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(THROTTLE_ENABLED=True, REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'otp_ip': '2/min'},
+    })
+    def test_spoofed_forwarded_for_is_still_throttled_per_ip(self):
+        client = self.client_for()
+        responses = [
+            client.post(
+                '/api/auth/otp/request/', {'email': f'spoof{index}@example.invalid'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{index}',
+            )
+            for index in range(3)
+        ]
+        self.assertEqual(responses[-1].status_code, 429)
+
+    @override_settings(THROTTLE_ENABLED=True, REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'register_global': '2/min'},
+    })
+    def test_register_overloaded(self):
+        client = self.client_for()
+        for index in range(2):
+            client.post('/api/auth/register/', {'email': f'flood{index}@example.invalid', 'username': f'flood{index}'})
+        response = self.measure(
+            'auth.register overloaded', client, 'post', '/api/auth/register/', queries=0,
+            status=503, data={'email': 'flood@example.invalid', 'username': 'flood'},
+        )
+        self.assertGreater(int(response['Retry-After']), 0)
+
+
+class UserCacheTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='cached@example.invalid', username='cached', password='x')
+
+    def load(self):
+        load_user = mock.Mock(side_effect=lambda: CustomUser.objects.get(pk=self.user.pk))
+        return user_cache.get_user(self.user.pk, load_user), load_user
+
+    def test_second_lookup_is_served_from_the_cache(self):
+        _, load_user = self.load()
+        load_user.assert_called_once()
+        with self.assertNumQueries(0):
+            user, load_user = self.load()
+        load_user.assert_not_called()
+        self.assertEqual((user.pk, user.email, user.username), (self.user.pk, 'cached@example.invalid', 'cached'))
+        self.assertTrue(user.is_authenticated)
+
+    def test_deferred_fields_load_on_access_and_save_only_the_snapshot(self):
+        self.load()
+        user, _ = self.load()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.follower_count, 0)
+        CustomUser.objects.filter(pk=self.user.pk).update(first_name='Kept')
+        user, _ = self.load()
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(
+            CustomUser.objects.values_list('username', 'first_name').get(pk=self.user.pk), ('renamed', 'Kept'),
+        )
+
+    def test_saving_the_user_orphans_the_snapshot(self):
+        self.load()
+        CustomUser.objects.get(pk=self.user.pk).save()
+        user, load_user = self.load()
+        load_user.assert_called_once()
+
+    def test_inactive_snapshot_is_rejected(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.load()
+        with self.assertRaises(AuthenticationFailed):
+            self.load()
+
+
+class RevocationTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='revoked@example.invalid', username='revoked', password='x')
+
+    def refresh(self, refresh):
+        client = APIClient()
+        client.cookies['refresh_token'] = str(refresh)
+        return client.post('/api/auth/token/refresh/').status_code
+
+    def outstanding(self, jti, expires_at, blacklisted=False):
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token='x', created_at=expires_at - timedelta(days=1), expires_at=expires_at,
+        )
+        if blacklisted:
+            BlacklistedToken.objects.create(token=token)
+        return token
+
+    def test_revocation_is_checked_in_the_cache(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(refresh), 200)
+        refresh.blacklist()
+        with mock.patch.object(BlacklistedToken.objects, 'filter', wraps=BlacklistedToken.objects.filter) as lookup:
+            self.assertEqual(self.refresh(refresh), 401)
+        lookup.assert_not_called()
+
+    def test_prune_deletes_only_expired_tokens(self):
+        now = timezone.now()
+        for index in range(3):
+            self.outstanding(f'expired{index}', now - timedelta(minutes=index + 1), blacklisted=index % 2 == 0)
+        live = self.outstanding('live', now + timedelta(days=1), blacklisted=True)
+
+        out = StringIO()
+        call_command('prune_token_blacklist', '--batch-size', '2', stdout=out)
+        self.assertIn('Pruned 3 expired token(s)', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token', flat=True)), [live.pk])
+
+    def test_warm_reloads_unexpired_revocations(self):
+        now = timezone.now()
+        self.outstanding('expired', now - timedelta(minutes=1), blacklisted=True)
+        self.outstanding('live', now + timedelta(days=1), blacklisted=True)
+        self.outstanding('allowed', now + timedelta(days=1))
+        revocation.cache.clear()
+
+        out = StringIO()
+        call_command('prune_token_blacklist', '--warm', stdout=out)
+        self.assertIn('Loaded 1 revoked token(s) into the cache', out.getvalue())
+        self.assertEqual(revocation.cache.get(revocation.REVOKED_KEY.format(jti='live')), 1)
+        self.assertIsNone(revocation.cache.get(revocation.REVOKED_KEY.format(jti='allowed')))
+
+
+@override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=3, EMAIL_QUEUE_RETRY_DELAY=30)
+class MailQueueTests(TestCase):
+    def test_queued_mail_is_sent_once(self):
+        queued = mail.queue_mail('Your code', 'Code: 123456', None, ['to@example.invalid'])
+        self.assertEqual(len(outbox.outbox), 0)
+
+        self.assertEqual(mail.send_pending(), (1, 0))
+        self.assertEqual(len(outbox.outbox), 1)
+        self.assertEqual(outbox.outbox[0].subject, 'Your code')
+        self.assertEqual(outbox.outbox[0].to, ['to@example.invalid'])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(mail.send_pending(), (0, 0))
+        self.assertEqual(len(outbox.outbox), 1)
+
+    def test_failures_retry_with_backoff(self):
+        queued = mail.queue_mail('Your code', 'Code: 123456', None, ['to@example.invalid'])
+        with mock.patch('auth_app.mail.EmailMessage.send', side_effect=SMTPException('busy')):
+            self.assertEqual(mail.send_pending(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, 'busy')
+        delay = queued.next_attempt_at - timezone.now()
+        self.assertTrue(timedelta(seconds=25) < delay <= timedelta(seconds=30), delay)
+        # Not due yet
+        self.assertEqual(mail.send_pending(), (0, 0))
+
+        OutboundEmail.objects.filter(pk=queued.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('auth_app.mail.EmailMessage.send', side_effect=SMTPException('busy')):
+            mail.send_pending()
+        queued.refresh_from_db()
+        delay = queued.next_attempt_at - timezone.now()
+        self.assertTrue(timedelta(seconds=55) < delay <= timedelta(seconds=60), delay)
+
+        OutboundEmail.objects.filter(pk=queued.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(mail.send_pending(), (1, 0))
+        self.assertEqual(len(outbox.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        queued = mail.queue_mail('Your code', 'Code: 123456', None, ['to@example.invalid'])
+        for _ in range(3):
+            OutboundEmail.objects.filter(pk=queued.pk).update(next_attempt_at=timezone.now())
+            with mock.patch('auth_app.mail.EmailMessage.send', side_effect=SMTPException('down')):
+                mail.send_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(queued.attempts, 3)
+
+        OutboundEmail.objects.filter(pk=queued.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(mail.send_pending(), (0, 0))
+        self.assertEqual(len(outbox.outbox), 0)
+
+    def test_bodies_are_cleared_once_finished(self):
+        sent = mail.queue_mail('Your code', 'Code: 123456', None, ['sent@example.invalid'])
+        mail.send_pending()
+        self.assertEqual(outbox.outbox[0].body, 'Code: 123456')
+        sent.refresh_from_db()
+        self.assertEqual(sent.body, '')
+
+        failed = mail.queue_mail('Your code', 'Code: 654321', None, ['failed@example.invalid'])
+        for attempt in range(3):
+            OutboundEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+            with mock.patch('auth_app.mail.EmailMessage.send', side_effect=SMTPException('down')):
+                mail.send_pending()
+            failed.refresh_from_db()
+            # Kept while a retry still needs it
+            self.assertEqual(failed.body, '' if attempt == 2 else 'Code: 654321')
+        self.assertEqual(failed.status, OutboundEmail.STATUS_FAILED)
+
+    @override_settings(EMAIL_QUEUE_RETENTION_DAYS=7)
+    def test_prune_deletes_only_old_finished_messages(self):
+        kept = {
+            mail.queue_mail('Pending', 'Code: 1', None, ['pending@example.invalid']).pk,
+            mail.queue_mail('Recent', 'Code: 2', None, ['recent@example.invalid']).pk,
+        }
+        OutboundEmail.objects.filter(pk=max(kept)).update(status=OutboundEmail.STATUS_SENT)
+        old = timezone.now() - timedelta(days=8)
+        for status in (OutboundEmail.STATUS_SENT, OutboundEmail.STATUS_FAILED, OutboundEmail.STATUS_PENDING):
+            email = mail.queue_mail('Old', 'Code: 3', None, ['old@example.invalid'])
+            OutboundEmail.objects.filter(pk=email.pk).update(status=status, created_at=old)
+            if status == OutboundEmail.STATUS_PENDING:
+                kept.add(email.pk)
+
+        out = StringIO()
+        call_command('send_queued_mail', stdout=out)
+        self.assertIn('Pruned 2 finished email(s)', out.getvalue())
+        self.assertEqual(set(OutboundEmail.objects.values_list('pk', flat=True)), kept)
+
+
+@override_settings(AUTH_ASYNC_VIEWS=True)
+class AsyncAuthViewTests(CacheTestCase):
+    """``auth_app.async_views`` behind the ``AUTH_ASYNC_VIEWS`` URL swap."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            email='async@example.invalid', username='async', password=None, is_verified=True,
+        )
+
+    def setUp(self):
+        super().setUp()
+        # auth_app.urls picks its views at import; route through the async ones
+        # for this test and back to the APIViews afterwards
+        self.reload_urls()
+        self.addCleanup(self.reload_urls)
+
+    @staticmethod
+    def reload_urls():
+        importlib.reload(auth_urls)
+        importlib.reload(backend_urls)
+        clear_url_caches()
+
+    def test_routes_to_the_async_views(self):
+        self.assertIs(resolve('/api/auth/register/').func, async_views.register)
+        self.assertIs(resolve('/api/auth/otp/request/').func, async_views.otp_request)
+        self.assertIs(resolve('/api/auth/forgot-password/').func, async_views.forgot_password)
+        self.assertIs(resolve('/api/auth/login/').func.view_class, LoginView)
+
+    async def test_register(self):
+        response = await self.async_client.post(
+            '/api/auth/register/', {'email': 'new@example.invalid', 'username': 'newcomer'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['user']['email'], 'new@example.invalid')
+        self.assertTrue(await CustomUser.objects.filter(email='new@example.invalid', is_verified=False).aexists())
+        self.assertTrue(await cache.ahas_key('otp_new@example.invalid_register'))
+        self.assertEqual(await OutboundEmail.objects.filter(to='new@example.invalid').acount(), 1)
+
+    async def test_register_updates_an_unverified_user(self):
+        await CustomUser.objects.acreate_user(email='again@example.invalid', username='again', password=None)
+        response = await self.async_client.post(
+            '/api/auth/register/', {'email': 'again@example.invalid', 'username': 'renamed'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['user']['username'], 'renamed')
+        self.assertEqual(await OutboundEmail.objects.filter(to='again@example.invalid').acount(), 1)
+
+    async def test_register_rejects_a_verified_user(self):
+        response = await self.async_client.post(
+            '/api/auth/register/', {'email': self.user.email, 'username': 'other'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await OutboundEmail.objects.aexists())
+
+    async def test_otp_request(self):
+        response = await self.async_client.post(
+            '/api/auth/otp/request/', {'email': self.user.email, 'context': 'forgot_password'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(await cache.ahas_key(f'otp_{self.user.email}_forgot_password'))
+        email = await OutboundEmail.objects.aget(to=self.user.email)
+        self.assertEqual(email.subject, 'Your OTP for Password Reset')
+
+    async def test_otp_request_for_an_unknown_user(self):
+        response = await self.async_client.post(
+            '/api/auth/otp/request/', {'email': 'nobody@example.invalid'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await OutboundEmail.objects.aexists())
+
+    async def test_forgot_password(self):
+        response = await self.async_client.post(
+            '/api/auth/forgot-password/', {'email': self.user.email}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(await cache.ahas_key(f'otp_{self.user.email}_forgot_password'))
+        self.assertEqual(await OutboundEmail.objects.filter(to=self.user.email).acount(), 1)
+
+    async def test_malformed_json(self):
+        response = await self.async_client.post(
+            '/api/auth/otp/request/', '{"email":', content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_get_not_allowed(self):
+        response = await self.async_client.get('/api/auth/register/')
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(THROTTLE_ENABLED=True)
+    async def test_otp_request_throttled(self):
+        for _ in range(5):
+            await self.async_client.post(
+                '/api/auth/otp/request/', {'email': self.user.email}, content_type='application/json',
+            )
+        response = await self.async_client.post(
+            '/api/auth/otp/request/', {'email': self.user.email}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Throttled requests queue nothing
+        self.assertEqual(await OutboundEmail.objects.filter(to=self.user.email).acount(), 5)
+
+    @override_settings(THROTTLE_ENABLED=True, REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'register_global': '2/min'},
+    })
+    async def test_register_overloaded(self):
+        for index in range(2):
+            await self.async_client.post(
+                '/api/auth/register/', {'email': f'flood{index}@example.invalid', 'username': f'flood{index}'},
+                content_type='application/json',
+            )
+        response = await self.async_client.post(
+            '/api/auth/register/', {'email': 'flood@example.invalid', 'username': 'flood'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertFalse(await CustomUser.objects.filter(email='flood@example.invalid').aexists())
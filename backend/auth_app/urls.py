@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.urls import path
+from auth_app import async_views
 from auth_app.views import *
 
 urlpatterns = [
@@ -11,4 +13,17 @@ urlpatterns = [
     path('auth/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/forgot-password/', ForgotPasswordView.as_view(), name='forgot_password'),
     path('auth/forgot-password/reset/', ForgotPasswordResetView.as_view(), name='forgot_password_reset'),
-]
\ No newline at end of file
+]
+
+if settings.AUTH_ASYNC_VIEWS:
+    # Serve the I/O-bound signup and OTP endpoints with their async variants
+    async_routes = {
+        'register': async_views.register,
+        'otp_request': async_views.otp_request,
+        'forgot_password': async_views.forgot_password,
+    }
+    urlpatterns = [
+        path(str(pattern.pattern), async_routes[pattern.name], name=pattern.name)
+        if pattern.name in async_routes else pattern
+        for pattern in urlpatterns
+    ]
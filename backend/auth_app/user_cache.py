@@ -0,0 +1,71 @@
+"""
+Cached user lookup for JWT authentication.
+
+Every authenticated request used to load its ``CustomUser`` row. The fields
+the API reads from ``request.user`` are cached as a snapshot instead, under
+a key that embeds a per-user generation number. Saving or deleting the user
+(profile update, password change, deactivation) and logging out bump the
+generation, which orphans the old snapshot; orphans age out through
+``AUTH_USER_CACHE_TIMEOUT``. Queryset updates send no signals, so bulk
+deactivation goes through ``deactivate()``.
+
+Users rebuilt from a snapshot have their remaining fields deferred, so
+reading one of them loads it from the database and ``save()`` only writes
+the snapshot fields.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.connection import ConnectionProxy
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+cache = ConnectionProxy(caches, 'auth')
+
+GENERATION_KEY = 'auth_user:generation:{user_id}'
+USER_KEY = 'auth_user:{user_id}:{generation}'
+
+SNAPSHOT_FIELDS = ('id', 'email', 'username', 'is_active', 'is_staff', 'is_superuser', 'is_verified')
+
+
+def _key(user_id):
+    generation = cache.get(GENERATION_KEY.format(user_id=user_id), 0)
+    return USER_KEY.format(user_id=user_id, generation=generation)
+
+
+def get_user(user_id, load_user):
+    """
+    Return the cached user for ``user_id`` or call ``load_user`` and cache a
+    snapshot of the user it returns.
+    """
+    # Read the generation before loading, so a save racing with the load
+    # leaves its stale snapshot under an already orphaned key
+    key = _key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = load_user()
+        snapshot = {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+        cache.set(key, snapshot, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    if not snapshot['is_active']:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    User = get_user_model()
+    # from_db() expects values in concrete field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in snapshot]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [snapshot[name] for name in names])
+
+
+def invalidate_user(user_id):
+    key = GENERATION_KEY.format(user_id=user_id)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def deactivate(queryset):
+    """Deactivate the users in ``queryset`` with one UPDATE and drop their cached snapshots."""
+    user_ids = list(queryset.values_list('pk', flat=True))
+    count = queryset.model.objects.filter(pk__in=user_ids).update(is_active=False)
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return count
@@ -4,11 +4,14 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from django.core.cache import cache
 from auth_app.serializers import *
-from django.core.mail import send_mail
+from auth_app.mail import queue_mail
+from auth_app import user_cache
+from auth_app.revocation import RevocableRefreshToken
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 import logging
+from backend.throttling import AUTH_THROTTLES
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
@@ -17,6 +20,8 @@ logger = logging.getLogger(__name__)
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'register'
     
     def post(self, request):
         email = request.data.get('email')
@@ -37,20 +42,19 @@ class RegisterView(APIView):
                     cache.set(f'otp_{user.email}_register', otp, timeout=600)
                     
                     try:
-                        send_mail(
+                        queue_mail(
                             subject='Your OTP for Our Application',
                             message=f'Your OTP for registration is {otp}',
                             from_email=settings.DEFAULT_FROM_EMAIL,
                             recipient_list=[user.email],
-                            fail_silently=False,
                         )
-                        logger.info(f"OTP sent successfully for user: {user.email}")
+                        logger.info(f"OTP queued for user: {user.email}")
                         return Response({
                             'user': UserRegisterSerializer(user).data,
                             'message': 'User information updated. Please verify using OTP'
                         }, status=status.HTTP_200_OK)
                     except Exception as e:
-                        logger.error(f"Failed to send email for user {user.email}: {str(e)}")
+                        logger.error(f"Failed to queue email for user {user.email}: {str(e)}")
                         return Response({
                             'user': UserRegisterSerializer(user).data,
                             'message': 'User information updated, but failed to send OTP email'
@@ -67,20 +71,19 @@ class RegisterView(APIView):
                 cache.set(f'otp_{user.email}_register', otp, timeout=600)
                 
                 try:
-                    send_mail(
+                    queue_mail(
                         subject='Your OTP for Our Application',
                         message=f'Your OTP for registration is {otp}',
                         from_email=settings.DEFAULT_FROM_EMAIL,
                         recipient_list=[user.email],
-                        fail_silently=False,
                     )
-                    logger.info(f"OTP sent successfully for new user: {user.email}")
+                    logger.info(f"OTP queued for new user: {user.email}")
                     return Response({
                         'user': UserRegisterSerializer(user).data,
                         'message': 'User registration successful. Now verify using OTP'
                     }, status=status.HTTP_201_CREATED)
                 except Exception as e:
-                    logger.error(f"Failed to send OTP email for new user {user.email}: {str(e)}")
+                    logger.error(f"Failed to queue OTP email for new user {user.email}: {str(e)}")
                     return Response({
                         'user': UserRegisterSerializer(user).data,
                         'message': 'User registered, but failed to send OTP email'
@@ -91,6 +94,8 @@ class RegisterView(APIView):
 
 class OtpVerifyView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp_verify'
     def post(self, request):
         serializer = OtpVerifySerializer(data=request.data)
         if serializer.is_valid():
@@ -104,7 +109,7 @@ class OtpVerifyView(APIView):
                     cache.delete(f'otp_{email}_register')
                     user.is_verified = True
                     user.set_password(password)
-                    user.save()
+                    user.save(update_fields=['password', 'is_verified'])
                     logger.info(f"User {email} verified successfully")
                     return Response({
                         'user': UserProfileSerializer(user).data,
@@ -124,6 +129,8 @@ class OtpVerifyView(APIView):
 
 class OtpRequestView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'otp'
     def post(self, request):
         serializer = OTPRequestSerializer(data=request.data)
         if serializer.is_valid():
@@ -140,19 +147,18 @@ class OtpRequestView(APIView):
                 )
                 message = f'Your OTP is: {otp}. It is valid for 10 minutes.'
                 try:
-                    send_mail(
+                    queue_mail(
                         subject=subject,
                         message=message,
                         from_email=settings.DEFAULT_FROM_EMAIL,
                         recipient_list=[email],
-                        fail_silently=False,
                     )
-                    logger.info(f"OTP sent successfully for {context} to {email}")
+                    logger.info(f"OTP queued for {context} to {email}")
                     return Response({
                         'message': 'OTP sent to email.'
                     }, status=status.HTTP_200_OK)
                 except Exception as e:
-                    logger.error(f"Failed to send OTP email for {context} to {email}: {str(e)}")
+                    logger.error(f"Failed to queue OTP email for {context} to {email}: {str(e)}")
                     raise
             except CustomUser.DoesNotExist:
                 logger.error(f"User not found for OTP request: {email}")
@@ -164,6 +170,8 @@ class OtpRequestView(APIView):
 
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'forgot_password'
     def post(self, request):
         logger.info(f"Password reset request for email: {request.data.get('email')}")
         serializer = ForgotPasswordSerializer(data=request.data)
@@ -174,19 +182,18 @@ class ForgotPasswordView(APIView):
                 otp = str(random.randint(100000, 999999))
                 cache.set(f'otp_{email}_forgot_password', otp, timeout=600)
                 try:
-                    send_mail(
+                    queue_mail(
                         subject='Your OTP for Password Reset',
                         message=f'Your OTP for password reset is: {otp}. It is valid for 10 minutes.',
                         from_email=settings.DEFAULT_FROM_EMAIL,
                         recipient_list=[email],
-                        fail_silently=False,
                     )
-                    logger.info(f"Password reset OTP sent to {email}")
+                    logger.info(f"Password reset OTP queued for {email}")
                     return Response({
                         'message': 'Password reset OTP sent to email.'
                     }, status=status.HTTP_200_OK)
                 except Exception as e:
-                    logger.error(f"Failed to send password reset OTP to {email}: {str(e)}")
+                    logger.error(f"Failed to queue password reset OTP for {email}: {str(e)}")
                     raise
             except CustomUser.DoesNotExist:
                 logger.error(f"User not found for password reset: {email}")
@@ -198,6 +205,8 @@ class ForgotPasswordView(APIView):
 
 class ForgotPasswordResetView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'forgot_password_reset'
     def post(self, request):
         serializer = ForgotPasswordResetSerializer(data=request.data)
         if serializer.is_valid():
@@ -210,7 +219,7 @@ class ForgotPasswordResetView(APIView):
                 if cached_otp and cached_otp == code:
                     cache.delete(f'otp_{email}_forgot_password')
                     user.set_password(password)
-                    user.save()
+                    user.save(update_fields=['password'])
                     logger.info(f"Password reset successful for user: {email}")
                     return Response({
                         'message': 'Password reset successful.'
@@ -244,6 +253,8 @@ class ProfileView(APIView):
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -299,7 +310,7 @@ class CustomTokenRefreshView(APIView):
             }, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
-            refresh = RefreshToken(refresh_token)
+            refresh = RevocableRefreshToken(refresh_token)
             access_token = str(refresh.access_token)
 
             response = Response({
@@ -340,11 +351,12 @@ class LogoutView(APIView):
         try:
             refresh_token = request.COOKIES.get('refresh_token')
             if refresh_token:
-                token = RefreshToken(refresh_token)
+                token = RevocableRefreshToken(refresh_token)
                 token.blacklist()
                 logger.info(f"Token blacklisted successfully for user: {request.user.email}")
         except Exception as e:
             logger.error(f"Error during logout for user {request.user.email}: {str(e)}")
+        user_cache.invalidate_user(request.user.pk)
         
         response = Response({
             'message': 'Logout successful'
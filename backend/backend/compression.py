@@ -0,0 +1,133 @@
+"""
+Negotiated response compression.
+
+``CompressionMiddleware`` compresses responses of at least
+``COMPRESSION_MIN_SIZE`` bytes with the best encoding the client accepts:
+brotli when the ``brotli`` package is installed, else gzip. A full
+``/posts/`` page of JSON typically shrinks four- to eightfold. Smaller
+responses aren't worth the CPU or the framing overhead and are sent as they
+are, as are streaming responses (the SSE stream must flush every event),
+responses already encoded, and types that don't compress (images, PDFs).
+
+Each encoding is its own representation, so a strong ETag stays strong with
+the encoding appended (``"<tag>-gzip"``, ``"<tag>-br"``). When it names the
+encoding the request would get, the suffix is stripped from
+``If-None-Match`` before views compare it and put back on their ``304``, so
+views only ever see their own ETags.
+
+gzip output is padded with random bytes against BREACH-style attacks, as
+in Django's ``GZipMiddleware``. Brotli output is not: the brotli package
+has no way to add padding, so BREACH is unmitigated for brotli responses.
+Don't send secrets (CSRF tokens, keys) alongside reflected request data in
+compressible responses, or leave brotli uninstalled.
+"""
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+# Brotli quality 0-11; 5 compresses better than gzip -6 at a similar cost
+BROTLI_QUALITY = 5
+
+_coding = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+# An ETag this middleware suffixed with an encoding (proxies may have weakened it)
+_encoded_etag = re.compile(r'"([^"]*)-(br|gzip)"')
+
+
+def accepted_encodings(header):
+    """Content codings in an Accept-Encoding header mapped to their q-values."""
+    accepted = {}
+    for part in header.split(','):
+        match = _coding.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match[2]) if match[2] is not None else 1.0
+        except ValueError:
+            continue
+        accepted[match[1].lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """'br', 'gzip' or None for a request's Accept-Encoding header."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best, best_quality = None, 0
+    for coding in offered:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content, max_random_bytes=100)
+
+
+def encode_etag(etag, encoding):
+    """``etag`` for the ``encoding`` representation; weak ETags are left as they are."""
+    if etag.startswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    if media_type.startswith('text/'):
+        return media_type != 'text/event-stream'
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith('+json')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        header = request.META.get('HTTP_IF_NONE_MATCH')
+        if not header:
+            return
+        # Only tags of the representation this request would get can match
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        stripped = _encoded_etag.sub(lambda match: f'"{match[1]}"' if match[2] == encoding else match[0], header)
+        if stripped != header:
+            request.etag_encoding = encoding
+            request.META['HTTP_IF_NONE_MATCH'] = stripped
+
+    def process_response(self, request, response):
+        if response.status_code == 304:
+            # Name the representation the client's copy is in, as the 200 did
+            encoding = getattr(request, 'etag_encoding', None)
+            if encoding and response.has_header('ETag'):
+                response['ETag'] = encode_etag(response['ETag'], encoding)
+            return response
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not is_compressible(response.get('Content-Type', ''))
+        ):
+            return response
+        # Whether or not this one is compressed, others at the same URL may be
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response['ETag'] = encode_etag(response['ETag'], encoding)
+        return response
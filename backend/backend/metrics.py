@@ -0,0 +1,297 @@
+"""
+Request instrumentation and the Prometheus ``/metrics`` endpoint.
+
+``MetricsMiddleware`` times every request and labels it with its route: the
+resolved URL name plus, for DRF viewsets, the action (``post-list`` /
+``list``, ``post-like`` / ``like``). Unresolved URLs share the ``unmatched``
+route so 404 probes can't grow the label set.
+
+Per request it records:
+
+* latency, in a fixed-bucket histogram;
+* database queries and time, through an execute wrapper installed on every
+  connection;
+* cache hits and misses, counted by ``InstrumentedCache`` (``cache_config``
+  wraps every alias in it when ``METRICS_ENABLED``);
+* response size.
+
+Aggregation is a dict of counters behind one lock per process, so an
+observation costs a few additions. Each worker process reports its own
+totals; scrape every worker or run one per target.
+
+With ``SLOW_REQUEST_THRESHOLD_MS`` set, requests slower than that are logged
+to the ``backend.slow_requests`` logger together with their SQL.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.module_loading import import_string
+
+slow_logger = logging.getLogger('backend.slow_requests')
+
+# Upper bounds in seconds of the request latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds', 'cache_hits', 'cache_misses', 'sql')
+
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.sql = [] if capture_sql else None
+
+
+class Registry:
+    """Counters and histograms keyed by label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.latency = {}
+            self.totals = {}
+            self.counters = {}
+
+    def inc(self, name, **labels):
+        """Add one to the counter ``name`` with ``labels``, for other subsystems to report into."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def observe(self, labels, status, seconds, stats, response_bytes):
+        with self._lock:
+            key = labels + (str(status),)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            buckets = self.latency.get(labels)
+            if buckets is None:
+                # Cumulative count per bucket, then the count and sum of observations
+                buckets = self.latency[labels] = [0] * len(LATENCY_BUCKETS) + [0, 0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-2] += 1
+            buckets[-1] += seconds
+
+            totals = self.totals.get(labels)
+            if totals is None:
+                totals = self.totals[labels] = [0, 0.0, 0, 0, 0]
+            totals[0] += stats.queries
+            totals[1] += stats.query_seconds
+            totals[2] += stats.cache_hits
+            totals[3] += stats.cache_misses
+            totals[4] += response_bytes
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {labels: list(buckets) for labels, buckets in self.latency.items()}
+            totals = {labels: list(values) for labels, values in self.totals.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            '# HELP http_requests_total Requests by route and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, action, method, status), count in sorted(requests.items()):
+            lines.append(
+                f'http_requests_total{{{_labels(route, action, method)},status="{status}"}} {count}'
+            )
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for labels, buckets in sorted(latency.items()):
+            label_text = _labels(*labels)
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="+Inf"}} {buckets[-2]}')
+            lines.append(f'http_request_duration_seconds_sum{{{label_text}}} {buckets[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{label_text}}} {buckets[-2]}')
+
+        for index, name, help_text in (
+            (0, 'http_request_db_queries_total', 'Database queries run by requests, by route.'),
+            (1, 'http_request_db_seconds_total', 'Time spent in database queries, by route.'),
+            (2, 'http_request_cache_hits_total', 'Cache reads that found a value, by route.'),
+            (3, 'http_request_cache_misses_total', 'Cache reads that found nothing, by route.'),
+            (4, 'http_response_bytes_total', 'Response body bytes, by route.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for labels, values in sorted(totals.items()):
+                value = values[index]
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{{{_labels(*labels)}}} {value}')
+
+        declared = set()
+        for (name, labels), count in sorted(counters.items()):
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            label_text = ','.join(f'{label}="{_escape(str(value))}"' for label, value in labels)
+            lines.append(f'{name}{{{label_text}}} {count}' if label_text else f'{name} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(route, action, method):
+    return f'route="{_escape(route)}",action="{_escape(action)}",method="{method}"'
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, sql))
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def record_cache_read(found):
+    stats = _current.get()
+    if stats is not None:
+        if found:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class InstrumentedCache:
+    """
+    Wraps the cache backend named in ``OPTIONS['BACKEND']`` and counts reads
+    that hit or miss for the current request. Everything else is passed
+    through untouched.
+    """
+    _missing = object()
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        backend = options.pop('BACKEND')
+        self._backend = import_string(backend)(location, {**params, 'OPTIONS': options})
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def get(self, key, default=None, version=None):
+        value = self._backend.get(key, self._missing, version=version)
+        record_cache_read(value is not self._missing)
+        return default if value is self._missing else value
+
+    async def aget(self, key, default=None, version=None):
+        value = await self._backend.aget(key, self._missing, version=version)
+        record_cache_read(value is not self._missing)
+        return default if value is self._missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._backend.get_many(keys, version=version)
+        for key in keys:
+            record_cache_read(key in values)
+        return values
+
+
+def route_labels(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched', ''
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(request.method.lower(), '')
+
+
+def response_size(response):
+    if response.streaming:
+        return 0
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def start(self):
+        stats = RequestStats(capture_sql=bool(settings.SLOW_REQUEST_THRESHOLD_MS))
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        seconds = time.perf_counter() - start
+        route, action = route_labels(request)
+        registry.observe((route, action, request.method), response.status_code, seconds, stats,
+                         response_size(response))
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        if threshold and seconds * 1000 >= threshold:
+            slow_logger.warning(
+                f"Slow request {request.method} {request.path} ({route} {action}) "
+                f"{seconds * 1000:.0f}ms, status {response.status_code}, "
+                f"{stats.queries} queries in {stats.query_seconds * 1000:.0f}ms:\n"
+                + '\n'.join(f'  {elapsed * 1000:.1f}ms {sql}' for elapsed, sql in stats.sql)
+            )
+
+
+def metrics_view(request):
+    """``GET /metrics``: this process's metrics for Prometheus, from ``METRICS_ALLOWED_IPS`` only."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
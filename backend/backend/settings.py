@@ -10,8 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -78,6 +79,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -89,10 +91,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    
+    'backend.metrics.MetricsMiddleware',
+    'backend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Below CorsMiddleware so browsers can read its 503s
+    'backend.throttling.LoadSheddingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -120,14 +125,15 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
+# DB_ENGINE=django.db.backends.sqlite3 runs offline, e.g. for the test suite
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': config('DB_ENGINE', default='django.db.backends.postgresql'),
         'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT'),
+        'USER': config('DB_USER', default=''),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': config('DB_HOST', default=''),
+        'PORT': config('DB_PORT', default=''),
     }
 }
 
@@ -167,15 +173,152 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Outbox worker (`manage.py send_queued_mail`): retries back off from
+# EMAIL_QUEUE_RETRY_DELAY seconds, doubling each attempt.
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 30
+# Days sent and failed messages (bodies already cleared) stay in the outbox
+EMAIL_QUEUE_RETENTION_DAYS = 7
+
+# Request metrics (backend.metrics): per-route latency, queries, cache hits
+# and response size, served to Prometheus at /metrics for these addresses.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1', cast=Csv())
+# Log requests slower than this many milliseconds with their SQL (0 = off)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=0, cast=int)
+if not METRICS_ENABLED:
+    MIDDLEWARE.remove('backend.metrics.MetricsMiddleware')
+
+# Compress responses of at least this many bytes (backend.compression),
+# with brotli when the brotli package is installed, else gzip. Only gzip
+# output is padded against BREACH.
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
 
 # Cache Configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',  
+# Every process shares one Redis-protocol server (Redis, Valkey, KeyDB...) so
+# OTPs, buffered counters and cached responses are visible to all workers.
+# Each subsystem gets its own alias and key prefix. Set CACHE_BACKEND to
+# another Django cache backend (e.g. LocMemCache) to opt out of Redis.
+# Tests, or CACHE_FAKE_REDIS=True, run against an in-process fakeredis server.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache')
+REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379/0')
+CACHE_DEFAULT_TIMEOUT = config('CACHE_DEFAULT_TIMEOUT', default=300, cast=int)
+CACHE_FAKE_REDIS = config('CACHE_FAKE_REDIS', default=TESTING, cast=bool)
+
+REDIS_POOL_OPTIONS = {
+    'max_connections': config('REDIS_MAX_CONNECTIONS', default=50, cast=int),
+    'socket_timeout': config('REDIS_SOCKET_TIMEOUT', default=1.0, cast=float),
+    'socket_connect_timeout': config('REDIS_CONNECT_TIMEOUT', default=1.0, cast=float),
+    'retry_on_timeout': True,
+    'health_check_interval': 30,
+}
+if CACHE_FAKE_REDIS:
+    import fakeredis
+    REDIS_POOL_OPTIONS['connection_class'] = fakeredis.FakeRedisConnection
+
+
+def cache_config(key_prefix, timeout=CACHE_DEFAULT_TIMEOUT):
+    options = REDIS_POOL_OPTIONS if 'redis' in CACHE_BACKEND.lower() else {}
+    backend = CACHE_BACKEND
+    if METRICS_ENABLED:
+        # Wrapped to count hits and misses per request for /metrics
+        options = {**options, 'BACKEND': backend}
+        backend = 'backend.metrics.InstrumentedCache'
+    return {
+        'BACKEND': backend,
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': key_prefix,
+        'TIMEOUT': timeout,
+        'OPTIONS': options,
     }
+
+
+CACHES = {
+    # OTP codes and anything using django.core.cache.cache
+    'default': cache_config('blog'),
+    # Anonymous /posts/ responses (blog_app.feed_cache)
+    'feed': cache_config('feed'),
+    # Buffered read counts (blog_app.read_counts)
+    'counters': cache_config('counters', timeout=None),
+    # Users resolved by CookieJWTAuthentication (auth_app.user_cache)
+    'auth': cache_config('auth'),
+    # Blacklisted refresh token ids (auth_app.revocation); keys expire with their token
+    'revoked': cache_config('revoked', timeout=None),
+    # Per-user home timelines (blog_app.timelines)
+    'timelines': cache_config('timelines'),
+    # Rate limit windows (backend.throttling); keys expire with their window
+    'throttle': cache_config('throttle'),
 }
 
+# Serve register / OTP request / forgot password with auth_app.async_views.
+# Only worth enabling when running under the ASGI application.
+AUTH_ASYNC_VIEWS = config('AUTH_ASYNC_VIEWS', default=False, cast=bool)
+
+# Seconds a cached user stays valid; saving the user or logging out invalidates it sooner.
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Seconds an anonymous /posts/ response stays cached; changes invalidate it sooner.
+POST_FEED_CACHE_TIMEOUT = 300
+# Seconds the likes, reads and comment counts on a cached /posts/ page may
+# lag behind; only new, deleted and edited posts invalidate list pages at once.
+POST_FEED_LIST_MAX_LAG = 60
+# Seconds the version and last-change time behind a post's ETag and
+# Last-Modified are kept. Once they expire the post gets new validators.
+POST_FEED_VERSION_TIMEOUT = 24 * 60 * 60
+
+# HTTP caching of /posts/ and /posts/{id}/ (blog_app.feed_cache): seconds
+# browsers and shared caches may reuse a logged-out response before
+# revalidating. Responses carry ETags, so revalidation is cheap.
+POST_HTTP_MAX_AGE = 0
+POST_EDGE_MAX_AGE = config('POST_EDGE_MAX_AGE', default=60, cast=int)
+
+# Edge cache purging by Surrogate-Key (blog_app.cdn), e.g.
+# https://api.fastly.com/service/<id>/purge. Empty disables purging.
+CDN_PURGE_URL = config('CDN_PURGE_URL', default='')
+CDN_PURGE_TOKEN = config('CDN_PURGE_TOKEN', default='')
+CDN_PURGE_TOKEN_HEADER = 'Fastly-Key'
+CDN_PURGE_TIMEOUT = 5
+
+# Post views are buffered in the cache and written by `manage.py flush_read_counts`.
+# Repeat views by the same user inside this many seconds are ignored (0 = count all).
+READ_COUNT_DEDUPE_WINDOW = 0
+
+# Live post updates (blog_app.events). LocalBroker only reaches streams in the
+# same process; use blog_app.events.RedisBroker when running several workers.
+POST_EVENTS_BROKER = config('POST_EVENTS_BROKER', default='blog_app.events.LocalBroker')
+# Seconds between read_count events for one post
+POST_EVENTS_READ_COUNT_INTERVAL = 5
+# Seconds between keepalive comments on an idle stream
+POST_EVENTS_KEEPALIVE = 15
+# Posts one stream may subscribe to
+POST_EVENTS_MAX_POSTS = 50
+
+# Trending posts (blog_app.ranking). Engagement loses half its weight every
+# POST_HOT_HALF_LIFE seconds; run `manage.py rebuild_hot_scores` after
+# changing either setting.
+POST_HOT_HALF_LIFE = 24 * 60 * 60
+POST_HOT_WEIGHTS = {'post': 10, 'read': 1, 'like': 5, 'comment': 10}
+
+# Home timelines (blog_app.timelines): post ids kept per user, seconds an
+# unread timeline survives, and the follower count above which an author's
+# posts are merged in at read time instead of pushed to every follower.
+TIMELINE_LENGTH = 500
+TIMELINE_TIMEOUT = 7 * 24 * 60 * 60
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_FANOUT_BATCH = 1000
+
+# Rate limiting (backend.throttling). Rates per scope and client kind are in
+# REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+# Requests one worker process serves at once before answering 503 (0 = no cap)
+LOAD_SHED_MAX_CONCURRENT = config('LOAD_SHED_MAX_CONCURRENT', default=0, cast=int)
+# Retry-After seconds sent with those 503s
+LOAD_SHED_RETRY_AFTER = 5
+
+# PostgreSQL text search configuration used for Post.search_vector
+SEARCH_CONFIG = 'english'
+
 # Logging Configuration
 import os
 LOGGING = {
@@ -197,11 +340,25 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'debug.log'),
             'formatter': 'simple',
         },
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_requests.log'),
+            'formatter': 'simple',
+            'delay': True,
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
         'level': 'DEBUG',
     },
+    'loggers': {
+        # SLOW_REQUEST_THRESHOLD_MS reports, kept out of debug.log
+        'backend.slow_requests': {
+            'handlers': ['console', 'slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 # Cloudinary Configuration
@@ -213,6 +370,23 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Post images/PDFs are spooled to disk and uploaded by background workers
+# (blog_app.media). Use 'blog_app.media.LocalFileSystemBackend' to work offline.
+MEDIA_UPLOAD_BACKEND = config('MEDIA_UPLOAD_BACKEND', default='blog_app.media.CloudinaryBackend')
+MEDIA_SPOOL_DIR = BASE_DIR / 'media_spool'
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = '/media/'
+# Image renditions stored on each post: name -> max width, each also offered
+# in these modern formats for <picture>/srcset
+MEDIA_IMAGE_WIDTHS = {'thumbnail': 320, 'feed': 640, 'full': 1280}
+MEDIA_IMAGE_FORMATS = ['avif', 'webp']
+MEDIA_UPLOAD_MAX_ATTEMPTS = 3
+MEDIA_UPLOAD_RETRY_DELAY = 2
+
+# In-process background task pool (blog_app.tasks). Tests run tasks inline.
+BACKGROUND_TASK_WORKERS = config('BACKGROUND_TASK_WORKERS', default=4, cast=int)
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=TESTING, cast=bool)
+
 AUTH_USER_MODEL = 'auth_app.CustomUser'
 
 # REST Framework Configuration - Simplified
@@ -220,6 +394,47 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'auth_app.authentication.CookieJWTAuthentication',
     ],
+    # orjson when installed, DRF's stdlib JSON otherwise (backend.fastjson)
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Reverse proxies in front of the app. Throttles key on REMOTE_ADDR when
+    # 0, else on the client address the outermost of them appended to
+    # X-Forwarded-For; anything earlier in the header is client-supplied.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    # '<throttle_scope>_<kind>': rate, see backend.throttling. Scopes without
+    # a rate for a kind aren't limited by it. The _global rates are for the
+    # whole site and answer 503 when exceeded.
+    'DEFAULT_THROTTLE_RATES': {
+        'register_ip': '10/hour',
+        'register_email': '3/hour',
+        'register_global': '300/min',
+        'otp_ip': '10/hour',
+        'otp_email': '5/hour',
+        'otp_global': '300/min',
+        'otp_verify_ip': '30/hour',
+        'otp_verify_email': '10/hour',
+        'otp_verify_global': '600/min',
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'login_global': '1200/min',
+        'forgot_password_ip': '10/hour',
+        'forgot_password_email': '5/hour',
+        'forgot_password_global': '300/min',
+        'forgot_password_reset_ip': '30/hour',
+        'forgot_password_reset_email': '10/hour',
+        'forgot_password_reset_global': '600/min',
+        'like_user': '60/min',
+        'like_global': '6000/min',
+        'read_user': '120/min',
+        'read_global': '30000/min',
+    },
 }
 
 SIMPLE_JWT = {
@@ -0,0 +1,214 @@
+"""
+Behaviour tests for the project-wide modules in ``backend``: request
+metrics and JSON rendering.
+"""
+import json
+import re
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from backend import fastjson, metrics
+from blog_app.models import Post
+
+User = get_user_model()
+
+# One sample line of the text exposition format: name{labels} value
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_exposition(text):
+    """
+    ``{(name, labels): value}`` for every sample in ``text``, failing on any
+    line that isn't valid exposition format or a sample of an undeclared metric.
+    """
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        if line.startswith('# HELP '):
+            continue
+        match = SAMPLE.match(line)
+        if match is None:
+            raise AssertionError(f'Not an exposition line: {line!r}')
+        name, label_text, value = match.groups()
+        labels = LABEL.findall(label_text or '')
+        if ''.join(f'{key}="{val}",' for key, val in labels).rstrip(',') != (label_text or ''):
+            raise AssertionError(f'Malformed labels: {line!r}')
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in types else name
+        if family not in types:
+            raise AssertionError(f'Sample of undeclared metric: {line!r}')
+        samples[name, tuple(labels)] = float(value)
+    return samples
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='measured@example.invalid', username='measured', password='x')
+        Post.objects.create(title='Measured post', content='Measured content', author=author)
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        metrics.registry.reset()
+
+    def scrape(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return parse_exposition(response.content.decode())
+
+    def test_requests_are_counted_by_route(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/blog/posts/').status_code, 200)
+        self.client.get('/no/such/page/')
+
+        samples = self.scrape()
+        route = (('route', 'posts-list'), ('action', 'list'), ('method', 'GET'))
+        self.assertEqual(samples['http_requests_total', route + (('status', '200'),)], 2)
+        self.assertEqual(samples['http_request_duration_seconds_count', route], 2)
+        self.assertEqual(samples['http_request_duration_seconds_bucket', route + (('le', '+Inf'),)], 2)
+        self.assertGreater(samples['http_request_db_queries_total', route], 0)
+        self.assertGreater(samples['http_response_bytes_total', route], 0)
+        # The anonymous list is cached, so the second request hits what the first missed
+        self.assertGreater(samples['http_request_cache_hits_total', route], 0)
+        self.assertGreater(samples['http_request_cache_misses_total', route], 0)
+        unmatched = (('route', 'unmatched'), ('action', ''), ('method', 'GET'), ('status', '404'))
+        self.assertEqual(samples['http_requests_total', unmatched], 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.registry.observe(('posts-list', 'list', 'GET'), 200, 0.03, metrics.RequestStats(False), 10)
+        metrics.registry.observe(('posts-list', 'list', 'GET'), 200, 20, metrics.RequestStats(False), 10)
+        samples = metrics.registry.render()
+        buckets = {
+            dict(labels)['le']: value for (name, labels), value in parse_exposition(samples).items()
+            if name == 'http_request_duration_seconds_bucket'
+        }
+        self.assertEqual(buckets['0.025'], 0)
+        self.assertEqual(buckets['0.05'], 1)
+        self.assertEqual(buckets['10'], 1)
+        self.assertEqual(buckets['+Inf'], 2)
+
+    def test_other_counters_and_label_values_are_escaped(self):
+        metrics.registry.inc('throttle_decisions_total', scope='otp_ip', result='throttled')
+        metrics.registry.observe(('a"b\\c', '', 'GET'), 200, 0.01, metrics.RequestStats(False), 0)
+        samples = parse_exposition(metrics.registry.render())
+        self.assertEqual(samples['throttle_decisions_total', (('result', 'throttled'), ('scope', 'otp_ip'))], 1)
+        self.assertIn(('http_requests_total', (
+            ('route', 'a\\"b\\\\c'), ('action', ''), ('method', 'GET'), ('status', '200'),
+        )), samples)
+
+    def test_only_allowlisted_addresses_can_scrape(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.9']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 200)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+
+class FastJSONTests(TestCase):
+    """``backend.fastjson`` must render and parse exactly like DRF's stdlib classes."""
+
+    def sample(self):
+        return {
+            'aware': datetime(2025, 3, 4, 5, 6, 7, 891234, tzinfo=dt_timezone.utc),
+            'offset': datetime(2025, 3, 4, 5, 6, 7, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+            'naive': datetime(2025, 3, 4, 5, 6, 7, 500),
+            'date': date(2025, 3, 4),
+            'time': time(5, 6, 7, 891234),
+            'duration': timedelta(days=1, seconds=5),
+            'decimal': Decimal('12.3400'),
+            'lazy': gettext_lazy('Lazy text'),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'keys': {1: 'int', 2.5: 'float', False: 'bool', None: 'none'},
+            'text': 'caf\xe9 \u2603 \U0001f600 line\u2028para\u2029end "quoted" \\ slash </script>',
+            'numbers': [0, -1, 2 ** 63 - 1, 1.5, 0.1, -2.25],
+            'nested': [{'empty': {}, 'list': [], 'set': {3}, 'tuple': (1, 2)}],
+            'generator': (value for value in [1, 2]),
+        }
+
+    def assertRendersLikeDRF(self, data, renderer_context=None):
+        expected = JSONRenderer().render(data() if callable(data) else data, 'application/json', renderer_context)
+        actual = fastjson.ORJSONRenderer().render(
+            data() if callable(data) else data, 'application/json', renderer_context,
+        )
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_renders_like_drf(self):
+        content = self.assertRendersLikeDRF(self.sample)
+        self.assertIn(b'"aware":"2025-03-04T05:06:07.891234Z"', content)
+        self.assertIn(b'\\u2028', content)
+
+    def test_floats_are_spelled_differently_but_read_back_the_same(self):
+        floats = [1e-07, 1e300, 5e-324, 1.7976931348623157e308, 0.1 + 0.2, -0.0, 123456789.125]
+        self.assertEqual(json.loads(fastjson.ORJSONRenderer().render(floats)), floats)
+
+    def test_values_orjson_rejects_fall_back_to_the_stdlib(self):
+        self.assertRendersLikeDRF({'big': 2 ** 64, 'negative': -(2 ** 70)})
+        self.assertRendersLikeDRF({'big': [2 ** 100]})
+
+    def test_empty_responses(self):
+        self.assertEqual(fastjson.ORJSONRenderer().render(None), b'')
+        self.assertRendersLikeDRF({})
+        self.assertRendersLikeDRF([])
+
+    def test_indented_output_parses_the_same(self):
+        context = {'indent': 4}
+        expected = JSONRenderer().render(self.sample(), 'application/json', context)
+        actual = fastjson.ORJSONRenderer().render(self.sample(), 'application/json', context)
+        self.assertIn(b'\n', actual)
+        self.assertEqual(json.loads(actual), json.loads(expected))
+
+    def parse(self, parser, content, encoding='utf-8'):
+        return parser.parse(BytesIO(content), 'application/json', {'encoding': encoding})
+
+    def test_parses_like_drf(self):
+        for content in [
+            b'{"a":1,"b":[1.5,true,null,"caf\\u00e9"],"c":{"d":"\xe2\x98\x83"}}',
+            b'[]',
+            b'"text"',
+            b'123456789012345678901234567890',
+            b'{"id":-18446744073709551617,"phone":"123456789012345678901"}',
+        ]:
+            self.assertEqual(
+                self.parse(fastjson.ORJSONParser(), content), self.parse(JSONParser(), content), content,
+            )
+        content = '{"name":"caf\xe9"}'.encode('latin-1')
+        self.assertEqual(
+            self.parse(fastjson.ORJSONParser(), content, 'latin-1'), self.parse(JSONParser(), content, 'latin-1'),
+        )
+
+    def test_malformed_input_is_a_parse_error(self):
+        for content in [b'{"a":', b'', b'\xff\xfe', b'{"a":NaN']:
+            with self.assertRaises(ParseError, msg=content):
+                self.parse(fastjson.ORJSONParser(), content)
+
+    def test_without_orjson_the_drf_classes_are_used(self):
+        with mock.patch.object(fastjson, 'orjson', None):
+            self.assertRendersLikeDRF(self.sample)
+            self.assertEqual(fastjson.ORJSONRenderer().render(None), JSONRenderer().render(None))
+            content = b'{"a":[1,2,{"b":null}]}'
+            self.assertEqual(self.parse(fastjson.ORJSONParser(), content), {'a': [1, 2, {'b': None}]})
+            with self.assertRaises(ParseError):
+                self.parse(fastjson.ORJSONParser(), b'{"a":')
+
+    def test_api_responses_match(self):
+        author = User.objects.create_user(email='rendered@example.invalid', username='rendered', password='x')
+        Post.objects.create(title='Rendered post', content='Rendered   content', author=author)
+        response = self.client.get('/api/blog/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
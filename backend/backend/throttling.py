@@ -0,0 +1,240 @@
+"""
+Rate limiting and load shedding.
+
+Throttles count requests in the shared ``throttle`` cache with atomic
+``incr``, so every worker enforces the same limits. Each limit is a sliding
+window, approximated from two fixed-window counters: the current window's
+count plus the previous window's count weighted by how much of it still
+overlaps the sliding window. That costs two cache reads and one write per
+check, whatever the rate.
+
+A view opts in with ``throttle_scope`` and a list of ``throttle_classes``.
+Each class limits one kind of client (IP, email, user, or everyone at once)
+at the rate configured for ``<scope>_<kind>`` in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``; a scope/kind with no rate is
+not limited. Throttled requests get ``429`` and a ``Retry-After`` header;
+``GlobalRateThrottle`` sheds with ``503`` when the endpoint as a whole is
+over its rate, e.g. during a distributed bot flood.
+
+``LoadSheddingMiddleware`` also caps the requests one process serves at
+once (``LOAD_SHED_MAX_CONCURRENT``), so a flood is turned away cheaply
+instead of queuing behind slow work until the worker falls over.
+
+Every decision is counted in ``backend.metrics``.
+"""
+import threading
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.connection import ConnectionProxy
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+from backend.metrics import registry
+
+cache = ConnectionProxy(caches, 'throttle')
+
+WINDOW_KEY = 'throttle:{scope}:{ident}:{window}'
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is overloaded. Please retry later.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler turns this into Retry-After
+        self.wait = wait
+
+
+def _incr(key, timeout):
+    cache.add(key, 0, timeout=timeout)
+    return cache.incr(key)
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """Base class; subclasses set ``kind`` and override ``get_ident_for()``."""
+    kind = None
+
+    def __init__(self):
+        # The rate depends on the view's scope, see allow_request()
+        self.wait_seconds = None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_ident_for(self, request):
+        """The client ``request`` counts against, or None if it isn't limited."""
+        return None
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not settings.THROTTLE_ENABLED or scope is None:
+            return True
+        self.scope = f'{scope}_{self.kind}'
+        rate = self.get_rate()
+        ident = self.get_ident_for(request)
+        if rate is None or ident is None:
+            return True
+        limit, duration = self.parse_rate(rate)
+
+        now = self.timer()
+        window, elapsed = divmod(now, duration)
+        key = WINDOW_KEY.format(scope=self.scope, ident=ident, window=int(window))
+        previous = cache.get(WINDOW_KEY.format(scope=self.scope, ident=ident, window=int(window) - 1), 0)
+        count = _incr(key, timeout=2 * duration)
+        overlap = 1 - elapsed / duration
+        if previous * overlap + count <= limit:
+            registry.inc('throttle_decisions_total', scope=self.scope, result='allowed')
+            return True
+
+        # Rejected requests don't use up the allowance
+        cache.decr(key)
+        registry.inc('throttle_decisions_total', scope=self.scope, result='throttled')
+        self.wait_seconds = self._wait(limit, duration, previous, count - 1, elapsed)
+        return False
+
+    @staticmethod
+    def _wait(limit, duration, previous, current, elapsed):
+        """Seconds until one more request fits under ``limit``."""
+        if current + 1 <= limit and previous:
+            # The previous window's share has to decay far enough
+            return max(0.0, duration * (1 - (limit - current - 1) / previous) - elapsed)
+        # Only the next window has room, and this one becomes its previous window
+        return duration - elapsed + max(0.0, duration * (1 - (limit - 1) / current))
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPRateThrottle(SlidingWindowRateThrottle):
+    """
+    Per client address: ``REMOTE_ADDR``, or with ``NUM_PROXIES`` set the
+    address the outermost trusted proxy put in ``X-Forwarded-For``.
+    """
+    kind = 'ip'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class UserRateThrottle(SlidingWindowRateThrottle):
+    """Per user; anonymous requests are limited per IP."""
+    kind = 'user'
+
+    def get_ident_for(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class EmailRateThrottle(SlidingWindowRateThrottle):
+    """Per target email address, so one victim can't be flooded from many IPs."""
+    kind = 'email'
+
+    def get_ident_for(self, request):
+        email = request.data.get('email') if hasattr(request, 'data') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return email.strip().lower()
+
+
+class GlobalRateThrottle(SlidingWindowRateThrottle):
+    """Everyone at once; sheds with 503 instead of throttling with 429."""
+    kind = 'global'
+
+    def get_ident_for(self, request):
+        return 'all'
+
+    def allow_request(self, request, view):
+        if super().allow_request(request, view):
+            return True
+        raise Overloaded(wait=int(self.wait_seconds) + 1)
+
+
+# Signup, OTP and password endpoints: each call sends mail or hashes a password
+AUTH_THROTTLES = [IPRateThrottle, EmailRateThrottle, GlobalRateThrottle]
+# Authenticated writes that contend on hot rows
+WRITE_THROTTLES = [UserRateThrottle, GlobalRateThrottle]
+
+
+def check(request, scope, throttle_classes):
+    """
+    Run ``throttle_classes`` for views outside DRF (``auth_app.async_views``).
+    Returns None, or the 429/503 ``JsonResponse`` to send instead.
+    """
+    view = type('ThrottledView', (), {'throttle_scope': scope})
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        try:
+            allowed = throttle.allow_request(request, view)
+        except Overloaded as exc:
+            response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+            response['Retry-After'] = str(exc.wait)
+            return response
+        if not allowed:
+            wait = int(throttle.wait()) + 1
+            response = JsonResponse(
+                {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response['Retry-After'] = str(wait)
+            return response
+    return None
+
+
+class LoadSheddingMiddleware:
+    """Answer 503 once this process is serving ``LOAD_SHED_MAX_CONCURRENT`` requests (0 = off)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enter():
+            return self.shed()
+        try:
+            return self.get_response(request)
+        finally:
+            self.leave()
+
+    async def __acall__(self, request):
+        if not self.enter():
+            return self.shed()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.leave()
+
+    def enter(self):
+        limit = settings.LOAD_SHED_MAX_CONCURRENT
+        with self.lock:
+            if limit and self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def shed(self):
+        registry.inc('load_shed_total')
+        response = JsonResponse(
+            {'detail': 'The service is overloaded. Please retry later.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response['Retry-After'] = str(settings.LOAD_SHED_RETRY_AFTER)
+        return response
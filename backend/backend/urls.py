@@ -14,11 +14,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from backend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('auth_app.urls')),
-    path('api/blog/', include('blog_app.urls'))
+    path('api/blog/', include('blog_app.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+# Files written by blog_app.media.LocalFileSystemBackend (DEBUG only)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,63 @@
+"""
+Surrogate keys and edge cache purging for post reads.
+
+Post responses carry a ``Surrogate-Key`` header naming what they were built
+from: ``posts`` for list pages, ``post-<id>`` for every post shown and
+``author-<id>`` for every author shown. When ``CDN_PURGE_URL`` is set,
+``purge()`` asks the edge cache to drop every response tagged with any of
+the given keys, so a change is visible at the edge right away instead of
+after ``POST_EDGE_MAX_AGE``. Requests use Fastly's batch purge API
+(``POST`` with a space-separated ``Surrogate-Key`` header); other CDNs
+with surrogate-key purging accept the same shape behind a small proxy.
+Purges run on the background pool and failures are only logged.
+"""
+import logging
+import urllib.request
+from django.conf import settings
+from . import tasks
+
+logger = logging.getLogger(__name__)
+
+LIST_KEY = 'posts'
+# Fastly accepts at most this many keys per purge request
+PURGE_BATCH = 256
+
+
+def post_key(post_id):
+    return f'post-{post_id}'
+
+
+def author_key(user_id):
+    return f'author-{user_id}'
+
+
+def surrogate_keys(posts, listing=False):
+    """Keys for a response showing serialized ``posts``."""
+    keys = [LIST_KEY] if listing else []
+    for post in posts:
+        keys.append(post_key(post['id']))
+        if post.get('author'):
+            keys.append(author_key(post['author']['id']))
+    return list(dict.fromkeys(keys))
+
+
+def purge(keys):
+    """Purge ``keys`` from the edge cache after commit; a no-op without ``CDN_PURGE_URL``."""
+    keys = list(dict.fromkeys(keys))
+    if settings.CDN_PURGE_URL and keys:
+        tasks.submit(send_purge, keys)
+
+
+def send_purge(keys):
+    for start in range(0, len(keys), PURGE_BATCH):
+        batch = keys[start:start + PURGE_BATCH]
+        request = urllib.request.Request(
+            settings.CDN_PURGE_URL, method='POST', headers={'Surrogate-Key': ' '.join(batch)},
+        )
+        if settings.CDN_PURGE_TOKEN:
+            request.add_header(settings.CDN_PURGE_TOKEN_HEADER, settings.CDN_PURGE_TOKEN)
+        try:
+            with urllib.request.urlopen(request, timeout=settings.CDN_PURGE_TIMEOUT):
+                pass
+        except OSError as exc:
+            logger.warning(f"CDN purge of {len(batch)} keys failed: {exc}")
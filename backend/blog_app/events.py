@@ -0,0 +1,164 @@
+"""
+Live post updates.
+
+Like counts, newly approved comments, approved comment counts and read
+counts are pushed to clients over Server-Sent Events
+(``blog_app.streams.post_events``) instead of being polled. Publishers
+call the ``publish_*`` functions from ordinary synchronous code; subscribers
+are streams running on the ASGI event loop. The broker between them is
+``POST_EVENTS_BROKER``:
+
+* ``LocalBroker`` fans out inside one process, so it only reaches streams
+  served by the same worker that handled the write.
+* ``RedisBroker`` goes through Redis pub/sub, so writes from any worker or
+  management command reach every stream.
+
+Publishing never fails the caller; broker errors are logged and dropped.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django.utils.module_loading import import_string
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+cache = ConnectionProxy(caches, 'counters')
+
+READ_COUNT_THROTTLE_KEY = 'post_events:read_count:{post_id}'
+
+
+class LocalBroker:
+    """In-process fan-out to the asyncio queues of this process's streams."""
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, post_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(post_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, message)
+
+    @staticmethod
+    def _offer(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client isn't keeping up; it will resync on reconnect
+            pass
+
+    @asynccontextmanager
+    async def subscribe(self, post_ids):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            for post_id in post_ids:
+                self._subscribers[post_id].add(subscriber)
+        try:
+            yield _QueueSubscription(subscriber[1])
+        finally:
+            with self._lock:
+                for post_id in post_ids:
+                    self._subscribers[post_id].discard(subscriber)
+                    if not self._subscribers[post_id]:
+                        del self._subscribers[post_id]
+
+
+class _QueueSubscription:
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def get(self, timeout):
+        """The next message, or None if none arrives within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisBroker:
+    """Fan-out through Redis pub/sub on ``REDIS_URL``, one channel per post."""
+    channel = 'post_events:{post_id}'
+
+    def __init__(self):
+        import redis
+        self.client = redis.Redis.from_url(settings.REDIS_URL)
+
+    def publish(self, post_id, message):
+        self.client.publish(self.channel.format(post_id=post_id), message)
+
+    @asynccontextmanager
+    async def subscribe(self, post_ids):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*[self.channel.format(post_id=post_id) for post_id in post_ids])
+        try:
+            yield _PubSubSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class _PubSubSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(timeout=timeout)
+        return message['data'].decode() if message else None
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.POST_EVENTS_BROKER)()
+    return _broker
+
+
+def publish(post_id, event, data):
+    message = json.dumps({'event': event, 'post': post_id, 'data': data}, default=str)
+    try:
+        get_broker().publish(post_id, message)
+    except Exception:
+        logger.exception(f"Failed to publish {event} event for post {post_id}")
+
+
+def publish_likes(post_id):
+    likes_count = Post.objects.filter(pk=post_id).values_list('likes_count', flat=True).first()
+    if likes_count is not None:
+        publish(post_id, 'likes', {'likes_count': likes_count})
+
+
+def publish_comments(comments):
+    """Announce newly approved ``comments`` (with ``user`` loaded)."""
+    from .serializers import CommentSerializer
+    for comment in comments:
+        publish(comment.post_id, 'comment', CommentSerializer(comment).data)
+
+
+def publish_comment_counts(post_ids):
+    """Announce the approved comment count of ``post_ids`` as stored after a recount."""
+    counts = Post.objects.filter(pk__in=post_ids).values_list('pk', 'comment_count')
+    for post_id, comment_count in counts:
+        publish(post_id, 'comment_count', {'comment_count': comment_count})
+
+
+def publish_read_count(post_id, read_count):
+    """Announce ``read_count``, at most once per ``POST_EVENTS_READ_COUNT_INTERVAL``."""
+    throttle_key = READ_COUNT_THROTTLE_KEY.format(post_id=post_id)
+    if cache.add(throttle_key, 1, timeout=settings.POST_EVENTS_READ_COUNT_INTERVAL):
+        publish(post_id, 'read_count', {'read_count': read_count})
@@ -0,0 +1,279 @@
+"""
+Response caching for post reads.
+
+Logged-out ``/posts/`` and ``/posts/{id}/`` responses are identical for every
+visitor, so the serialized data is cached. Keys embed a version number per
+post, and for list pages a version of the list. Signal handlers in
+``blog_app.signals`` bump them after commit when a post, its likes, its
+comments or its author change. That orphans exactly the stale entries
+instead of flushing the cache; orphans age out through
+``POST_FEED_CACHE_TIMEOUT``, the versions themselves through
+``POST_FEED_VERSION_TIMEOUT``.
+
+Likes, reads and comments arrive far more often than posts, so they don't
+bump the list version: only adding, removing or editing a post does. Pages
+sorted on ``read_count`` or ``likes_count`` also carry a version of that
+field, which the matching counter bumps. The counts shown on other pages may
+lag by up to ``POST_FEED_LIST_MAX_LAG`` seconds, after which every list
+version moves on.
+
+The same versions make the HTTP validators. ``serve()`` answers every list
+and detail GET with a strong ``ETag`` hashed from the version, the viewer and
+the query parameters, and ``Last-Modified`` from the time of the last bump.
+Neither needs serialization, so a client or CDN revalidating with
+``If-None-Match``/``If-Modified-Since`` gets its ``304`` for one cache read.
+A post without a version is looked up first: only existing posts get
+validators, so a missing post answers ``404``, never ``304``.
+Full responses also carry ``Cache-Control`` and ``Surrogate-Key`` headers
+(``blog_app.cdn``), and each bump purges the matching keys at the edge.
+List pages are tagged with every post they show, so only changes to which
+posts exist purge the ``posts`` key; likes, reads and comments don't.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.connection import ConnectionProxy
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from . import cdn
+from .models import Post
+
+cache = ConnectionProxy(caches, 'feed')
+
+LIST_VERSION_KEY = 'post_feed:version:list'
+ORDER_VERSION_KEY = 'post_feed:version:order:{field}'
+POST_VERSION_KEY = 'post_feed:version:post:{post_id}'
+LIST_CHANGED_KEY = 'post_feed:changed:list'
+ORDER_CHANGED_KEY = 'post_feed:changed:order:{field}'
+POST_CHANGED_KEY = 'post_feed:changed:post:{post_id}'
+LIST_KEY = 'post_feed:list:{version}:{digest}'
+DETAIL_KEY = 'post_feed:detail:{post_id}:{version}'
+HITS_KEY = 'post_feed:stats:hits'
+MISSES_KEY = 'post_feed:stats:misses'
+
+# Query parameters that change the list response; anything else is ignored
+LIST_PARAMS = ('page', 'page_size', 'search', 'ordering', 'pagination', 'cursor')
+# ?ordering= fields that change without a post being saved, see invalidate_posts()
+COUNTER_ORDERINGS = ('read_count', 'likes_count')
+# Request headers the response depends on besides the URL
+VARY_HEADERS = ('Accept', 'Authorization', 'Cookie')
+
+
+def _incr(key, initial=0, timeout=None):
+    cache.add(key, initial, timeout=timeout)
+    return cache.incr(key)
+
+
+def _current(defaults, exists=None):
+    """
+    Read the keys of ``defaults``, first storing the default of any that are
+    missing. None if any is missing and ``exists()`` says not to store them.
+    """
+    values = cache.get_many(list(defaults))
+    missing = [key for key in defaults if key not in values]
+    if missing and exists is not None and not exists():
+        return None
+    for key in missing:
+        cache.add(key, defaults[key], timeout=settings.POST_FEED_VERSION_TIMEOUT)
+    if missing:
+        values.update(cache.get_many(missing))
+    return values
+
+
+def _post_exists(post_id):
+    try:
+        return Post.objects.filter(pk=post_id).exists()
+    except (TypeError, ValueError):
+        # Not a valid primary key; the view answers 404
+        return False
+
+
+def is_cacheable(request):
+    return request.method == 'GET' and not request.user.is_authenticated
+
+
+def _list_params(request):
+    return sorted(
+        (name, value)
+        for name in LIST_PARAMS
+        for value in request.query_params.getlist(name)
+    )
+
+
+def _list_version_keys(request):
+    """``{version key: changed key}`` of the list versions ``request``'s page depends on."""
+    keys = {LIST_VERSION_KEY: LIST_CHANGED_KEY}
+    ordering = {field.strip().lstrip('-') for field in request.query_params.get('ordering', '').split(',')}
+    for field in COUNTER_ORDERINGS:
+        if field in ordering:
+            keys[ORDER_VERSION_KEY.format(field=field)] = ORDER_CHANGED_KEY.format(field=field)
+    return keys
+
+
+def _lag_window():
+    """Start of the current ``POST_FEED_LIST_MAX_LAG`` window, in seconds."""
+    max_lag = settings.POST_FEED_LIST_MAX_LAG
+    return int(time.time()) // max_lag * max_lag
+
+
+def list_key(request, version):
+    # Pagination links are absolute, so the host is part of the key
+    raw = f'{request.get_host()}|{_list_params(request)}'
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return LIST_KEY.format(version=version, digest=digest)
+
+
+def detail_key(post_id, version=None):
+    if version is None:
+        version = cache.get(POST_VERSION_KEY.format(post_id=post_id), 0)
+    return DETAIL_KEY.format(post_id=post_id, version=version)
+
+
+def cached_response(key, build_response):
+    """
+    Return the cached response data for ``key`` or call ``build_response``
+    and cache its data if it succeeded. Responses carry ``X-Cache: HIT|MISS``.
+    """
+    data = cache.get(key)
+    if data is not None:
+        _incr(HITS_KEY)
+        return Response(data, headers={'X-Cache': 'HIT'})
+
+    _incr(MISSES_KEY)
+    response = build_response()
+    if response.status_code == 200:
+        cache.set(key, response.data, timeout=settings.POST_FEED_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def _validators(request, post_id):
+    """
+    The version, strong ETag and Last-Modified timestamp of the response to
+    ``request``, or None for a post that doesn't exist.
+    """
+    if post_id is None:
+        keys = _list_version_keys(request)
+        scope = f'list|{request.get_host()}|{_list_params(request)}'
+        exists = None
+    else:
+        keys = {POST_VERSION_KEY.format(post_id=post_id): POST_CHANGED_KEY.format(post_id=post_id)}
+        scope = f'detail|{post_id}'
+        exists = lambda: _post_exists(post_id)
+    # A version that was evicted restarts from the clock, never from a
+    # number an earlier ETag may already have used
+    now_ns, now = time.time_ns(), int(time.time())
+    defaults = {}
+    for version_key, changed_key in keys.items():
+        defaults.update({version_key: now_ns, changed_key: now})
+    values = _current(defaults, exists)
+    if values is None:
+        return None
+    versions = [values[version_key] for version_key in keys]
+    last_modified = max(values[changed_key] for changed_key in keys.values())
+    if post_id is None:
+        window = _lag_window()
+        versions.append(window)
+        last_modified = max(last_modified, window)
+    version = '.'.join(str(value) for value in versions)
+    viewer = request.user.pk if request.user.is_authenticated else ''
+    raw = f'{scope}|{version}|{viewer}|{request.accepted_renderer.format}'
+    return version, quote_etag(hashlib.sha1(raw.encode()).hexdigest()), last_modified
+
+
+def _patch_headers(response, request, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if request.user.is_authenticated:
+        # is_liked differs per user; only the browser may keep a copy
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.POST_HTTP_MAX_AGE,
+            s_maxage=settings.POST_EDGE_MAX_AGE,
+        )
+    patch_vary_headers(response, VARY_HEADERS)
+
+
+def serve(request, build_response, post_id=None):
+    """
+    Answer a GET of the post list, or of post ``post_id``: ``304`` when the
+    client's copy is current, otherwise ``build_response()`` (cached for
+    anonymous requests) with validators and edge cache headers.
+    """
+    validators = _validators(request, post_id)
+    if validators is None:
+        return build_response()
+    version, etag, last_modified = validators
+    probe = HttpResponse()
+    _patch_headers(probe, request, etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified, response=probe)
+    if response is not probe:
+        return response
+
+    if is_cacheable(request):
+        key = list_key(request, version) if post_id is None else detail_key(post_id, version)
+        response = cached_response(key, build_response)
+    else:
+        response = build_response()
+    if response.status_code != 200:
+        return response
+
+    _patch_headers(response, request, etag, last_modified)
+    if post_id is None:
+        posts = response.data['results'] if isinstance(response.data, dict) else response.data
+        keys = cdn.surrogate_keys(posts, listing=True)
+    else:
+        keys = cdn.surrogate_keys([response.data])
+    response['Surrogate-Key'] = ' '.join(keys)
+    return response
+
+
+def invalidate_posts(post_ids, listing=False, ordering=()):
+    """
+    Drop cached detail responses for ``post_ids``. Pass ``listing=True`` when
+    posts were added, removed or edited to drop every cached list page too,
+    and the names of changed ``COUNTER_ORDERINGS`` fields in ``ordering`` to
+    drop the pages sorted on them. At the edge, list pages showing the posts
+    are purged with them, and ``listing=True`` purges every page.
+
+    Call it after commit, or a read in between can cache the old rows under
+    the new version.
+    """
+    post_ids = set(post_ids)
+    timeout = settings.POST_FEED_VERSION_TIMEOUT
+    changed_keys = {POST_VERSION_KEY.format(post_id=post_id): POST_CHANGED_KEY.format(post_id=post_id)
+                    for post_id in post_ids}
+    if listing:
+        changed_keys[LIST_VERSION_KEY] = LIST_CHANGED_KEY
+    for field in ordering:
+        changed_keys[ORDER_VERSION_KEY.format(field=field)] = ORDER_CHANGED_KEY.format(field=field)
+    for version_key in changed_keys:
+        _incr(version_key, initial=time.time_ns(), timeout=timeout)
+    now = int(time.time())
+    cache.set_many({changed_key: now for changed_key in changed_keys.values()}, timeout=timeout)
+    keys = [cdn.post_key(post_id) for post_id in post_ids]
+    cdn.purge([cdn.LIST_KEY, *keys] if listing else keys)
+
+
+def forget_posts(post_ids):
+    """Drop the validators of deleted ``post_ids``, so they answer 404 instead of 304."""
+    cache.delete_many([
+        key.format(post_id=post_id)
+        for post_id in post_ids
+        for key in (POST_VERSION_KEY, POST_CHANGED_KEY)
+    ])
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,104 @@
+import io
+import random
+import statistics
+import string
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from backend import compression, fastjson
+from blog_app.models import Post
+from blog_app.serializers import PostSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Time rendering and parsing a /posts/ page with the stdlib JSON '
+        'renderer/parser against backend.fastjson, and print its size on the '
+        'wire uncompressed, gzipped and (with brotli installed) brotli-compressed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--content-chars', type=int, default=3000,
+                            help='Length of each synthetic post body')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Serialize the newest posts in the database instead of synthetic ones')
+
+    def handle(self, *args, **options):
+        page = self.real_page(options) if options['from_db'] else self.synthetic_page(options)
+        posts = len(page['results'])
+        if fastjson.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both columns use the stdlib'))
+
+        renderers = [('stdlib', JSONRenderer()), ('orjson', fastjson.ORJSONRenderer())]
+        parsers = [('stdlib', JSONParser()), ('orjson', fastjson.ORJSONParser())]
+        body = renderers[0][1].render(page)
+        self.stdout.write(f'Page of {posts} post(s), {options["iterations"]} iterations, median per call:')
+        for (name, renderer), (_, parser) in zip(renderers, parsers):
+            rendered = self.time(lambda: renderer.render(page), options['iterations'])
+            parsed = self.time(lambda: parser.parse(io.BytesIO(body)), options['iterations'])
+            self.stdout.write(f'  {name:<8} render {rendered:8.3f} ms   parse {parsed:8.3f} ms')
+
+        self.stdout.write('Bytes on the wire:')
+        self.stdout.write(f'  {"identity":<8} {len(body):>9,}')
+        for encoding in ('gzip', 'br'):
+            if encoding == 'br' and compression.brotli is None:
+                self.stdout.write(f'  {encoding:<8} {"n/a (brotli not installed)":>9}')
+                continue
+            start = time.perf_counter()
+            size = len(compression.compress(body, encoding))
+            took = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f'  {encoding:<8} {size:>9,}  ({size / len(body):.0%} of identity, {took:.3f} ms to compress)'
+            )
+
+    @staticmethod
+    def time(call, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def real_page(self, options):
+        posts = Post.objects.with_engagement(None).order_by('-created_at')[:options['page_size']]
+        return {'next': None, 'previous': None, 'results': PostSerializer(posts, many=True).data}
+
+    def synthetic_page(self, options):
+        """A page shaped like PostSerializer output, with prose-like bodies."""
+        rng = random.Random(0)
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(500)]
+        now = timezone.now()
+
+        def prose(length):
+            text = ' '.join(rng.choice(words) for _ in range(length // 5))
+            return text[:length].capitalize()
+
+        results = []
+        for index in range(options['page_size']):
+            created = (now - timedelta(minutes=index * 37)).isoformat().replace('+00:00', 'Z')
+            results.append({
+                'id': 10000 - index,
+                'title': prose(60),
+                'content': prose(options['content_chars']),
+                'author': {'id': index + 1, 'email': f'author{index}@example.com', 'username': f'author{index}'},
+                'image_url': f'https://res.cloudinary.com/demo/image/upload/v1/posts/{index}.jpg',
+                'file_url': None,
+                'image_renditions': {
+                    name: f'https://res.cloudinary.com/demo/image/upload/{name}/v1/posts/{index}.jpg'
+                    for name in ('original', 'thumbnail', 'medium')
+                },
+                'media_status': 'ready',
+                'read_count': rng.randint(0, 50000),
+                'likes_count': rng.randint(0, 2000),
+                'comment_count': rng.randint(0, 300),
+                'is_liked': False,
+                'created_at': created,
+                'updated_at': created,
+            })
+        return {'next': 'https://api.example.com/api/blog/posts/?cursor=abc', 'previous': None, 'results': results}
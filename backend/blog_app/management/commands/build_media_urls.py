@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from blog_app import media
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Precompute Post.media_urls for posts that have media but no stored URLs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild every post, e.g. after changing MEDIA_IMAGE_WIDTHS',
+        )
+
+    def handle(self, *args, **options):
+        backend = media.get_backend()
+        posts = Post.objects.filter(
+            (Q(image__isnull=False) & ~Q(image='')) | (Q(file__isnull=False) & ~Q(file=''))
+        ).only('id', 'image', 'file', 'media_urls').order_by('pk')
+        if not options['all']:
+            posts = posts.filter(media_urls={})
+
+        batch = []
+        updated = 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            post.media_urls = media.build_media_urls(
+                {'image': post.image, 'file': post.file}, backend
+            )
+            batch.append(post)
+            if len(batch) == options['batch_size']:
+                Post.objects.bulk_update(batch, ['media_urls'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, ['media_urls'])
+            updated += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Built media URLs for {updated} post(s)'))
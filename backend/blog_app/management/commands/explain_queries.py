@@ -0,0 +1,129 @@
+import random
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from blog_app.models import Post, Comment
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large dataset and print the query plan of every hot endpoint '
+        'query with and without the blog_app indexes. Everything runs inside '
+        'a transaction that is rolled back, so the database is left untouched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--likes', type=int, default=300000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                viewer, post = self.seed(options)
+                queries = self.endpoint_queries(viewer, post)
+                if connection.vendor == 'postgresql':
+                    with transaction.atomic():
+                        self.drop_indexes()
+                        self.explain_all(queries, 'before: without blog_app indexes')
+                        transaction.set_rollback(True)
+                else:
+                    # SQLite caches prepared plans across DDL in one transaction
+                    self.stdout.write(self.style.WARNING(
+                        'Before/after comparison needs PostgreSQL; showing current plans only'
+                    ))
+                self.explain_all(queries, 'after: with blog_app indexes')
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('Rolled back seeded data'))
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def seed(self, options):
+        batch_size = options['batch_size']
+        self.stdout.write('Seeding data...')
+        users = User.objects.bulk_create(
+            [
+                User(email=f'explain{i}@example.invalid', username=f'explain{i}', is_verified=True)
+                for i in range(options['users'])
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = [user.pk for user in users]
+
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f'Post {i}',
+                    content=f'Content {i} ' * 20,
+                    author_id=random.choice(user_ids),
+                    read_count=random.randint(0, 10000),
+                    likes_count=random.randint(0, 500),
+                )
+                for i in range(options['posts'])
+            ],
+            batch_size=batch_size,
+        )
+        post_ids = [post.pk for post in posts]
+
+        Like = Post.likes.through
+        pairs = {
+            (random.choice(post_ids), random.choice(user_ids)) for _ in range(options['likes'])
+        }
+        Like.objects.bulk_create(
+            [Like(post_id=post_id, customuser_id=user_id) for post_id, user_id in pairs],
+            batch_size=batch_size,
+        )
+
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    post_id=random.choice(post_ids),
+                    user_id=random.choice(user_ids),
+                    content='Comment',
+                    is_approved=random.random() < 0.9,
+                )
+                for _ in range(options['comments'])
+            ],
+            batch_size=batch_size,
+        )
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return users[0], posts[len(posts) // 2]
+
+    def endpoint_queries(self, viewer, post):
+        posts = Post.objects.with_engagement(viewer)
+        return {
+            'posts list (anonymous)': Post.objects.with_engagement().order_by('-created_at')[:10],
+            'posts list (authenticated)': posts.filter(~Q(author=viewer)).order_by('-created_at')[:10],
+            'posts ordering=-read_count': posts.order_by('-read_count', '-id')[:10],
+            'posts ordering=-likes_count': posts.order_by('-likes_count', '-id')[:10],
+            'my_posts': posts.filter(author=viewer).order_by('-created_at')[:10],
+            'comments ?post=': Comment.objects.filter(
+                Q(post=post) & (Q(is_approved=True) | Q(user=viewer))
+            ).order_by('-created_at'),
+            'admin comment queue': Comment.objects.filter(is_approved=False).order_by('-created_at')[:10],
+        }
+
+    def explain_all(self, queries, label):
+        options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+        self.stdout.write(self.style.MIGRATE_HEADING(f'=== {label} ==='))
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            self.stdout.write(queryset.explain(**options))
+            self.stdout.write('')
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from blog_app import read_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered post read counts to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep running and flush every INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            written = read_counts.flush(batch_size=options['batch_size'])
+            self.stdout.write(f'Flushed {written} read(s)')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
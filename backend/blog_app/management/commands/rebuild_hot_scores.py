@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from blog_app import ranking
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.hot_score from the engagement counters, e.g. after changing POST_HOT_WEIGHTS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = ranking.rebuild(Post.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the hot score of {rebuilt} post(s)'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Repair drift between Post.likes_count and the likes through table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted posts without writing the corrected counts',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        actual = (
+            Post.likes.through.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        drifted = (
+            Post.objects.annotate(actual_likes=Coalesce(Subquery(actual), 0))
+            .exclude(likes_count=F('actual_likes'))
+            .values_list('pk', 'likes_count', 'actual_likes')
+            .order_by('pk')
+        )
+
+        fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(drifted.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for pk, stored, real in batch:
+                self.stdout.write(f'Post {pk}: likes_count {stored} -> {real}')
+            if not options['dry_run']:
+                Post.objects.bulk_update(
+                    [Post(pk=pk, likes_count=real) for pk, _, real in batch],
+                    ['likes_count'],
+                )
+            fixed += len(batch)
+
+        verb = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} drifted post(s)'))
@@ -0,0 +1,35 @@
+import os
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog_app import media
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Re-run media uploads left in the spool by failures or worker restarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=10,
+            help='Only retry pending posts not updated for this many minutes',
+        )
+
+    def handle(self, *args, **options):
+        spooled = media.spooled_uploads()
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        posts = Post.objects.filter(pk__in=spooled).only('id', 'media_status', 'updated_at').in_bulk()
+
+        retried = 0
+        for post_id, files in spooled.items():
+            post = posts.get(post_id)
+            if post is None:
+                for _, path in files:
+                    os.remove(path)
+                self.stdout.write(f'Post {post_id} no longer exists; discarded its spooled files')
+                continue
+            if post.media_status == Post.MEDIA_PENDING and post.updated_at > cutoff:
+                continue
+            media.transfer(post_id, files)
+            retried += 1
+        self.stdout.write(self.style.SUCCESS(f'Retried uploads for {retried} post(s)'))
@@ -0,0 +1,193 @@
+"""
+Background media upload pipeline.
+
+``PostSerializer`` no longer uploads to Cloudinary inside the request.
+Instead ``schedule_upload()`` spools each uploaded image or PDF to
+``MEDIA_SPOOL_DIR`` and marks the post ``media_status=pending``. It then
+hands the transfer to the background pool in ``blog_app.tasks``. The
+transfer retries with backoff and stores the result on the post with a
+single UPDATE.
+
+The remote store is swappable through ``MEDIA_UPLOAD_BACKEND``:
+``CloudinaryBackend`` in production, or ``LocalFileSystemBackend`` to work
+offline.
+
+Once a file is stored, every URL the API will serve for it is computed
+once and saved in ``Post.media_urls``. For images that means a
+``srcset``-ready set of widths (``MEDIA_IMAGE_WIDTHS``) in the original
+format plus each of ``MEDIA_IMAGE_FORMATS``. Serializing a post then does
+no URL building.
+"""
+import logging
+import os
+import shutil
+import time
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .models import Post
+from . import feed_cache, tasks
+
+logger = logging.getLogger(__name__)
+
+MEDIA_FIELDS = ('image', 'file')
+
+
+class CloudinaryBackend:
+    def upload(self, path, field):
+        from cloudinary import uploader
+        resource = uploader.upload_resource(
+            path, type=field.type, resource_type=field.resource_type
+        )
+        return resource.get_prep_value()
+
+    def url(self, value, field, width=None, format=None):
+        options = {'secure': True}
+        if width:
+            options.update(width=width, crop='limit', quality='auto')
+        if format:
+            options['format'] = format
+        return field.to_python(value).build_url(**options)
+
+
+class LocalFileSystemBackend:
+    """
+    Copies files under ``MEDIA_ROOT`` and stores Cloudinary-style ids.
+
+    It doesn't resize or convert images: ``url()`` ignores ``width`` and
+    ``format``, so every rendition and ``srcset`` entry points at the
+    original file.
+    """
+
+    def upload(self, path, field):
+        name = os.path.basename(path)
+        public_id, ext = os.path.splitext(name)
+        dest = os.path.join(settings.MEDIA_ROOT, field.resource_type, field.type)
+        os.makedirs(dest, exist_ok=True)
+        shutil.copyfile(path, os.path.join(dest, name))
+        return f"{field.resource_type}/{field.type}/{public_id}{ext}"
+
+    def url(self, value, field, width=None, format=None):
+        # No transformation service offline: every rendition is the original
+        return f"{settings.MEDIA_URL}{value}"
+
+
+def get_backend():
+    return import_string(settings.MEDIA_UPLOAD_BACKEND)()
+
+
+def image_renditions(backend, field, value):
+    widths = settings.MEDIA_IMAGE_WIDTHS
+
+    def srcset(format=None):
+        return ', '.join(
+            f"{backend.url(value, field, width=width, format=format)} {width}w"
+            for width in sorted(set(widths.values()))
+        )
+
+    renditions = {name: backend.url(value, field, width=width) for name, width in widths.items()}
+    renditions.update({
+        'original': backend.url(value, field),
+        'srcset': srcset(),
+        'sources': [
+            {'type': f'image/{format}', 'srcset': srcset(format)}
+            for format in settings.MEDIA_IMAGE_FORMATS
+        ],
+    })
+    return renditions
+
+
+def build_media_urls(values, backend=None):
+    """``Post.media_urls`` for stored ``{'image': value, 'file': value}``."""
+    backend = backend or get_backend()
+    image_field = Post._meta.get_field('image')
+    file_field = Post._meta.get_field('file')
+    image = image_field.get_prep_value(values.get('image'))
+    file = file_field.get_prep_value(values.get('file'))
+    urls = {}
+    if image:
+        urls['image'] = image_renditions(backend, image_field, image)
+    if file:
+        urls['file'] = backend.url(file, file_field)
+    return urls
+
+
+def spool_path(post_id, field_name, uploaded):
+    ext = os.path.splitext(uploaded.name)[1].lower()
+    return os.path.join(settings.MEDIA_SPOOL_DIR, f'post{post_id}_{field_name}{ext}')
+
+
+def spool(uploaded, path):
+    """Write an UploadedFile to ``path``, moving it if Django already spooled it to disk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if hasattr(uploaded, 'temporary_file_path'):
+        shutil.move(uploaded.temporary_file_path(), path)
+        return
+    with open(path, 'wb') as out:
+        for chunk in uploaded.chunks():
+            out.write(chunk)
+
+
+def schedule_upload(post, **uploads):
+    """
+    Spool ``uploads`` (``image=``/``file=`` UploadedFiles) for ``post`` and
+    transfer them in the background. The caller sets ``media_status``.
+    """
+    spooled = []
+    for field_name, uploaded in uploads.items():
+        if uploaded:
+            path = spool_path(post.pk, field_name, uploaded)
+            spool(uploaded, path)
+            spooled.append((field_name, path))
+    if spooled:
+        tasks.submit(transfer, post.pk, spooled)
+    return spooled
+
+
+def transfer(post_id, spooled):
+    """Upload spooled files for ``post_id`` and record the outcome."""
+    backend = get_backend()
+    values = {}
+    failed = False
+    for field_name, path in spooled:
+        field = Post._meta.get_field(field_name)
+        for attempt in range(1, settings.MEDIA_UPLOAD_MAX_ATTEMPTS + 1):
+            try:
+                values[field_name] = backend.upload(path, field)
+                break
+            except Exception as e:
+                logger.warning(f"Upload of {path} failed (attempt {attempt}): {str(e)}")
+                if attempt < settings.MEDIA_UPLOAD_MAX_ATTEMPTS:
+                    time.sleep(settings.MEDIA_UPLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+        else:
+            failed = True
+            continue
+        os.remove(path)
+
+    status = Post.MEDIA_FAILED if failed else Post.MEDIA_READY
+    updates = {'media_status': status, **values}
+    if values:
+        current = Post.objects.filter(pk=post_id).values(*MEDIA_FIELDS).first()
+        if current is None:
+            return
+        updates['media_urls'] = build_media_urls({**current, **values}, backend)
+    Post.objects.filter(pk=post_id).update(**updates)
+    feed_cache.invalidate_posts([post_id])
+    if failed:
+        logger.error(f"Media upload for post {post_id} failed; files kept in the spool")
+    else:
+        logger.info(f"Media upload for post {post_id} complete")
+
+
+def spooled_uploads():
+    """``{post_id: [(field_name, path), ...]}`` for every file still in the spool."""
+    pending = {}
+    if not os.path.isdir(settings.MEDIA_SPOOL_DIR):
+        return pending
+    for name in sorted(os.listdir(settings.MEDIA_SPOOL_DIR)):
+        stem = os.path.splitext(name)[0]
+        post_part, _, field_name = stem.partition('_')
+        if not post_part.startswith('post') or field_name not in MEDIA_FIELDS:
+            continue
+        path = os.path.join(settings.MEDIA_SPOOL_DIR, name)
+        pending.setdefault(int(post_part[4:]), []).append((field_name, path))
+    return pending
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:22
+
+import blog_app.models
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    # tsvector only exists on PostgreSQL; other databases (SQLite in tests)
+    # fall back to icontains search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Post = apps.get_model('blog_app', 'Post')
+    config = settings.SEARCH_CONFIG
+    Post.objects.update(
+        search_vector=SearchVector('title', weight='A', config=config)
+        + SearchVector('content', weight='B', config=config)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0003_post_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=blog_app.models.SearchVectorIndex(fields=['search_vector'], name='post_search_idx'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:27
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_existing_media_ready(apps, schema_editor):
+    Post = apps.get_model('blog_app', 'Post')
+    has_media = (Q(image__isnull=False) & ~Q(image='')) | (Q(file__isnull=False) & ~Q(file=''))
+    Post.objects.filter(has_media).update(media_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0004_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_status',
+            field=models.CharField(choices=[('none', 'No media'), ('pending', 'Upload pending'), ('ready', 'Ready'), ('failed', 'Upload failed')], default='none', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_media_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0005_post_media_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_urls',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
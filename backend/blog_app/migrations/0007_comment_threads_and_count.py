@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_count(apps, schema_editor):
+    Post = apps.get_model('blog_app', 'Post')
+    Comment = apps.get_model('blog_app', 'Comment')
+    approved = (
+        Comment.objects.filter(post=OuterRef('pk'), is_approved=True)
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Post.objects.update(comment_count=Coalesce(Subquery(approved), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0006_post_media_urls'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='blog_app.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog_app.comment'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread', 'created_at'], name='comment_thread_idx'),
+        ),
+        migrations.RunPython(backfill_comment_count, migrations.RunPython.noop),
+    ]
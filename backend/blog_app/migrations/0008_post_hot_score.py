@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:47
+
+import math
+from datetime import datetime, timezone
+
+import blog_app.ranking
+from django.conf import settings
+from django.db import migrations, models
+
+# The scoring of blog_app.ranking as it was when this migration was written,
+# so the backfill doesn't change with the app. After changing the weights or
+# the half-life, `manage.py rebuild_hot_scores` recomputes scores instead.
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = 24 * 60 * 60
+WEIGHTS = {'post': 10, 'read': 1, 'like': 5, 'comment': 10}
+
+
+def initial_score(created_at, reads, likes, comments):
+    weight = (
+        WEIGHTS['post'] + reads * WEIGHTS['read'] + likes * WEIGHTS['like']
+        + comments * WEIGHTS['comment']
+    )
+    return math.log(weight) + math.log(2) / HALF_LIFE * (created_at - EPOCH).total_seconds()
+
+
+def backfill_hot_score(apps, schema_editor):
+    Post = apps.get_model('blog_app', 'Post')
+    rows = Post.objects.order_by('pk').values_list(
+        'pk', 'created_at', 'read_count', 'likes_count', 'comment_count'
+    )
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:1000])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        Post.objects.bulk_update(
+            [
+                Post(pk=pk, hot_score=initial_score(created_at, reads, likes, comments))
+                for pk, created_at, reads, likes, comments in batch
+            ],
+            ['hot_score'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0007_comment_threads_and_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            # Django can only reference a callable default, so new_post_score
+            # has to stay importable; the backfill above doesn't use the app
+            field=models.FloatField(default=blog_app.ranking.new_post_score, editable=False),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+    ]
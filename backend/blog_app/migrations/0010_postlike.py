@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def date_existing_likes(apps, schema_editor):
+    # When they happened isn't known; date them to the post's creation, as
+    # rebuild_hot_scores does, so an unlike never takes back more than they added
+    Post = apps.get_model('blog_app', 'Post')
+    PostLike = apps.get_model('blog_app', 'PostLike')
+    PostLike.objects.update(
+        created_at=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0009_follow'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The auto-created through table already has these columns and its
+        # unique index; only Django's view of it changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostLike',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('customuser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog_app.post')),
+                    ],
+                    options={
+                        'db_table': 'blog_app_post_likes',
+                        'unique_together': {('post', 'customuser')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='likes',
+                    field=models.ManyToManyField(blank=True, related_name='liked_posts', through='blog_app.PostLike', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='postlike',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(date_existing_likes, migrations.RunPython.noop),
+    ]
@@ -1,29 +1,204 @@
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from cloudinary.models import CloudinaryField
+from . import ranking
 
 User = get_user_model()
 
+class PostQuerySet(models.QuerySet):
+    def with_engagement(self, user=None):
+        """Annotate is_liked and join the author so serializing a page is N+1 free."""
+        queryset = self.select_related('author').defer('search_vector')
+        if user is not None and user.is_authenticated:
+            liked = PostLike.objects.filter(post=OuterRef('pk'), customuser=user)
+            return queryset.annotate(is_liked=Exists(liked))
+        return queryset.annotate(is_liked=Value(False))
+
+    def refresh_comment_counts(self):
+        """Recount approved comments for every post in the queryset."""
+        approved = (
+            Comment.objects.filter(post=OuterRef('pk'), is_approved=True)
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(comment_count=Coalesce(Subquery(approved), 0))
+
+    def update_search_vector(self):
+        """Recompute search_vector for every post in the queryset. PostgreSQL only."""
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=search_document('title', 'content'))
+
+
+def search_document(title, content):
+    """Weighted tsvector of a title and content (column names or expressions)."""
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector(title, weight='A', config=config)
+        + SearchVector(content, weight='B', config=config)
+    )
+
+class SearchVectorIndex(GinIndex):
+    """
+    ``search_vector``'s GIN index. tsvector and GIN only exist on PostgreSQL;
+    other databases (SQLite in tests) get a plain index, and search there
+    falls back to icontains anyway.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
 class Post(models.Model):
+    MEDIA_NONE = 'none'
+    MEDIA_PENDING = 'pending'
+    MEDIA_READY = 'ready'
+    MEDIA_FAILED = 'failed'
+    MEDIA_STATUS_CHOICES = [
+        (MEDIA_NONE, 'No media'),
+        (MEDIA_PENDING, 'Upload pending'),
+        (MEDIA_READY, 'Ready'),
+        (MEDIA_FAILED, 'Upload failed'),
+    ]
+
     title = models.CharField(max_length=200)
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     image = CloudinaryField('image', blank=True, null=True)
     file = CloudinaryField('file', blank=True, null=True)
+    # Uploads are transferred by blog_app.media in the background
+    media_status = models.CharField(max_length=10, choices=MEDIA_STATUS_CHOICES, default=MEDIA_NONE)
+    # Precomputed image renditions and file URL, see blog_app.media.build_media_urls
+    media_urls = models.JSONField(default=dict, blank=True)
     read_count = models.PositiveIntegerField(default=0)
-    likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    likes = models.ManyToManyField(User, related_name='liked_posts', blank=True, through='PostLike')
+    # Denormalized count of ``likes``; kept in step by PostViewSet.like and
+    # repaired by the reconcile_like_counts management command.
+    likes_count = models.PositiveIntegerField(default=0)
+    # Denormalized count of approved comments; recounted by the Comment
+    # signal handlers and by bulk moderation.
+    comment_count = models.PositiveIntegerField(default=0)
+    # Log-space, time-decayed engagement behind /posts/trending/ (blog_app.ranking)
+    hot_score = models.FloatField(default=ranking.new_post_score, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title/content tsvector behind /posts/search/
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Feed (list, keyset pages) and my_posts
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['author', '-created_at'], name='post_author_created_idx'),
+            # ordering=-read_count / -likes_count with the keyset tie-breaker
+            models.Index(fields=['-read_count', '-id'], name='post_read_count_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='post_likes_count_idx'),
+            # /posts/trending/ pages
+            models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+            SearchVectorIndex(fields=['search_vector'], name='post_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        reindex = connection.vendor == 'postgresql' and (
+            update_fields is None or {'title', 'content'} & set(update_fields)
+        )
+        if reindex:
+            # Computed from literal values so it rides along in the same INSERT/UPDATE
+            self.search_vector = search_document(
+                Value(self.title, output_field=models.TextField()),
+                Value(self.content, output_field=models.TextField()),
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+        if reindex:
+            # Leave the column deferred rather than holding the expression
+            del self.search_vector
+
+class PostLike(models.Model):
+    """
+    A user's like of a post. Was Django's auto-created through table, whose
+    table and columns it keeps; ``created_at`` lets an unlike take back
+    exactly the ``hot_score`` its like added.
+    """
+    id = models.AutoField(primary_key=True)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    customuser = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'blog_app_post_likes'
+        unique_together = [('post', 'customuser')]
+
+    def __str__(self):
+        return f"{self.customuser} likes {self.post}"
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
+    parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies'
+    )
+    # Top-level comment of the thread (null for top-level comments), so the
+    # replies of a page of threads load in one query
+    thread = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='+', editable=False
+    )
     content = models.TextField()
     is_approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Comments of a post, filtered on approval, newest first
+            models.Index(fields=['post', 'is_approved', '-created_at'], name='comment_post_approved_idx'),
+            # AdminCommentViewSet moderation queue
+            models.Index(
+                fields=['-created_at'], name='comment_pending_idx', condition=Q(is_approved=False)
+            ),
+            # Replies of a page of threads, oldest first
+            models.Index(fields=['thread', 'created_at'], name='comment_thread_idx'),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user.email} on {self.post.title}"
+
+    def save(self, *args, **kwargs):
+        if self.parent_id is not None and self.thread_id is None:
+            self.thread_id = self.parent.thread_id or self.parent_id
+        super().save(*args, **kwargs)
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also serves "authors followed by a user"
+            models.UniqueConstraint(fields=['follower', 'author'], name='follow_unique'),
+            models.CheckConstraint(condition=~Q(follower=F('author')), name='follow_not_self'),
+        ]
+        indexes = [
+            # Fan-out walks an author's followers in follower order
+            models.Index(fields=['author', 'follower'], name='follow_author_idx'),
+        ]
+
     def __str__(self):
-        return f"Comment by {self.user.email} on {self.post.title}"
\ No newline at end of file
+        return f"{self.follower} follows {self.author}"
@@ -0,0 +1,131 @@
+"""
+Bulk comment moderation.
+
+A selection of comments (explicit ids and/or a post, user, approval state
+and created_at range) is approved, blocked or deleted with set-based
+statements instead of one load and save per comment. Selections are walked
+in primary-key chunks of ``chunk_size``. Each chunk is one ``UPDATE`` or
+``DELETE`` in its own transaction, so a selection of any size never holds
+locks for long and progress can be reported between chunks.
+
+Deleting a comment deletes its replies with it. The replies are collected
+inside the chunk's transaction and locked as they are found, so a reply
+posted meanwhile waits for the delete instead of being orphaned. Bulk
+statements send no
+model signals, so each chunk recounts ``Post.comment_count`` for the posts
+it touched and invalidates them in ``feed_cache`` once it commits. Approved
+comments count towards ``Post.hot_score`` and are announced through
+``events``, along with the new counts.
+"""
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models.sql import DeleteQuery
+from .models import Comment, Post
+from . import events, feed_cache, ranking
+
+APPROVE = 'approve'
+BLOCK = 'block'
+DELETE = 'delete'
+ACTIONS = (APPROVE, BLOCK, DELETE)
+# Ids per IN (...) list, well inside every backend's parameter limit
+ID_BATCH = 500
+
+
+def select(ids=None, post=None, user=None, is_approved=None, created_after=None, created_before=None):
+    queryset = Comment.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if post is not None:
+        queryset = queryset.filter(post_id=post)
+    if user is not None:
+        queryset = queryset.filter(user_id=user)
+    if is_approved is not None:
+        queryset = queryset.filter(is_approved=is_approved)
+    if created_after is not None:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before is not None:
+        queryset = queryset.filter(created_at__lt=created_before)
+    return queryset
+
+
+def _batches(ids):
+    for start in range(0, len(ids), ID_BATCH):
+        yield ids[start:start + ID_BATCH]
+
+
+def with_replies(ids):
+    """
+    The comments ``ids`` that still exist plus every reply below them, at any
+    depth, each locked with ``SELECT ... FOR UPDATE``. Call it inside the
+    transaction that deletes them: a reply can't be added to a locked comment
+    until that transaction ends.
+    """
+    comments = Comment.objects.select_for_update().order_by()
+    level = [
+        pk for batch in _batches(list(ids))
+        for pk in comments.filter(pk__in=batch).values_list('pk', flat=True)
+    ]
+    found = []
+    while level:
+        found += level
+        level = [
+            pk for batch in _batches(level)
+            for pk in comments.filter(parent_id__in=batch).values_list('pk', flat=True)
+        ]
+    return found
+
+
+def record_approvals(approved_per_post):
+    """Add newly approved comments to ``hot_score``, one UPDATE per distinct count."""
+    by_count = defaultdict(list)
+    for post_id, count in approved_per_post.items():
+        by_count[count].append(post_id)
+    for count, post_ids in by_count.items():
+        Post.objects.filter(pk__in=post_ids).update(hot_score=ranking.with_event('comment', count))
+
+
+def delete_comments(ids):
+    """
+    Delete the comments ``ids`` with plain ``DELETE`` statements of a bounded
+    size. Comment has delete signal receivers, which would make
+    ``QuerySet.delete()`` load, recount and invalidate for every row; callers
+    recount and invalidate per chunk. ``ids`` must come from
+    ``with_replies()`` in the same transaction. Returns the number deleted.
+    """
+    return sum(DeleteQuery(Comment).delete_batch(batch, Comment.objects.db) for batch in _batches(list(ids)))
+
+
+def apply(queryset, action, chunk_size=1000):
+    """
+    Apply ``action`` to every comment in ``queryset``, one chunk at a time.
+    Yields the number of comments changed by each chunk.
+    """
+    if action == APPROVE:
+        queryset = queryset.filter(is_approved=False)
+    elif action == BLOCK:
+        queryset = queryset.filter(is_approved=True)
+
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'post_id')[:chunk_size]
+        )
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        post_ids = {post_id for _, post_id in rows}
+
+        with transaction.atomic():
+            if action == DELETE:
+                count = delete_comments(with_replies([pk for pk, _ in rows]))
+            else:
+                chunk = Comment.objects.filter(pk__in=[pk for pk, _ in rows])
+                count = chunk.update(is_approved=action == APPROVE)
+            Post.objects.filter(pk__in=post_ids).refresh_comment_counts()
+            if action == APPROVE:
+                record_approvals(Counter(post_id for _, post_id in rows))
+            transaction.on_commit(lambda post_ids=post_ids: feed_cache.invalidate_posts(post_ids))
+        if action == APPROVE:
+            events.publish_comments(chunk.select_related('user'))
+        events.publish_comment_counts(post_ids)
+        yield count
@@ -0,0 +1,214 @@
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PostPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination.
+
+    Clients opt in with ``?pagination=cursor`` and then follow the opaque
+    ``next``/``previous`` links. Each page is a ``WHERE (ordering) > (last
+    row)`` query on the queryset's own ordering with the primary key appended
+    as a tie-breaker, so page N costs the same as page 1 and no COUNT(*) is
+    issued. Requests that don't opt in are handed to ``fallback_class``, or
+    left unpaginated when it is None. Subclasses with ``opt_in = False``
+    always paginate with cursors.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    default_ordering = ('-created_at',)
+    fallback_class = None
+    opt_in = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        return (
+            not self.opt_in
+            or self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if not self.is_requested(request):
+            if self.fallback_class is None:
+                return None
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        values, reverse = self.decode_cursor(encoded) if encoded else (None, False)
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering:
+            ordering = list(self.default_ordering)
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            # Break ties on the primary key, in the same direction as the last field
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'o': self.ordering, 'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.ordering):
+                raise ValueError('cursor does not match the requested ordering')
+            values = [
+                self._field(name).to_python(value) if self._field(name) else value
+                for name, value in zip(self.ordering, payload['v'])
+            ]
+            return values, bool(payload['r'])
+        except (TypeError, KeyError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _link(self, obj, reverse):
+        values = []
+        for name in self.ordering:
+            field = self._field(name)
+            values.append(field.value_to_string(obj) if field else getattr(obj, name.lstrip('-')))
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def _field(self, name):
+        name = name.lstrip('-')
+        if name == 'pk':
+            return self.model._meta.pk
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, values):
+        """
+        Rows strictly after ``values`` in ``ordering``, as an OR of prefixes.
+        A None value (``rank`` where full-text search isn't available) only
+        matches NULLs, so the fields after it, in the end the primary key,
+        decide the order.
+        """
+        condition = Q()
+        for index, field in enumerate(ordering):
+            if values[index] is None:
+                continue
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            prefix = {f.lstrip('-'): value for f, value in zip(ordering[:index], values)}
+            condition |= Q(**prefix, **{f'{name}__{lookup}': values[index]})
+        return condition
+
+
+class PostKeysetPagination(KeysetPagination):
+    fallback_class = PostPagination
+
+
+class CommentPagination(KeysetPagination):
+    """
+    Comment lists, and the top-level comments of a thread listing. Opt-in
+    like the post feeds; without it the whole list comes back as before.
+    """
+    page_size = 20
+
+
+class ModerationQueuePagination(KeysetPagination):
+    page_size = 50
+    opt_in = False
+
+
+class TrendingPagination(KeysetPagination):
+    """/posts/trending/, always cursor-paginated on ``-hot_score``."""
+    opt_in = False
+    default_ordering = ('-hot_score',)
+
+
+class FeedPagination(KeysetPagination):
+    """/posts/feed/, always cursor-paginated, newest first."""
+    opt_in = False
+
+
+class FollowPagination(KeysetPagination):
+    page_size = 50
+    opt_in = False
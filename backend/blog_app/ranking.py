@@ -0,0 +1,110 @@
+"""
+Time-decayed "hot" ranking behind ``/posts/trending/``.
+
+A post's hotness is the sum of its engagement events (reads, likes, approved
+comments, plus one ``post`` event when it is created), each weighted by
+``POST_HOT_WEIGHTS`` and losing half its weight every ``POST_HOT_HALF_LIFE``
+seconds. Decaying every score as the clock moves would rewrite the whole
+table, so instead each event is weighted *up* by how long after ``EPOCH`` it
+happened. Scores that aren't touched never change, yet the order is the
+same as with decay. That weighting grows exponentially, so
+``Post.hot_score`` holds the logarithm of the sum and events are added in
+log space.
+
+Events are recorded with ``with_event()``/``without_event()``, expressions
+for a set-based ``UPDATE`` of ``hot_score`` that can ride along with the
+counter update the event already makes. ``post_hot_idx`` turns a trending
+page into an index range scan.
+"""
+import math
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Least, Ln
+from django.utils import timezone as django_timezone
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# exp() of anything below this is negligible next to 1, and PostgreSQL
+# raises on underflow rather than returning 0
+MAX_GAP = 50.0
+
+
+def decay_rate():
+    return math.log(2) / settings.POST_HOT_HALF_LIFE
+
+
+def event_score(event, count=1, when=None):
+    """Log-space score of ``count`` ``event``s (a ``POST_HOT_WEIGHTS`` key) at ``when``."""
+    when = when or django_timezone.now()
+    weight = settings.POST_HOT_WEIGHTS[event] * count
+    return math.log(weight) + decay_rate() * (when - EPOCH).total_seconds()
+
+
+def new_post_score():
+    """``Post.hot_score`` default: the ``post`` event, at creation."""
+    return event_score('post')
+
+
+def with_event(event, count=1, when=None):
+    """``hot_score`` plus ``count`` ``event``s: log(exp(hot_score) + exp(event score))."""
+    score = Value(event_score(event, count, when), output_field=FloatField())
+    current = F('hot_score')
+    return Greatest(current, score) + Ln(1 + Exp(-Least(Abs(current - score), Value(MAX_GAP))))
+
+
+def without_event(event, count=1, when=None):
+    """
+    ``hot_score`` minus ``count`` ``event``s at ``when``. Events weigh more
+    the later they happen, so undoing one (unliking) passes the time of the
+    event itself to take back exactly what it added. Scores too small to
+    take it from are left as they are.
+    """
+    score = event_score(event, count, when)
+    current = F('hot_score')
+    return Case(
+        When(
+            Q(hot_score__gt=score + 1e-9),
+            then=current + Ln(1 - Exp(Greatest(Value(score) - current, Value(-MAX_GAP)))),
+        ),
+        default=current,
+        output_field=FloatField(),
+    )
+
+
+def initial_score(created_at, reads=0, likes=0, comments=0):
+    """Score of a post whose engagement all happened at ``created_at``."""
+    weights = settings.POST_HOT_WEIGHTS
+    weight = (
+        weights['post'] + reads * weights['read'] + likes * weights['like']
+        + comments * weights['comment']
+    )
+    return math.log(weight) + decay_rate() * (created_at - EPOCH).total_seconds()
+
+
+def rebuild(queryset, batch_size=1000):
+    """
+    Recompute ``hot_score`` for every post in ``queryset`` from its counters.
+    Reads and likes carry no timestamps, so all of a post's engagement is
+    dated to its creation. Used to backfill, and after changing the weights
+    or the half-life. Returns the number of posts rewritten.
+    """
+    model = queryset.model
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'created_at', 'read_count', 'likes_count', 'comment_count'
+    )
+    rebuilt = 0
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return rebuilt
+        last_pk = batch[-1][0]
+        model.objects.bulk_update(
+            [
+                model(pk=pk, hot_score=initial_score(created_at, reads, likes, comments))
+                for pk, created_at, reads, likes, comments in batch
+            ],
+            ['hot_score'],
+        )
+        rebuilt += len(batch)
@@ -0,0 +1,119 @@
+"""
+Buffered read-count ingestion.
+
+Page views are counted in the cache instead of the database. Each view does
+an atomic ``incr`` on a per-post counter; the first view of a post since the
+last flush also claims a slot in an append-only dirty list so the flusher
+knows which counters to drain. ``flush()`` (run by the ``flush_read_counts``
+management command) moves the buffered counts into ``Post.read_count`` with
+batched ``F()`` updates, so no request ever rewrites the post row.
+"""
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.connection import ConnectionProxy
+from .models import Post
+from . import feed_cache, ranking
+
+logger = logging.getLogger(__name__)
+
+cache = ConnectionProxy(caches, 'counters')
+
+PENDING_KEY = 'read_count:pending:{post_id}'
+DIRTY_KEY = 'read_count:dirty:{post_id}'
+SLOT_KEY = 'read_count:slot:{slot}'
+SEQUENCE_KEY = 'read_count:sequence'
+FLUSHED_KEY = 'read_count:flushed'
+SEEN_KEY = 'read_count:seen:{post_id}:{viewer}'
+LOCK_KEY = 'read_count:flush_lock'
+LOCK_TIMEOUT = 300
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key, delta)
+
+
+def record_view(post_id, viewer=None):
+    """
+    Buffer one read of ``post_id``.
+
+    When ``READ_COUNT_DEDUPE_WINDOW`` is set, repeat views by the same
+    ``viewer`` (a user id or session key) inside the window are ignored.
+    Returns True if the view was counted.
+    """
+    window = getattr(settings, 'READ_COUNT_DEDUPE_WINDOW', 0)
+    if window and viewer is not None:
+        seen_key = SEEN_KEY.format(post_id=post_id, viewer=viewer)
+        if not cache.add(seen_key, 1, timeout=window):
+            return False
+
+    _incr(PENDING_KEY.format(post_id=post_id))
+    if cache.add(DIRTY_KEY.format(post_id=post_id), 1, timeout=None):
+        slot = _incr(SEQUENCE_KEY)
+        cache.set(SLOT_KEY.format(slot=slot), post_id, timeout=None)
+    return True
+
+
+def flush(batch_size=500):
+    """
+    Drain buffered views into ``Post.read_count`` and ``Post.hot_score``.
+    Returns the number of views written. Only one flush runs at a time
+    across all workers.
+    """
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        logger.info("Read count flush already running, skipping")
+        return 0
+    try:
+        return _flush(batch_size)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _flush(batch_size):
+    flushed_to = cache.get(FLUSHED_KEY, 0)
+    sequence = cache.get(SEQUENCE_KEY, 0)
+    written = 0
+
+    while flushed_to < sequence:
+        upto = min(flushed_to + batch_size, sequence)
+        slot_keys = [SLOT_KEY.format(slot=slot) for slot in range(flushed_to + 1, upto + 1)]
+        post_ids = set(cache.get_many(slot_keys).values())
+
+        by_count = defaultdict(list)
+        for post_id in post_ids:
+            # Clear the dirty marker first: a view landing after this point
+            # claims a fresh slot, so nothing is stranded in the counter.
+            cache.delete(DIRTY_KEY.format(post_id=post_id))
+            pending_key = PENDING_KEY.format(post_id=post_id)
+            count = cache.get(pending_key, 0)
+            if count:
+                cache.decr(pending_key, count)
+                by_count[count].append(post_id)
+
+        for count, ids in by_count.items():
+            Post.objects.filter(pk__in=ids).update(
+                read_count=F('read_count') + count,
+                hot_score=ranking.with_event('read', count),
+            )
+            written += count * len(ids)
+        if by_count:
+            # Queryset updates send no signals, so drop stale cached reads here
+            feed_cache.invalidate_posts(
+                [pk for ids in by_count.values() for pk in ids], ordering=['read_count'],
+            )
+
+        cache.delete_many(slot_keys)
+        cache.set(FLUSHED_KEY, upto, timeout=None)
+        flushed_to = upto
+
+    if written:
+        logger.info(f"Flushed {written} buffered post reads")
+    return written
+
+
+def pending(post_id):
+    """Views of ``post_id`` buffered but not yet flushed."""
+    return cache.get(PENDING_KEY.format(post_id=post_id), 0)
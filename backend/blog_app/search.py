@@ -0,0 +1,70 @@
+"""
+Full-text search over posts.
+
+On PostgreSQL, searches match ``Post.search_vector`` (title weighted above
+content, GIN indexed) and results are ranked with ``SearchRank`` and
+highlighted with ``SearchHeadline``. Other databases, SQLite in tests, fall
+back to DRF's ``icontains`` search over the same fields, so both match the
+same posts. Author emails are not searched on either: they aren't part of
+the document, and searching them would let anyone probe for an address.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q, TextField, Value
+from rest_framework import filters
+
+# The columns behind Post.search_vector (blog_app.models.search_document)
+SEARCH_FIELDS = ['title', 'content']
+
+HEADLINE_OPTIONS = {
+    'start_sel': '<mark>',
+    'stop_sel': '</mark>',
+    'max_words': 35,
+    'min_words': 15,
+    'max_fragments': 2,
+}
+
+
+def is_full_text_supported():
+    return connection.vendor == 'postgresql'
+
+
+def make_query(terms):
+    return SearchQuery(terms, config=settings.SEARCH_CONFIG, search_type='websearch')
+
+
+def search_posts(queryset, terms):
+    """
+    Filter ``queryset`` to posts matching ``terms``, best match first, with
+    ``rank``, ``title_highlight`` and ``content_highlight`` annotations.
+    """
+    if not is_full_text_supported():
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': terms})
+        return queryset.filter(condition).annotate(
+            rank=Value(None, output_field=FloatField()),
+            title_highlight=Value(None, output_field=TextField()),
+            content_highlight=Value(None, output_field=TextField()),
+        ).order_by('-created_at', '-id')
+
+    query = make_query(terms)
+    config = settings.SEARCH_CONFIG
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+        title_highlight=SearchHeadline('title', query, config=config, **HEADLINE_OPTIONS),
+        content_highlight=SearchHeadline('content', query, config=config, **HEADLINE_OPTIONS),
+    ).order_by('-rank', '-id')
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``?search=`` backed by the search_vector GIN index where available."""
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_full_text_supported():
+            return super().filter_queryset(request, queryset, view)
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        return queryset.filter(search_vector=make_query(terms))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Post, Comment
+from .models import Post, Comment, Follow
+from . import media, moderation
 from django.contrib.auth import get_user_model
 import os
 import re
@@ -13,11 +14,12 @@ class UserSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     
     image_url = serializers.SerializerMethodField()
     file_url = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
     
     image = serializers.ImageField(write_only=True, required=False, allow_null=True)
     file = serializers.FileField(write_only=True, required=False, allow_null=True)
@@ -26,9 +28,10 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = [
             'id', 'title', 'content', 'author', 'image', 'file', 
-            'image_url', 'file_url', 'read_count', 'likes_count', 
-            'is_liked', 'created_at', 'updated_at'
+            'image_url', 'file_url', 'image_renditions', 'media_status', 'read_count', 'likes_count', 
+            'comment_count', 'is_liked', 'created_at', 'updated_at'
         ]
+        read_only_fields = ['media_status', 'comment_count']
     
     def validate_title(self, value):
         if not value:
@@ -77,37 +80,41 @@ class PostSerializer(serializers.ModelSerializer):
                 )
         return value
     
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
     def get_is_liked(self, obj):
+        # Querysets from Post.objects.with_engagement() carry the annotation
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
         return False
     
     def get_image_url(self, obj):
+        if 'image' in obj.media_urls:
+            return obj.media_urls['image']['original']
+        # Posts whose URLs haven't been built yet (see build_media_urls command)
         if obj.image:
             return obj.image.url
         return None
     
     def get_file_url(self, obj):
+        if 'file' in obj.media_urls:
+            return obj.media_urls['file']
         if obj.file:
             return obj.file.url
         return None
+
+    def get_image_renditions(self, obj):
+        return obj.media_urls.get('image')
     
     def create(self, validated_data):
         image = validated_data.pop('image', None)
         file = validated_data.pop('file', None)
         
+        if image or file:
+            validated_data['media_status'] = Post.MEDIA_PENDING
         post = Post.objects.create(**validated_data)
-        
-        if image:
-            post.image = image
-        if file:
-            post.file = file
-        
-        post.save()
+        media.schedule_upload(post, image=image, file=file)
         return post
     
     def update(self, instance, validated_data):
@@ -117,21 +124,31 @@ class PostSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        if image:
-            instance.image = image
-        if file:
-            instance.file = file
+        if image or file:
+            instance.media_status = Post.MEDIA_PENDING
         
         instance.save()
+        media.schedule_upload(instance, image=image, file=file)
         return instance
 
+class PostSearchSerializer(PostSerializer):
+    rank = serializers.FloatField(read_only=True)
+    title_highlight = serializers.CharField(read_only=True)
+    content_highlight = serializers.CharField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['rank', 'title_highlight', 'content_highlight']
+
 class CommentSerializer(serializers.ModelSerializer):
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
     user = UserSerializer(read_only=True)
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(), required=False, allow_null=True
+    )
     
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'user', 'content', 'is_approved', 'created_at']
+        fields = ['id', 'post', 'parent', 'user', 'content', 'is_approved', 'created_at']
     
     def validate_content(self, value):
         if not value:
@@ -140,4 +157,52 @@ class CommentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Comment must start with a letter or number"
             )
-        return value
\ No newline at end of file
+        return value
+
+    def validate(self, data):
+        if self.instance is not None:
+            # A reply can't be moved to another thread
+            data.pop('parent', None)
+        parent = data.get('parent')
+        if parent is not None and parent.post_id != data['post'].id:
+            raise serializers.ValidationError("Reply must belong to the same post")
+        return data
+
+
+class ThreadedCommentSerializer(CommentSerializer):
+    """A comment with its visible replies nested under ``replies``."""
+    replies = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['replies']
+
+    def get_replies(self, obj):
+        replies = getattr(obj, 'thread_replies', [])
+        return ThreadedCommentSerializer(replies, many=True, context=self.context).data
+
+
+class BulkModerationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=moderation.ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    post = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    is_approved = serializers.BooleanField(required=False, allow_null=True, default=None)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not any(name in data for name in ('ids', 'post', 'user', 'created_after', 'created_before')):
+            raise serializers.ValidationError(
+                "Select comments with ids or a post, user or date range filter"
+            )
+        return data
+
+
+class FollowSerializer(serializers.ModelSerializer):
+    author = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(is_active=True))
+    author_detail = UserSerializer(source='author', read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ['author', 'author_detail', 'created_at']
+        read_only_fields = ['created_at']
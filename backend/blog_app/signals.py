@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Post, PostLike, Comment, Follow
+from . import cdn, events, feed_cache
+
+User = get_user_model()
+
+
+# Versions are bumped after commit: bumped earlier, a read in between could
+# cache the old rows under the new version.
+
+@receiver(post_save, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    # New or edited: either can change which posts a list page holds
+    post_id = instance.pk
+    transaction.on_commit(lambda: feed_cache.invalidate_posts([post_id], listing=True))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    # The collector clears instance.pk before the transaction commits
+    post_id = instance.pk
+
+    def invalidate():
+        feed_cache.invalidate_posts([post_id], listing=True)
+        feed_cache.forget_posts([post_id])
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_related_post(sender, instance, origin=None, **kwargs):
+    # Deleting a post cascades to its comments; recounting a post that is
+    # about to go would cost one UPDATE per comment
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        return
+    post_id = instance.post_id
+    Post.objects.filter(pk=post_id).refresh_comment_counts()
+    transaction.on_commit(lambda: feed_cache.invalidate_posts([post_id]))
+    transaction.on_commit(lambda: events.publish_comment_counts([post_id]))
+
+
+# post.likes.add()/remove() and friends. PostViewSet.like writes PostLike
+# rows directly, which sends no m2m_changed; it invalidates the cache itself.
+@receiver(m2m_changed, sender=PostLike)
+def invalidate_liked_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # user.liked_posts.add(...): instance is the user, pk_set holds posts
+        if pk_set is None:
+            pk_set = Post.objects.filter(likes=instance).values_list('pk', flat=True)
+        post_ids = list(pk_set)
+    else:
+        post_ids = [instance.pk]
+    transaction.on_commit(lambda: feed_cache.invalidate_posts(post_ids, ordering=['likes_count']))
+
+
+# Post responses embed the author's username and email
+AUTHOR_FIELDS = ('username', 'email')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author_posts(sender, instance, created, update_fields=None, **kwargs):
+    # Compared with the values loaded from the database (CustomUser.from_db);
+    # a user that wasn't loaded counts as changed
+    loaded = getattr(instance, '_loaded_values', {})
+    saved = {
+        name: getattr(instance, name)
+        for name in AUTHOR_FIELDS
+        if update_fields is None or name in update_fields
+    }
+    instance._loaded_values = {**loaded, **saved}
+    changed = [name for name, value in saved.items() if name not in loaded or loaded[name] != value]
+    if created or not changed:
+        return
+    post_ids = list(Post.objects.filter(author=instance).values_list('pk', flat=True))
+    if post_ids:
+        transaction.on_commit(lambda: feed_cache.invalidate_posts(post_ids))
+        cdn.purge([cdn.author_key(instance.pk)])
+
+
+# Deleting a user cascades to their follows without going through
+# FollowViewSet, which is what keeps follower_count
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def release_followed_authors(sender, instance, **kwargs):
+    followed = Follow.objects.filter(follower=instance).values('author')
+    User.objects.filter(pk__in=followed, follower_count__gt=0).update(follower_count=F('follower_count') - 1)
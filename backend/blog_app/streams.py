@@ -0,0 +1,67 @@
+"""
+Server-Sent Events endpoint for ``blog_app.events``.
+
+The view is async, so it has to be served by the ASGI application
+(``backend.asgi``); each open stream then costs a coroutine rather than a
+worker thread.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from auth_app.authentication import CookieJWTAuthentication
+from . import events
+
+
+async def authenticate(request):
+    try:
+        result = await sync_to_async(CookieJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def parse_post_ids(value):
+    try:
+        post_ids = {int(post_id) for post_id in value.split(',') if post_id}
+    except ValueError:
+        return None
+    if not post_ids or len(post_ids) > settings.POST_EVENTS_MAX_POSTS:
+        return None
+    return post_ids
+
+
+async def post_events(request):
+    """
+    ``GET /api/blog/events/?posts=1,2,3`` streams ``likes``, ``comment``,
+    ``comment_count`` and ``read_count`` events for the given posts. Needs the
+    ``access_token`` cookie.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    post_ids = parse_post_ids(request.GET.get('posts', ''))
+    if post_ids is None:
+        return JsonResponse({
+            'error': f'posts must list between 1 and {settings.POST_EVENTS_MAX_POSTS} post ids'
+        }, status=400)
+
+    async def stream():
+        async with events.get_broker().subscribe(post_ids) as subscription:
+            yield 'retry: 5000\n\n'
+            while True:
+                message = await subscription.get(timeout=settings.POST_EVENTS_KEEPALIVE)
+                if message is None:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                event = json.loads(message)['event']
+                yield f'event: {event}\ndata: {message}\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,48 @@
+"""
+In-process background worker pool.
+
+``submit()`` runs a function on a shared thread pool once the current
+transaction commits, so request threads hand off slow I/O (media uploads,
+fan-out) and return. With ``BACKGROUND_TASKS_EAGER`` (the default under
+``manage.py test``) tasks run inline instead, which keeps tests
+deterministic.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS,
+                thread_name_prefix='blog-task',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {func.__name__} failed")
+    finally:
+        # Pool threads are long lived; don't leave their connections open
+        connection.close()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in the background after commit."""
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run, func, args, kwargs))
@@ -1,3 +1,1442 @@
-from django.test import TestCase
+"""
+Endpoint performance regression suite.
 
-# Create your tests here.
+Every endpoint routed by ``blog_app.urls`` (and, in ``auth_app.tests``,
+``auth_app.urls``) is called against a bulk-seeded dataset and checked
+against two kinds of limit:
+
+* a query budget, checked on the first call with every cache cleared, so an
+  N+1 in a serializer or viewset fails the build;
+* p50/p95 latency thresholds over ``PERF_RUNS`` calls, multiplied by
+  ``PERF_LATENCY_FACTOR`` for slow machines. Timings depend on the machine,
+  so they are only reported unless ``PERF_ENFORCE_LATENCY`` is set.
+
+Runs offline against SQLite or a local PostgreSQL (see ``DB_ENGINE``).
+``PERF_SCALE`` multiplies the seeded data volume. ``PERF_REPORT=path``
+writes a JSON report of every measurement to compare between commits.
+
+The behaviour tests at the end cover the subsystems whose mistakes don't
+show up as a query count: buffered counters, timelines, ranking, live
+events.
+"""
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import math
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Post, PostLike, Comment, Follow
+from .pagination import KeysetPagination
+from . import cdn, events, feed_cache, media, moderation, ranking, read_counts, timelines
+
+User = get_user_model()
+
+PERF_SCALE = float(os.environ.get('PERF_SCALE', 1))
+PERF_RUNS = int(os.environ.get('PERF_RUNS', 20))
+PERF_LATENCY_FACTOR = float(os.environ.get('PERF_LATENCY_FACTOR', 1))
+PERF_REPORT = os.environ.get('PERF_REPORT')
+PERF_ENFORCE_LATENCY = os.environ.get('PERF_ENFORCE_LATENCY', '').lower() in ('1', 'true', 'yes')
+
+# Default latency thresholds in milliseconds: (p50, p95)
+READ_LATENCY = (50, 150)
+WRITE_LATENCY = (100, 250)
+
+# Shared with auth_app.tests so one run writes one report
+REPORT = {}
+
+
+def seed(users=50, posts=500, likes=2500, comments=2500, replies=500, follows=500, batch_size=1000):
+    """
+    Bulk-insert a dataset scaled by ``PERF_SCALE``. Denormalized counts are
+    filled in the way the app keeps them, so responses look like production.
+    """
+    def scaled(count):
+        return max(1, int(count * PERF_SCALE))
+
+    rng = random.Random(0)
+    created_users = User.objects.bulk_create(
+        [
+            User(email=f'perf{i}@example.invalid', username=f'perfuser{i}', is_verified=True)
+            for i in range(scaled(users))
+        ],
+        batch_size=batch_size,
+    )
+    user_ids = [user.pk for user in created_users]
+
+    pairs = {(rng.choice(user_ids), rng.choice(user_ids)) for _ in range(scaled(follows))}
+    Follow.objects.bulk_create(
+        [Follow(follower_id=follower, author_id=author) for follower, author in pairs if follower != author],
+        batch_size=batch_size,
+    )
+    follower_counts = (
+        Follow.objects.filter(author=OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    User.objects.filter(pk__in=user_ids).update(follower_count=Coalesce(Subquery(follower_counts), 0))
+
+    created_posts = Post.objects.bulk_create(
+        [
+            Post(
+                title=f'Post {i} about performance',
+                content=f'Content {i} ' * 50,
+                author_id=rng.choice(user_ids),
+                read_count=rng.randint(0, 10000),
+            )
+            for i in range(scaled(posts))
+        ],
+        batch_size=batch_size,
+    )
+    post_ids = [post.pk for post in created_posts]
+
+    Like = Post.likes.through
+    pairs = {(rng.choice(post_ids), rng.choice(user_ids)) for _ in range(scaled(likes))}
+    Like.objects.bulk_create(
+        [Like(post_id=post_id, customuser_id=user_id) for post_id, user_id in pairs],
+        batch_size=batch_size,
+    )
+
+    top_level = Comment.objects.bulk_create(
+        [
+            Comment(
+                post_id=rng.choice(post_ids),
+                user_id=rng.choice(user_ids),
+                content=f'Comment {i}',
+                is_approved=rng.random() < 0.9,
+            )
+            for i in range(scaled(comments))
+        ],
+        batch_size=batch_size,
+    )
+    Comment.objects.bulk_create(
+        [
+            Comment(
+                post_id=parent.post_id,
+                user_id=rng.choice(user_ids),
+                parent=parent,
+                thread=parent,
+                content=f'Reply {i}',
+                is_approved=True,
+            )
+            for i, parent in enumerate(rng.choices(top_level, k=scaled(replies)))
+        ],
+        batch_size=batch_size,
+    )
+
+    like_counts = (
+        Like.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Post.objects.update(likes_count=Coalesce(Subquery(like_counts), 0))
+    Post.objects.refresh_comment_counts()
+    return created_users, created_posts
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def write_report():
+    if not PERF_REPORT:
+        return
+    with open(PERF_REPORT, 'w') as report:
+        json.dump({
+            'database': connection.vendor,
+            'scale': PERF_SCALE,
+            'runs': PERF_RUNS,
+            'endpoints': dict(sorted(REPORT.items())),
+        }, report, indent=2)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class EndpointPerformanceTestCase(APITestCase):
+    """
+    Base class: ``measure()`` one endpoint against its budgets. Rate limits
+    are off so repeated runs time the endpoint, not its 429.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        write_report()
+        super().tearDownClass()
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def client_for(self, user=None):
+        """A client authenticated the way the frontend is, with the access_token cookie."""
+        client = APIClient()
+        if user is not None:
+            client.cookies['access_token'] = str(RefreshToken.for_user(user).access_token)
+        return client
+
+    def measure(self, name, client, method, url, queries, latency=READ_LATENCY,
+                runs=PERF_RUNS, status=None, **kwargs):
+        """
+        Call ``url`` once under a query budget of ``queries`` and ``runs``
+        times for latency. Non-repeatable calls (deletes) pass ``runs=1``.
+        Latency is only asserted with ``PERF_ENFORCE_LATENCY``.
+        """
+        call = getattr(client, method)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = call(url, **kwargs)
+            timings = [(time.perf_counter() - start) * 1000]
+        # Read them now: every request clears the connection's query log
+        sql = [query['sql'] for query in captured.captured_queries]
+        if status is not None:
+            self.assertEqual(response.status_code, status, f'{name}: {response.content[:500]}')
+        else:
+            self.assertLess(response.status_code, 400, f'{name}: {response.content[:500]}')
+
+        for _ in range(runs - 1):
+            start = time.perf_counter()
+            call(url, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        p50, p95 = percentile(timings, 0.5), percentile(timings, 0.95)
+        p50_limit, p95_limit = (limit * PERF_LATENCY_FACTOR for limit in latency)
+        REPORT[name] = {
+            'status': response.status_code,
+            'queries': len(sql),
+            'query_budget': queries,
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p50_limit_ms': p50_limit,
+            'p95_limit_ms': p95_limit,
+            'runs': len(timings),
+        }
+        self.assertLessEqual(
+            len(sql), queries,
+            f'{name} ran {len(sql)} queries, budget is {queries}:\n' + '\n'.join(sql),
+        )
+        if not PERF_ENFORCE_LATENCY:
+            return response
+        self.assertLessEqual(p50, p50_limit, f'{name} p50 {p50:.1f}ms > {p50_limit:.0f}ms')
+        self.assertLessEqual(p95, p95_limit, f'{name} p95 {p95:.1f}ms > {p95_limit:.0f}ms')
+        return response
+
+
+class PostEndpointTests(EndpointPerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.posts = seed()
+        cls.user = cls.users[0]
+        cls.admin = User.objects.create_user(
+            email='perfadmin@example.invalid', username='perfadmin', password='Passw0rd!',
+            is_verified=True, is_staff=True,
+        )
+        cls.post = Post.objects.exclude(author=cls.user).order_by('-likes_count').first()
+        cls.own_post = Post.objects.filter(author=cls.user).first()
+
+    def test_list_anonymous(self):
+        self.measure('posts.list anonymous', self.client_for(), 'get', '/api/blog/posts/', queries=2)
+
+    def test_list_authenticated(self):
+        self.measure('posts.list', self.client_for(self.user), 'get', '/api/blog/posts/', queries=3)
+
+    def test_list_cursor(self):
+        self.measure(
+            'posts.list cursor', self.client_for(self.user), 'get',
+            '/api/blog/posts/?pagination=cursor&ordering=-likes_count', queries=2,
+        )
+
+    def test_list_search_filter(self):
+        self.measure(
+            'posts.list search', self.client_for(self.user), 'get',
+            '/api/blog/posts/?search=performance', queries=3,
+        )
+
+    # With caches cleared the post has no validators yet, which costs an exists() check
+    def test_retrieve(self):
+        self.measure(
+            'posts.retrieve', self.client_for(self.user), 'get', f'/api/blog/posts/{self.post.pk}/', queries=3,
+        )
+
+    def test_retrieve_anonymous(self):
+        self.measure(
+            'posts.retrieve anonymous', self.client_for(), 'get', f'/api/blog/posts/{self.post.pk}/', queries=2,
+        )
+
+    def test_list_compressed(self):
+        response = self.measure(
+            'posts.list gzip', self.client_for(), 'get', '/api/blog/posts/', queries=2,
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertRegex(response['ETag'], r'^"[0-9a-f]+-gzip"$')
+
+    def test_list_compressed_not_modified(self):
+        client = self.client_for()
+        etag = client.get('/api/blog/posts/', HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.measure(
+            'posts.list gzip not modified', client, 'get', '/api/blog/posts/', queries=0, status=304,
+            HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response['ETag'], etag)
+        # The identity representation has its own ETag
+        identity = client.get('/api/blog/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(identity.status_code, 200)
+        self.assertEqual(f'{identity["ETag"][:-1]}-gzip"', etag)
+
+    def test_list_not_modified(self):
+        client = self.client_for()
+        etag = client.get('/api/blog/posts/')['ETag']
+        self.measure(
+            'posts.list not modified', client, 'get', '/api/blog/posts/', queries=0, status=304,
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+    def test_retrieve_not_modified(self):
+        client = self.client_for(self.user)
+        url = f'/api/blog/posts/{self.post.pk}/'
+        first = client.get(url)
+        self.measure(
+            'posts.retrieve not modified', client, 'get', url, queries=0, status=304,
+            HTTP_IF_NONE_MATCH=first['ETag'], HTTP_IF_MODIFIED_SINCE=first['Last-Modified'],
+        )
+        # Likes don't touch updated_at but still change the response
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'{url}like/')
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_my_posts(self):
+        self.measure(
+            'posts.my_posts', self.client_for(self.user), 'get', '/api/blog/posts/my_posts/', queries=3,
+        )
+
+    def test_batch(self):
+        ids = ','.join(str(post.pk) for post in self.posts[:50])
+        self.measure(
+            'posts.batch', self.client_for(self.user), 'get', f'/api/blog/posts/batch/?ids={ids}', queries=2,
+        )
+
+    def test_search(self):
+        self.measure(
+            'posts.search', self.client_for(self.user), 'get', '/api/blog/posts/search/?q=performance',
+            queries=3,
+        )
+
+    def test_feed(self):
+        # The first call rebuilds the user's timeline from the follow table
+        self.measure('posts.feed', self.client_for(self.user), 'get', '/api/blog/posts/feed/', queries=3)
+
+    def test_trending(self):
+        self.measure(
+            'posts.trending', self.client_for(self.user), 'get', '/api/blog/posts/trending/', queries=2,
+        )
+
+    def test_cache_stats(self):
+        self.measure(
+            'posts.cache_stats', self.client_for(self.admin), 'get', '/api/blog/posts/cache_stats/', queries=1,
+        )
+
+    def test_create(self):
+        self.measure(
+            'posts.create', self.client_for(self.user), 'post', '/api/blog/posts/', queries=3,
+            latency=WRITE_LATENCY, status=201, data={'title': 'New post', 'content': 'Some content'},
+        )
+
+    def test_update(self):
+        self.measure(
+            'posts.update', self.client_for(self.user), 'put', f'/api/blog/posts/{self.own_post.pk}/',
+            queries=3, latency=WRITE_LATENCY, data={'title': 'Updated', 'content': 'Updated content'},
+        )
+
+    def test_partial_update(self):
+        self.measure(
+            'posts.partial_update', self.client_for(self.user), 'patch', f'/api/blog/posts/{self.own_post.pk}/',
+            queries=3, latency=WRITE_LATENCY, data={'title': 'Patched'},
+        )
+
+    def test_destroy(self):
+        self.measure(
+            'posts.destroy', self.client_for(self.user), 'delete', f'/api/blog/posts/{self.own_post.pk}/',
+            queries=8, latency=WRITE_LATENCY, runs=1, status=204,
+        )
+
+    def test_like(self):
+        self.measure(
+            'posts.like', self.client_for(self.user), 'post', f'/api/blog/posts/{self.post.pk}/like/',
+            queries=9, latency=WRITE_LATENCY,
+        )
+
+    def test_increment_read_count(self):
+        self.measure(
+            'posts.increment_read_count', self.client_for(self.user), 'post',
+            f'/api/blog/posts/{self.post.pk}/increment_read_count/', queries=2,
+        )
+
+
+class CommentEndpointTests(EndpointPerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.posts = seed()
+        cls.user = cls.users[0]
+        cls.admin = User.objects.create_user(
+            email='perfadmin@example.invalid', username='perfadmin', password='Passw0rd!',
+            is_verified=True, is_staff=True,
+        )
+        cls.post = Post.objects.exclude(author=cls.user).order_by('-comment_count').first()
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.user, content='Mine')
+        cls.pending = Comment.objects.filter(is_approved=False).first()
+
+    def test_thread_list(self):
+        self.measure(
+            'comments.list ?post=', self.client_for(self.user), 'get',
+            f'/api/blog/comments/?post={self.post.pk}', queries=3,
+        )
+
+    def test_thread_list_anonymous(self):
+        self.measure(
+            'comments.list ?post= anonymous', self.client_for(), 'get',
+            f'/api/blog/comments/?post={self.post.pk}', queries=2,
+        )
+
+    def test_thread_list_cursor(self):
+        response = self.measure(
+            'comments.list ?post= cursor', self.client_for(self.user), 'get',
+            f'/api/blog/comments/?post={self.post.pk}&pagination=cursor', queries=3,
+        )
+        self.assertIn('results', response.data)
+
+    def test_list(self):
+        # Unpaginated unless the client opts in; the full list grows with the table
+        self.measure(
+            'comments.list', self.client_for(self.user), 'get', '/api/blog/comments/?pagination=cursor',
+            queries=2,
+        )
+
+    def test_retrieve(self):
+        self.measure(
+            'comments.retrieve', self.client_for(self.user), 'get', f'/api/blog/comments/{self.comment.pk}/',
+            queries=2,
+        )
+
+    def test_create(self):
+        self.measure(
+            'comments.create', self.client_for(self.user), 'post', '/api/blog/comments/', queries=6,
+            latency=WRITE_LATENCY, status=201, format='json',
+            data={'post': self.post.pk, 'content': 'Nice post'},
+        )
+
+    def test_update(self):
+        self.measure(
+            'comments.update', self.client_for(self.user), 'put', f'/api/blog/comments/{self.comment.pk}/',
+            queries=6, latency=WRITE_LATENCY, format='json',
+            data={'post': self.post.pk, 'content': 'Edited'},
+        )
+
+    def test_destroy(self):
+        self.measure(
+            'comments.destroy', self.client_for(self.user), 'delete', f'/api/blog/comments/{self.comment.pk}/',
+            queries=7, latency=WRITE_LATENCY, runs=1, status=204,
+        )
+
+    def test_admin_queue(self):
+        self.measure(
+            'admin_comments.list', self.client_for(self.admin), 'get', '/api/blog/admin/comments/', queries=2,
+        )
+
+    def test_admin_retrieve(self):
+        self.measure(
+            'admin_comments.retrieve', self.client_for(self.admin), 'get',
+            f'/api/blog/admin/comments/{self.pending.pk}/', queries=2,
+        )
+
+    def test_admin_approve(self):
+        self.measure(
+            'admin_comments.approve', self.client_for(self.admin), 'post',
+            f'/api/blog/admin/comments/{self.pending.pk}/approve/', queries=5, latency=WRITE_LATENCY, runs=1,
+        )
+
+    def test_admin_block(self):
+        self.measure(
+            'admin_comments.block', self.client_for(self.admin), 'post',
+            f'/api/blog/admin/comments/{self.pending.pk}/block/', queries=4, latency=WRITE_LATENCY,
+        )
+
+    def test_admin_bulk(self):
+        self.measure(
+            'admin_comments.bulk approve', self.client_for(self.admin), 'post', '/api/blog/admin/comments/bulk/',
+            queries=10, latency=WRITE_LATENCY, format='json',
+            data={'action': 'approve', 'post': self.post.pk},
+        )
+
+    def test_admin_destroy(self):
+        self.measure(
+            'admin_comments.destroy', self.client_for(self.admin), 'delete',
+            f'/api/blog/admin/comments/{self.pending.pk}/', queries=7, latency=WRITE_LATENCY, runs=1, status=204,
+        )
+
+
+class FollowEndpointTests(EndpointPerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.posts = seed(posts=50, likes=100, comments=100, replies=10)
+        cls.user = cls.users[0]
+        cls.followed = Follow.objects.filter(follower=cls.user).values_list('author_id', flat=True).first()
+        if cls.followed is None:
+            cls.followed = cls.users[1].pk
+            Follow.objects.create(follower=cls.user, author_id=cls.followed)
+        cls.unfollowed = User.objects.exclude(pk=cls.user.pk).exclude(followers__follower=cls.user).first()
+
+    def test_list(self):
+        self.measure('follows.list', self.client_for(self.user), 'get', '/api/blog/follows/', queries=2)
+
+    def test_create(self):
+        self.measure(
+            'follows.create', self.client_for(self.user), 'post', '/api/blog/follows/', queries=9,
+            latency=WRITE_LATENCY, format='json', data={'author': self.unfollowed.pk},
+        )
+
+    def test_destroy(self):
+        self.measure(
+            'follows.destroy', self.client_for(self.user), 'delete', f'/api/blog/follows/{self.followed}/',
+            queries=5, latency=WRITE_LATENCY, runs=1, status=204,
+        )
+
+
+class UserEndpointTests(EndpointPerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.posts = seed(posts=50, likes=100, comments=100, replies=10)
+        cls.admin = User.objects.create_user(
+            email='perfadmin@example.invalid', username='perfadmin', password='Passw0rd!',
+            is_verified=True, is_staff=True,
+        )
+
+    def test_list(self):
+        self.measure('users.list', self.client_for(self.admin), 'get', '/api/blog/users/', queries=2)
+
+    def test_retrieve(self):
+        self.measure(
+            'users.retrieve', self.client_for(self.admin), 'get', f'/api/blog/users/{self.users[1].pk}/',
+            queries=2,
+        )
+
+    def test_update(self):
+        self.measure(
+            'users.update', self.client_for(self.admin), 'patch', f'/api/blog/users/{self.users[1].pk}/',
+            queries=5, latency=WRITE_LATENCY, format='json', data={'username': 'renamed1'},
+        )
+
+
+class CacheTestCase(TestCase):
+    """Base class for behaviour tests: every cache alias starts empty."""
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+
+class ReadCountTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='reader@example.invalid', username='reader', password='x')
+        cls.post = Post.objects.create(title='Counted post', content='Counted content', author=cls.author)
+
+    def read_count(self):
+        return Post.objects.values_list('read_count', flat=True).get(pk=self.post.pk)
+
+    def test_flush_applies_buffered_views_once(self):
+        for _ in range(3):
+            read_counts.record_view(self.post.pk)
+        self.assertEqual(self.read_count(), 0)
+        self.assertEqual(read_counts.pending(self.post.pk), 3)
+
+        self.assertEqual(read_counts.flush(), 3)
+        self.assertEqual(self.read_count(), 3)
+        self.assertEqual(read_counts.pending(self.post.pk), 0)
+        self.assertEqual(read_counts.flush(), 0)
+        self.assertEqual(self.read_count(), 3)
+
+    def test_views_after_a_flush_are_flushed_next_time(self):
+        read_counts.record_view(self.post.pk)
+        read_counts.flush()
+        read_counts.record_view(self.post.pk)
+        read_counts.record_view(self.post.pk)
+        self.assertEqual(read_counts.flush(), 2)
+        self.assertEqual(self.read_count(), 3)
+
+    def test_flush_skips_while_another_holds_the_lock(self):
+        read_counts.record_view(self.post.pk)
+        read_counts.cache.add(read_counts.LOCK_KEY, 1)
+        self.assertEqual(read_counts.flush(), 0)
+        self.assertEqual(self.read_count(), 0)
+
+        read_counts.cache.delete(read_counts.LOCK_KEY)
+        self.assertEqual(read_counts.flush(), 1)
+        self.assertFalse(read_counts.cache.get(read_counts.LOCK_KEY))
+
+    @override_settings(READ_COUNT_DEDUPE_WINDOW=60)
+    def test_repeat_views_inside_the_window_are_ignored(self):
+        self.assertTrue(read_counts.record_view(self.post.pk, viewer=1))
+        self.assertFalse(read_counts.record_view(self.post.pk, viewer=1))
+        self.assertTrue(read_counts.record_view(self.post.pk, viewer=2))
+        # Views without a viewer can't be told apart, so all count
+        self.assertTrue(read_counts.record_view(self.post.pk))
+        read_counts.flush()
+        self.assertEqual(self.read_count(), 3)
+
+
+class RankingTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='ranked@example.invalid', username='ranked', password='x')
+        cls.liker = User.objects.create_user(email='liker@example.invalid', username='liker', password='x')
+        cls.post = Post.objects.create(title='Ranked post', content='Ranked content', author=cls.author)
+
+    def hot_score(self):
+        return Post.objects.values_list('hot_score', flat=True).get(pk=self.post.pk)
+
+    def test_an_event_one_half_life_later_weighs_double(self):
+        now = timezone.now()
+        later = now + timedelta(seconds=settings.POST_HOT_HALF_LIFE)
+        self.assertAlmostEqual(
+            ranking.event_score('like', when=later) - ranking.event_score('like', when=now), math.log(2),
+        )
+        self.assertAlmostEqual(
+            ranking.event_score('like', count=2, when=now), ranking.event_score('like', when=later),
+        )
+
+    def test_events_add_and_subtract_in_log_space(self):
+        when = timezone.now()
+        start = self.hot_score()
+        Post.objects.filter(pk=self.post.pk).update(hot_score=ranking.with_event('comment', 3, when))
+        expected = math.log(math.exp(start) + math.exp(ranking.event_score('comment', 3, when)))
+        self.assertAlmostEqual(self.hot_score(), expected)
+
+        Post.objects.filter(pk=self.post.pk).update(hot_score=ranking.without_event('comment', 3, when))
+        self.assertAlmostEqual(self.hot_score(), start)
+
+    def test_unlike_takes_back_what_the_like_added(self):
+        # A post from ten half-lives ago that was liked back then
+        created_at = timezone.now() - timedelta(seconds=10 * settings.POST_HOT_HALF_LIFE)
+        Post.objects.filter(pk=self.post.pk).update(
+            created_at=created_at, likes_count=1, hot_score=ranking.initial_score(created_at, likes=1),
+        )
+        PostLike.objects.create(post=self.post, customuser=self.liker, created_at=created_at)
+        client = APIClient()
+        client.force_authenticate(self.liker)
+
+        response = client.post(f'/api/blog/posts/{self.post.pk}/like/')
+        self.assertEqual(response.data, {'message': 'Post Unliked'})
+        self.assertAlmostEqual(self.hot_score(), ranking.initial_score(created_at))
+
+    def test_toggling_a_like_scores_no_more_than_one_like(self):
+        # Old enough that likes now outweigh everything the post had
+        created_at = timezone.now() - timedelta(seconds=10 * settings.POST_HOT_HALF_LIFE)
+        start = ranking.initial_score(created_at)
+        Post.objects.filter(pk=self.post.pk).update(created_at=created_at, hot_score=start)
+        client = APIClient()
+        client.force_authenticate(self.liker)
+        for _ in range(10):
+            self.assertEqual(client.post(f'/api/blog/posts/{self.post.pk}/like/').data, {'message': 'Post Liked'})
+            self.assertEqual(client.post(f'/api/blog/posts/{self.post.pk}/like/').data, {'message': 'Post Unliked'})
+        self.assertAlmostEqual(self.hot_score(), start)
+
+        client.post(f'/api/blog/posts/{self.post.pk}/like/')
+        liked_at = PostLike.objects.get(post=self.post, customuser=self.liker).created_at
+        one_like = math.log(math.exp(start) + math.exp(ranking.event_score('like', when=liked_at)))
+        self.assertAlmostEqual(self.hot_score(), one_like)
+
+
+class TimelineTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(email='timeline@example.invalid', username='timeline', password='x')
+        cls.author = User.objects.create_user(email='fanned@example.invalid', username='fanned', password='x')
+        cls.other = User.objects.create_user(email='other@example.invalid', username='other', password='x')
+        Follow.objects.create(follower=cls.reader, author=cls.author)
+        User.objects.filter(pk=cls.author.pk).update(follower_count=1)
+        cls.old_post = Post.objects.create(title='Older post', content='Older content', author=cls.author)
+
+    def feed_ids(self):
+        return set(timelines.feed(self.reader, Post.objects.all()).values_list('pk', flat=True))
+
+    def test_empty_timeline_is_kept(self):
+        self.assertEqual(timelines.rebuild(self.other), [])
+        self.assertEqual(timelines.read(self.other.pk), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(timelines.feed(self.other, Post.objects.all())), [])
+
+    def test_new_post_fans_out_to_existing_timelines(self):
+        timelines.rebuild(self.reader)
+        post = Post.objects.create(title='New post', content='New content', author=self.author)
+        self.assertEqual(timelines.fan_out(post.pk), 1)
+        self.assertEqual(timelines.read(self.reader.pk), [post.pk, self.old_post.pk])
+
+    def test_fan_out_skips_timelines_that_were_never_built(self):
+        post = Post.objects.create(title='New post', content='New content', author=self.author)
+        timelines.fan_out(post.pk)
+        self.assertIsNone(timelines.read(self.reader.pk))
+
+    def test_fan_out_reaches_an_empty_timeline(self):
+        Follow.objects.create(follower=self.other, author=self.author)
+        self.assertEqual(timelines.rebuild(self.other), [self.old_post.pk])
+        timelines.store(self.other.pk, [])
+        post = Post.objects.create(title='New post', content='New content', author=self.author)
+        timelines.fan_out(post.pk)
+        self.assertEqual(timelines.read(self.other.pk), [post.pk])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_authors_are_merged_in_at_read_time(self):
+        self.assertEqual(timelines.rebuild(self.reader), [])
+        post = Post.objects.create(title='Popular post', content='Popular content', author=self.author)
+        self.assertEqual(timelines.fan_out(post.pk), 0)
+        self.assertEqual(timelines.read(self.reader.pk), [])
+        self.assertEqual(self.feed_ids(), {self.old_post.pk, post.pk})
+
+    def test_follow_and_unfollow_rebuild_the_timeline(self):
+        other_post = Post.objects.create(title='Other post', content='Other content', author=self.other)
+        timelines.rebuild(self.reader)
+        client = APIClient()
+        client.force_authenticate(self.reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/blog/follows/', {'author': self.other.pk})
+        self.assertIsNone(timelines.read(self.reader.pk))
+        self.assertEqual(self.feed_ids(), {self.old_post.pk, other_post.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(f'/api/blog/follows/{self.other.pk}/')
+        self.assertIsNone(timelines.read(self.reader.pk))
+        self.assertEqual(self.feed_ids(), {self.old_post.pk})
+
+    def test_deleting_a_follower_decrements_follower_count(self):
+        self.reader.delete()
+        self.assertEqual(User.objects.get(pk=self.author.pk).follower_count, 0)
+
+
+class FeedCacheTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='cached@example.invalid', username='cached', password='x')
+        cls.post = Post.objects.create(title='Cached post', content='Cached content', author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(cdn, 'purge')
+        self.purge = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def version_keys(self, post_id):
+        return [key.format(post_id=post_id) for key in (feed_cache.POST_VERSION_KEY, feed_cache.POST_CHANGED_KEY)]
+
+    def test_missing_posts_get_no_validators(self):
+        missing = self.post.pk + 1000
+        response = APIClient().get(
+            f'/api/blog/posts/{missing}/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(feed_cache.cache.get_many(self.version_keys(missing)), {})
+
+    def test_deleted_posts_lose_their_validators(self):
+        post = Post.objects.create(title='Doomed post', content='Doomed content', author=self.author)
+        client = APIClient()
+        self.assertEqual(client.get(f'/api/blog/posts/{post.pk}/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(feed_cache.cache.get_many(self.version_keys(post.pk)), {})
+        response = client.get(
+            f'/api/blog/posts/{post.pk}/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_validators_expire(self):
+        APIClient().get(f'/api/blog/posts/{self.post.pk}/')
+        feed_cache.invalidate_posts([self.post.pk], listing=True)
+        client = feed_cache.cache._cache.get_client()
+        for key in [*self.version_keys(self.post.pk), feed_cache.LIST_VERSION_KEY]:
+            ttl = client.ttl(feed_cache.cache.make_and_validate_key(key))
+            self.assertGreater(ttl, 0, key)
+            self.assertLessEqual(ttl, settings.POST_FEED_VERSION_TIMEOUT)
+
+    def test_only_new_deleted_and_edited_posts_purge_the_list(self):
+        feed_cache.invalidate_posts([self.post.pk], ordering=['likes_count'])
+        self.purge.assert_called_once_with([cdn.post_key(self.post.pk)])
+        self.purge.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(title='Listed post', content='Listed content', author=self.author)
+        self.purge.assert_called_once_with([cdn.LIST_KEY, cdn.post_key(post.pk)])
+        self.purge.reset_mock()
+        post_id = post.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.purge.assert_called_once_with([cdn.LIST_KEY, cdn.post_key(post_id)])
+
+    def list_etag(self, **params):
+        response = APIClient().get('/api/blog/posts/', params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def like(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post(f'/api/blog/posts/{self.post.pk}/like/').status_code, 200)
+
+    def test_counters_only_drop_list_pages_sorted_on_them(self):
+        fan = User.objects.create_user(email='cachefan@example.invalid', username='cachefan', password='x')
+        with mock.patch.object(feed_cache, '_lag_window', return_value=0):
+            newest, by_likes, by_reads = self.list_etag(), self.list_etag(ordering='-likes_count'), \
+                self.list_etag(ordering='-read_count')
+            self.like(fan)
+            read_counts.record_view(self.post.pk)
+            read_counts.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                Comment.objects.create(post=self.post, user=fan, content='Cached comment', is_approved=True)
+            self.assertEqual(self.list_etag(), newest)
+            self.assertNotEqual(self.list_etag(ordering='-likes_count'), by_likes)
+            self.assertNotEqual(self.list_etag(ordering='-read_count'), by_reads)
+            response = APIClient().get('/api/blog/posts/')
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response.data['results'][0]['likes_count'], 0)
+
+        # Within POST_FEED_LIST_MAX_LAG every page catches up
+        with mock.patch.object(feed_cache, '_lag_window', return_value=settings.POST_FEED_LIST_MAX_LAG):
+            response = APIClient().get('/api/blog/posts/')
+            self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertNotEqual(response['ETag'], newest)
+            self.assertEqual(response.data['results'][0]['likes_count'], 1)
+            self.assertEqual(response.data['results'][0]['comment_count'], 1)
+
+    def test_versions_move_after_commit(self):
+        etag = self.list_etag()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.create(title='Uncommitted post', content='Uncommitted content', author=self.author)
+            # A read before the commit sees the old rows and must not store them under the new version
+            self.assertEqual(self.list_etag(), etag)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(self.list_etag(), etag)
+
+    def test_saving_an_author_only_invalidates_on_a_visible_change(self):
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Renamed'
+        author.save()
+        self.purge.assert_not_called()
+
+        author.username = 'recached'
+        author.save()
+        self.purge.assert_any_call([cdn.author_key(author.pk)])
+        self.purge.reset_mock()
+        author.save()
+        self.purge.assert_not_called()
+
+
+class ModerationTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='moderated@example.invalid', username='moderated', password='x')
+        cls.post = Post.objects.create(title='Moderated post', content='Moderated content', author=cls.author)
+
+    def comment(self, parent=None, is_approved=True):
+        return Comment.objects.create(
+            post=self.post, user=self.author, parent=parent, content='Moderated', is_approved=is_approved,
+        )
+
+    def comment_count(self):
+        return Post.objects.values_list('comment_count', flat=True).get(pk=self.post.pk)
+
+    def test_delete_takes_nested_replies_with_it(self):
+        doomed = self.comment()
+        reply = self.comment(parent=doomed)
+        nested = self.comment(parent=reply)
+        self.comment(parent=nested)
+        kept = self.comment()
+        kept_reply = self.comment(parent=kept)
+
+        counts = list(moderation.apply(moderation.select(ids=[doomed.pk]), moderation.DELETE))
+        self.assertEqual(counts, [4])
+        self.assertEqual(set(Comment.objects.values_list('pk', flat=True)), {kept.pk, kept_reply.pk})
+        self.assertEqual(self.comment_count(), 2)
+
+    @mock.patch.object(moderation, 'ID_BATCH', 2)
+    def test_delete_in_chunks_counts_every_comment_once(self):
+        for _ in range(3):
+            top = self.comment()
+            reply = self.comment(parent=top)
+            self.comment(parent=reply)
+            self.comment(parent=top)
+
+        counts = list(moderation.apply(moderation.select(post=self.post.pk), moderation.DELETE, chunk_size=2))
+        self.assertEqual(sum(counts), 12)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.comment_count(), 0)
+
+    def test_approve_and_block_count_only_changed_comments(self):
+        pending = self.comment(is_approved=False)
+        self.comment()
+        self.assertEqual(list(moderation.apply(moderation.select(post=self.post.pk), moderation.APPROVE)), [1])
+        self.assertEqual(self.comment_count(), 2)
+        self.assertEqual(list(moderation.apply(moderation.select(ids=[pending.pk]), moderation.BLOCK)), [1])
+        self.assertEqual(self.comment_count(), 1)
+
+
+class SearchTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='needle@example.invalid', username='searcher', password='x')
+        cls.titled = Post.objects.create(title='A needle in the title', content='Content', author=cls.author)
+        cls.body = Post.objects.create(title='Plain', content='A needle in the content', author=cls.author)
+        cls.other = Post.objects.create(title='Plain', content='Nothing here', author=cls.author)
+
+    def ids(self, response):
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return {post['id'] for post in results}
+
+    def test_search_matches_title_and_content_not_author_email(self):
+        expected = {self.titled.pk, self.body.pk}
+        self.assertEqual(self.ids(APIClient().get('/api/blog/posts/', {'search': 'needle'})), expected)
+        self.assertEqual(self.ids(APIClient().get('/api/blog/posts/search/', {'q': 'needle'})), expected)
+
+
+class PostEventTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='streamer@example.invalid', username='streamer', password='x')
+        cls.post = Post.objects.create(title='Streamed post', content='Streamed content', author=cls.author)
+        cls.other = Post.objects.create(title='Quiet post', content='Quiet content', author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        # Issuing a token writes to the database, which async tests can't do directly
+        self.access_token = str(RefreshToken.for_user(self.author).access_token)
+
+    def like(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(f'/api/blog/posts/{self.post.pk}/like/')
+
+    async def test_stream_starts_with_retry_then_sends_likes(self):
+        self.async_client.cookies['access_token'] = self.access_token
+        response = await self.async_client.get('/api/blog/events/', {'posts': f'{self.post.pk},{self.other.pk}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(frames), b'retry: 5000\n\n')
+            self.assertEqual((await sync_to_async(self.like)()).status_code, 200)
+            frame = (await asyncio.wait_for(anext(frames), 1)).decode()
+        finally:
+            await frames.aclose()
+        head, data = frame.split('\n', 1)
+        self.assertEqual(head, 'event: likes')
+        self.assertTrue(frame.endswith('\n\n'))
+        self.assertEqual(
+            json.loads(data.removeprefix('data: ')),
+            {'event': 'likes', 'post': self.post.pk, 'data': {'likes_count': 1}},
+        )
+
+    async def test_anonymous_and_bad_tokens_are_refused(self):
+        response = await self.async_client.get('/api/blog/events/', {'posts': self.post.pk})
+        self.assertEqual(response.status_code, 401)
+        self.async_client.cookies['access_token'] = 'not-a-token'
+        response = await self.async_client.get('/api/blog/events/', {'posts': self.post.pk})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_post_ids_are_checked(self):
+        self.async_client.cookies['access_token'] = self.access_token
+        for posts in ['', 'one', ','.join(map(str, range(1, settings.POST_EVENTS_MAX_POSTS + 2)))]:
+            response = await self.async_client.get('/api/blog/events/', {'posts': posts})
+            self.assertEqual(response.status_code, 400, posts)
+
+    async def test_local_broker_fans_out_to_subscribers_of_the_post(self):
+        broker = events.LocalBroker()
+        async with broker.subscribe({1}) as first, broker.subscribe({1, 2}) as second, \
+                broker.subscribe({2}) as elsewhere:
+            broker.publish(1, 'hello')
+            self.assertEqual(await first.get(timeout=1), 'hello')
+            self.assertEqual(await second.get(timeout=1), 'hello')
+            self.assertIsNone(await elsewhere.get(timeout=0.01))
+        self.assertEqual(dict(broker._subscribers), {})
+
+    async def test_local_broker_drops_messages_for_slow_subscribers(self):
+        broker = events.LocalBroker()
+        broker.queue_size = 1
+        async with broker.subscribe({1}) as subscription:
+            broker.publish(1, 'first')
+            broker.publish(1, 'second')
+            self.assertEqual(await subscription.get(timeout=1), 'first')
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+    @override_settings(POST_EVENTS_READ_COUNT_INTERVAL=60)
+    def test_read_counts_are_published_at_most_once_per_interval(self):
+        with mock.patch.object(events, 'publish') as publish:
+            events.publish_read_count(self.post.pk, 1)
+            events.publish_read_count(self.post.pk, 2)
+            events.publish_read_count(self.other.pk, 5)
+            self.assertEqual(publish.call_args_list, [
+                mock.call(self.post.pk, 'read_count', {'read_count': 1}),
+                mock.call(self.other.pk, 'read_count', {'read_count': 5}),
+            ])
+            events.cache.delete(events.READ_COUNT_THROTTLE_KEY.format(post_id=self.post.pk))
+            events.publish_read_count(self.post.pk, 3)
+            publish.assert_called_with(self.post.pk, 'read_count', {'read_count': 3})
+
+    def test_broker_errors_do_not_fail_the_publisher(self):
+        with mock.patch.object(events, 'get_broker') as get_broker:
+            get_broker.return_value.publish.side_effect = ConnectionError('down')
+            with self.assertLogs('blog_app.events', 'ERROR'):
+                events.publish(self.post.pk, 'likes', {'likes_count': 1})
+
+
+class KeysetPaginationTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='paged@example.invalid', username='paged', password='x')
+        created_at = timezone.now()
+        # Pairs share created_at and read_count so only the id breaks the tie
+        cls.posts = Post.objects.bulk_create([
+            Post(
+                title=f'Paged {index}', content='needle' if index % 3 else 'haystack', author=cls.author,
+                created_at=created_at - timedelta(minutes=index // 2), read_count=index % 4 // 2,
+            )
+            for index in range(11)
+        ])
+
+    def traverse(self, url, params):
+        """The ids on every page following ``next`` to the end, then ``previous`` back."""
+        forward, backward, pages = [], [], []
+        response = APIClient().get(url, {**params, 'pagination': 'cursor', 'page_size': 3})
+        while True:
+            self.assertEqual(response.status_code, 200, response.content[:500])
+            pages.append(response.data)
+            forward += [post['id'] for post in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = APIClient().get(response.data['next'])
+        self.assertIsNone(pages[0]['previous'])
+        while True:
+            backward = [post['id'] for post in response.data['results']] + backward
+            if response.data['previous'] is None:
+                break
+            response = APIClient().get(response.data['previous'])
+            self.assertEqual(response.status_code, 200, response.content[:500])
+        self.assertEqual(backward, forward)
+        return forward
+
+    def expected(self, *ordering, **filters):
+        return list(Post.objects.filter(**filters).order_by(*ordering).values_list('pk', flat=True))
+
+    def test_newest_first_with_ties_on_created_at(self):
+        self.assertEqual(self.traverse('/api/blog/posts/', {}), self.expected('-created_at', '-pk'))
+
+    def test_ordering_with_ties_on_read_count(self):
+        self.assertEqual(
+            self.traverse('/api/blog/posts/', {'ordering': '-read_count'}), self.expected('-read_count', '-pk'),
+        )
+        self.assertEqual(
+            self.traverse('/api/blog/posts/', {'ordering': 'read_count'}), self.expected('read_count', 'pk'),
+        )
+
+    def test_search_filter_and_search_action(self):
+        expected = self.expected('-created_at', '-pk', content='needle')
+        self.assertEqual(self.traverse('/api/blog/posts/', {'search': 'needle'}), expected)
+        self.assertEqual(self.traverse('/api/blog/posts/search/', {'q': 'needle'}), expected)
+
+    def test_null_rank_falls_back_to_the_primary_key(self):
+        # Ordered like a full-text search, ranked like the fallback without one
+        queryset = Post.objects.annotate(rank=Value(None, output_field=FloatField())).order_by('-rank', '-id')
+        paginator = KeysetPagination()
+        factory = APIRequestFactory()
+        request = Request(factory.get('/', {'pagination': 'cursor', 'page_size': 4}))
+        seen = []
+        while request is not None:
+            page = paginator.paginate_queryset(queryset, request)
+            seen += [post.pk for post in page]
+            link = paginator.get_next_link()
+            request = Request(factory.get(link)) if link else None
+        self.assertEqual(seen, self.expected('-pk'))
+
+    def test_tampered_cursor_is_not_found(self):
+        response = APIClient().get('/api/blog/posts/', {'pagination': 'cursor', 'page_size': 3})
+        cursor = response.data['next'].split('cursor=')[1]
+        response = APIClient().get('/api/blog/posts/', {'cursor': cursor, 'ordering': 'read_count'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(APIClient().get('/api/blog/posts/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class LikeCountTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='liked@example.invalid', username='liked', password='x')
+        cls.fans = [
+            User.objects.create_user(email=f'fan{index}@example.invalid', username=f'fan{index}', password='x')
+            for index in range(3)
+        ]
+        cls.post = Post.objects.create(title='Liked post', content='Liked content', author=cls.author)
+
+    def toggle(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/api/blog/posts/{self.post.pk}/like/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['message']
+
+    def assertCountsAgree(self, expected):
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), expected)
+        self.assertEqual(Post.objects.values_list('likes_count', flat=True).get(pk=self.post.pk), expected)
+
+    def test_like_and_unlike_keep_the_count_in_step(self):
+        self.assertEqual(self.toggle(self.fans[0]), 'Post Liked')
+        self.assertEqual(self.toggle(self.fans[1]), 'Post Liked')
+        self.assertCountsAgree(2)
+        self.assertEqual(self.toggle(self.fans[0]), 'Post Unliked')
+        self.assertCountsAgree(1)
+        self.assertEqual(self.toggle(self.fans[0]), 'Post Liked')
+        self.assertCountsAgree(2)
+        self.assertEqual(self.toggle(self.fans[0]), 'Post Unliked')
+        self.assertEqual(self.toggle(self.fans[1]), 'Post Unliked')
+        self.assertCountsAgree(0)
+
+    def test_is_liked_is_per_user(self):
+        self.toggle(self.fans[0])
+        for user, liked in [(self.fans[0], True), (self.fans[1], False), (None, False)]:
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(user)
+            listed = client.get('/api/blog/posts/').data['results'][0]
+            detail = client.get(f'/api/blog/posts/{self.post.pk}/').data
+            for data in (listed, detail):
+                self.assertIs(data['is_liked'], liked, user)
+                self.assertEqual(data['likes_count'], 1)
+
+    def test_a_like_racing_another_is_counted_once(self):
+        self.toggle(self.fans[0])
+        # The second request didn't see the first's row and tries to insert its own
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            self.assertEqual(self.toggle(self.fans[0]), 'Post Liked')
+        self.assertCountsAgree(1)
+
+    def test_reconcile_repairs_drift(self):
+        for fan in self.fans:
+            self.toggle(fan)
+        other = Post.objects.create(title='Other post', content='Other content', author=self.author)
+        # Deleting a user cascades to their likes without touching likes_count
+        self.fans[2].delete()
+        Post.objects.filter(pk=other.pk).update(likes_count=5)
+
+        out = StringIO()
+        call_command('reconcile_like_counts', '--dry-run', stdout=out)
+        self.assertIn('Found 2 drifted post(s)', out.getvalue())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes_count, 3)
+
+        out = StringIO()
+        call_command('reconcile_like_counts', '--batch-size', '1', stdout=out)
+        self.assertIn(f'Post {self.post.pk}: likes_count 3 -> 2', out.getvalue())
+        self.assertIn('Reconciled 2 drifted post(s)', out.getvalue())
+        self.assertCountsAgree(2)
+        self.assertEqual(Post.objects.get(pk=other.pk).likes_count, 0)
+
+
+class BatchTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='batched@example.invalid', username='batched', password='x')
+        cls.posts = [
+            Post.objects.create(title=f'Batched {index}', content='Batched content', author=cls.author)
+            for index in range(4)
+        ]
+
+    def post(self, ids):
+        # Reads, but as a POST it needs a user like any write
+        client = APIClient()
+        client.force_authenticate(self.author)
+        return client.post('/api/blog/posts/batch/', {'ids': ids}, format='json')
+
+    def test_results_follow_the_requested_order(self):
+        ids = [self.posts[2].pk, self.posts[0].pk, self.posts[3].pk]
+        response = APIClient().get('/api/blog/posts/batch/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.data['results']], ids)
+        self.assertEqual(response.data['missing'], [])
+
+    def test_missing_ids_are_listed_once_in_order(self):
+        absent = self.posts[-1].pk + 1000
+        ids = [absent, self.posts[1].pk, absent + 1, self.posts[1].pk, absent]
+        response = self.post(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.data['results']], [self.posts[1].pk])
+        self.assertEqual(response.data['missing'], [absent, absent + 1])
+
+    def test_at_most_max_batch_size_ids(self):
+        ids = list(range(1, 101))
+        response = self.post(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']) + len(response.data['missing']), 100)
+        response = self.post(ids + [101])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 100', response.data['error'])
+
+    def test_malformed_ids_are_rejected(self):
+        for ids in ['1,two,3', '1.5']:
+            response = APIClient().get('/api/blog/posts/batch/', {'ids': ids})
+            self.assertEqual(response.status_code, 400, ids)
+            self.assertEqual(response.data['error'], 'ids must be a list of integers')
+        for ids in [[1, None], [1, [2]], ['x']]:
+            response = self.post(ids)
+            self.assertEqual(response.status_code, 400, ids)
+        response = APIClient().get('/api/blog/posts/batch/', {'ids': ''})
+        self.assertEqual(response.data['error'], 'ids is required')
+
+
+class FlakyBackend(media.LocalFileSystemBackend):
+    """Fails the first ``failures`` uploads, then stores like the local backend."""
+    failures = 0
+
+    def upload(self, path, field):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise ConnectionError('upload refused')
+        return super().upload(path, field)
+
+
+class SizedBackend:
+    """Renders width and format into the URL, like a transformation service."""
+
+    def url(self, value, field, width=None, format=None):
+        return f'/cdn/{width or "full"}/{value}' + (f'.{format}' if format else '')
+
+
+@override_settings(
+    MEDIA_UPLOAD_BACKEND='blog_app.tests.FlakyBackend', MEDIA_UPLOAD_MAX_ATTEMPTS=3,
+    MEDIA_UPLOAD_RETRY_DELAY=2, MEDIA_IMAGE_WIDTHS={'thumbnail': 320, 'full': 1280},
+    MEDIA_IMAGE_FORMATS=['webp'],
+)
+class MediaTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='uploader@example.invalid', username='uploader', password='x')
+        png = BytesIO()
+        Image.new('RGB', (4, 4)).save(png, 'PNG')
+        cls.png = png.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        FlakyBackend.failures = 0
+        for setting in ('MEDIA_ROOT', 'MEDIA_SPOOL_DIR'):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory)
+            override = override_settings(**{setting: directory})
+            override.enable()
+            self.addCleanup(override.disable)
+        sleep = mock.patch.object(media.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def create_post(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/blog/posts/', {
+                'title': 'Illustrated post', 'content': 'Illustrated content',
+                'image': SimpleUploadedFile('cover.png', self.png, content_type='image/png'),
+                'file': SimpleUploadedFile('paper.pdf', b'pdf bytes', content_type='application/pdf'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content[:500])
+        return Post.objects.get(pk=response.data['id']), response, callbacks
+
+    def spooled(self):
+        return sorted(os.listdir(settings.MEDIA_SPOOL_DIR))
+
+    def test_upload_is_spooled_then_transferred(self):
+        post, response, callbacks = self.create_post()
+        self.assertEqual(response.data['media_status'], Post.MEDIA_PENDING)
+        self.assertEqual(post.media_urls, {})
+        self.assertEqual(self.spooled(), [f'post{post.pk}_file.pdf', f'post{post.pk}_image.png'])
+
+        for callback in callbacks:
+            callback()
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, Post.MEDIA_READY)
+        self.assertEqual(self.spooled(), [])
+        stored = os.path.join(settings.MEDIA_ROOT, 'image', 'upload', f'post{post.pk}_image.png')
+        with open(stored, 'rb') as image:
+            self.assertEqual(image.read(), self.png)
+        self.assertEqual(post.media_urls['file'], f'/media/image/upload/post{post.pk}_file.pdf')
+        self.assertEqual(post.media_urls['image']['original'], f'/media/image/upload/post{post.pk}_image.png')
+        self.sleep.assert_not_called()
+
+        response = APIClient().get(f'/api/blog/posts/{post.pk}/')
+        self.assertEqual(response.data['image_url'], post.media_urls['image']['original'])
+        self.assertEqual(response.data['file_url'], post.media_urls['file'])
+        self.assertEqual(response.data['image_renditions'], post.media_urls['image'])
+
+    def test_failed_uploads_are_retried_with_backoff(self):
+        FlakyBackend.failures = 2
+        post, _, callbacks = self.create_post()
+        with self.assertLogs('blog_app.media', 'WARNING'):
+            for callback in callbacks:
+                callback()
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, Post.MEDIA_READY)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [2, 4])
+        self.assertEqual(set(post.media_urls), {'image', 'file'})
+
+    def test_exhausted_retries_keep_the_spooled_file(self):
+        post, _, callbacks = self.create_post()
+        FlakyBackend.failures = 3
+        with self.assertLogs('blog_app.media', 'WARNING'):
+            for callback in callbacks:
+                callback()
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, Post.MEDIA_FAILED)
+        # The file went through on its first attempt; only the image is left to retry
+        self.assertEqual(self.spooled(), [f'post{post.pk}_image.png'])
+        self.assertEqual(list(post.media_urls), ['file'])
+        self.assertEqual(media.spooled_uploads(), {
+            post.pk: [('image', os.path.join(settings.MEDIA_SPOOL_DIR, f'post{post.pk}_image.png'))],
+        })
+
+        call_command('retry_media_uploads', '--older-than', '0', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, Post.MEDIA_READY)
+        self.assertEqual(set(post.media_urls), {'image', 'file'})
+        self.assertEqual(self.spooled(), [])
+
+    def test_image_renditions(self):
+        self.assertEqual(media.build_media_urls({'image': 'image/upload/cover.png'}, SizedBackend()), {
+            'image': {
+                'thumbnail': '/cdn/320/image/upload/cover.png',
+                'full': '/cdn/1280/image/upload/cover.png',
+                'original': '/cdn/full/image/upload/cover.png',
+                'srcset': '/cdn/320/image/upload/cover.png 320w, /cdn/1280/image/upload/cover.png 1280w',
+                'sources': [{
+                    'type': 'image/webp',
+                    'srcset': (
+                        '/cdn/320/image/upload/cover.png.webp 320w, '
+                        '/cdn/1280/image/upload/cover.png.webp 1280w'
+                    ),
+                }],
+            },
+        })
+        self.assertEqual(
+            media.build_media_urls({'image': '', 'file': 'raw/upload/paper.pdf'}, SizedBackend()),
+            {'file': '/cdn/full/raw/upload/paper.pdf'},
+        )
+
+    def test_build_media_urls_command_fills_missing_urls(self):
+        post = Post.objects.create(
+            title='Imported post', content='Imported content', author=self.author,
+            image='image/upload/imported.png',
+        )
+        call_command('build_media_urls', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.media_urls['image']['srcset'], (
+            '/media/image/upload/imported.png 320w, /media/image/upload/imported.png 1280w'
+        ))
+
+
+class ThreadedCommentTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='threaded@example.invalid', username='threaded', password='x')
+        cls.reader = User.objects.create_user(email='replier@example.invalid', username='replier', password='x')
+        cls.pending_author = User.objects.create_user(email='pending@example.invalid', username='pending', password='x')
+        cls.post = Post.objects.create(title='Threaded post', content='Threaded content', author=cls.author)
+        cls.other_post = Post.objects.create(title='Other post', content='Other content', author=cls.author)
+        start = timezone.now() - timedelta(hours=1)
+
+        def comment(minutes, parent=None, user=None, is_approved=True):
+            created = Comment.objects.create(
+                post=cls.post, user=user or cls.reader, parent=parent, content='Threaded', is_approved=is_approved,
+            )
+            Comment.objects.filter(pk=created.pk).update(created_at=start + timedelta(minutes=minutes))
+            return created
+
+        cls.root = comment(0)
+        cls.pending = comment(1, parent=cls.root, user=cls.pending_author, is_approved=False)
+        cls.reply = comment(2, parent=cls.root)
+        cls.nested = comment(3, parent=cls.reply)
+        # Approved, but under a reply only its author can see
+        cls.under_pending = comment(4, parent=cls.pending)
+        cls.newer_root = comment(5)
+
+    def threads(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get('/api/blog/comments/', {'post': self.post.pk})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def shape(self, comments):
+        return [(comment['id'], self.shape(comment['replies'])) for comment in comments]
+
+    def test_replies_nest_under_their_parents(self):
+        with self.assertNumQueries(2):
+            threads = self.threads()
+        self.assertEqual(self.shape(threads), [
+            (self.newer_root.pk, []),
+            (self.root.pk, [(self.reply.pk, [(self.nested.pk, [])])]),
+        ])
+        self.assertEqual(threads[1]['replies'][0]['parent'], self.root.pk)
+        self.assertEqual(
+            set(Comment.objects.filter(parent__isnull=False).values_list('thread', flat=True)), {self.root.pk},
+        )
+
+    def test_unapproved_replies_are_shown_only_to_their_author(self):
+        self.assertEqual(self.shape(self.threads(self.reader))[1], (self.root.pk, [
+            (self.reply.pk, [(self.nested.pk, [])]),
+        ]))
+        self.assertEqual(self.shape(self.threads(self.pending_author))[1], (self.root.pk, [
+            (self.pending.pk, [(self.under_pending.pk, [])]),
+            (self.reply.pk, [(self.nested.pk, [])]),
+        ]))
+
+    def test_reply_to_a_comment_on_another_post_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.post('/api/blog/comments/', {
+            'post': self.other_post.pk, 'parent': self.root.pk, 'content': 'Misplaced reply',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Reply must belong to the same post', str(response.data))
+
+        response = client.post('/api/blog/comments/', {
+            'post': self.post.pk, 'parent': self.nested.pk, 'content': 'Deep reply',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.get(pk=response.data['id']).thread_id, self.root.pk)
+
+    def test_a_reply_cannot_be_moved_by_editing_it(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.patch(f'/api/blog/comments/{self.nested.pk}/', {
+            'post': self.post.pk, 'parent': self.newer_root.pk, 'content': 'Edited reply',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.nested.refresh_from_db()
+        self.assertEqual((self.nested.parent_id, self.nested.thread_id), (self.reply.pk, self.root.pk))
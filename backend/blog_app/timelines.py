@@ -0,0 +1,149 @@
+"""
+Precomputed home timelines behind ``/posts/feed/``.
+
+Each user's timeline is a list of post ids, newest first, capped at
+``TIMELINE_LENGTH`` and kept in the ``timelines`` cache. Creating a post
+submits ``fan_out()`` to the background pool, which pushes the id onto the
+timeline of every follower of the author, ``TIMELINE_FANOUT_BATCH``
+pipelined pushes at a time. Serving a feed is then one list read plus one
+batched post query, with no join across the follow table.
+
+Authors with more than ``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are not
+fanned out, since one post would mean that many writes. Their posts are
+merged in when a follower reads the feed (fan-out-on-read).
+
+Pushes only land on timelines that already exist (``LPUSHX``). A timeline
+that went unread for ``TIMELINE_TIMEOUT``, or was dropped because its owner
+followed or unfollowed someone, is rebuilt from the database on the next
+read. A user who follows no one with posts still gets a timeline: an empty
+one holds only ``EMPTY``, so it isn't rebuilt on every read. With a cache
+backend other than Redis, timelines are plain cache values. The
+read-modify-write there can lose a concurrent push until the timeline is
+next rebuilt.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils.connection import ConnectionProxy
+from .models import Follow, Post
+
+cache = ConnectionProxy(caches, 'timelines')
+
+TIMELINE_KEY = 'timeline:{user_id}'
+# Not a post id; keeps an empty timeline's list in existence
+EMPTY = 0
+
+
+def _redis():
+    """The Redis client behind ``cache``, or None for other backends."""
+    backend = getattr(cache, '_cache', None)
+    if hasattr(backend, 'get_client'):
+        return backend.get_client(write=True)
+    return None
+
+
+def _key(user_id):
+    return TIMELINE_KEY.format(user_id=user_id)
+
+
+def read(user_id):
+    """The post ids on ``user_id``'s timeline, or None if it has to be rebuilt."""
+    client = _redis()
+    if client is None:
+        ids = cache.get(_key(user_id))
+        if ids is not None:
+            cache.touch(_key(user_id), settings.TIMELINE_TIMEOUT)
+        return ids
+    key = cache.make_and_validate_key(_key(user_id))
+    pipe = client.pipeline(transaction=False)
+    pipe.lrange(key, 0, -1)
+    pipe.expire(key, settings.TIMELINE_TIMEOUT)
+    ids, _ = pipe.execute()
+    if not ids:
+        return None
+    return [post_id for post_id in map(int, ids) if post_id != EMPTY]
+
+
+def store(user_id, post_ids):
+    client = _redis()
+    if client is None:
+        cache.set(_key(user_id), list(post_ids), timeout=settings.TIMELINE_TIMEOUT)
+        return
+    key = cache.make_and_validate_key(_key(user_id))
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.rpush(key, *(post_ids or [EMPTY]))
+    pipe.expire(key, settings.TIMELINE_TIMEOUT)
+    pipe.execute()
+
+
+def push(user_ids, post_id):
+    """Put ``post_id`` at the head of each existing timeline of ``user_ids``."""
+    length = settings.TIMELINE_LENGTH
+    client = _redis()
+    if client is None:
+        for user_id in user_ids:
+            ids = cache.get(_key(user_id))
+            if ids is not None:
+                cache.set(_key(user_id), [post_id, *ids][:length], timeout=settings.TIMELINE_TIMEOUT)
+        return
+    pipe = client.pipeline(transaction=False)
+    for user_id in user_ids:
+        key = cache.make_and_validate_key(_key(user_id))
+        pipe.lpushx(key, post_id)
+        pipe.ltrim(key, 0, length - 1)
+    pipe.execute()
+
+
+def drop(user_id):
+    """Forget ``user_id``'s timeline; the next read rebuilds it."""
+    cache.delete(_key(user_id))
+
+
+def fan_out(post_id):
+    """Push a new post to its author's followers. Returns the number of timelines reached."""
+    post = Post.objects.filter(pk=post_id).values('author_id', 'author__follower_count').first()
+    if post is None or post['author__follower_count'] > settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+        return 0
+    followers = (
+        Follow.objects.filter(author_id=post['author_id'])
+        .order_by('follower_id')
+        .values_list('follower_id', flat=True)
+    )
+    reached = 0
+    last_id = 0
+    while True:
+        batch = list(followers.filter(follower_id__gt=last_id)[:settings.TIMELINE_FANOUT_BATCH])
+        if not batch:
+            return reached
+        last_id = batch[-1]
+        push(batch, post_id)
+        reached += len(batch)
+
+
+def rebuild(user):
+    """Recompute ``user``'s timeline from the posts of the fanned-out authors they follow."""
+    followed = Follow.objects.filter(
+        follower=user, author__follower_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values('author')
+    post_ids = list(
+        Post.objects.filter(author__in=followed)
+        .order_by('-created_at', '-id')
+        .values_list('pk', flat=True)[:settings.TIMELINE_LENGTH]
+    )
+    store(user.pk, post_ids)
+    return post_ids
+
+
+def feed(user, queryset):
+    """
+    ``queryset`` narrowed to ``user``'s home feed: their timeline plus the
+    posts of followed authors too large to fan out.
+    """
+    post_ids = read(user.pk)
+    if post_ids is None:
+        post_ids = rebuild(user)
+    large_authors = Follow.objects.filter(
+        follower=user, author__follower_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values('author')
+    return queryset.filter(Q(pk__in=post_ids) | Q(author__in=large_authors))
@@ -1,14 +1,17 @@
 from django.urls import path,include
 from auth_app.views import *
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, UserViewSet, AdminCommentViewSet
+from .views import PostViewSet, CommentViewSet, UserViewSet, AdminCommentViewSet, FollowViewSet
+from .streams import post_events
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='posts')
 router.register(r'comments', CommentViewSet, basename='comments')
 router.register(r'admin/comments', AdminCommentViewSet, basename='admin-comment')
 router.register(r'users', UserViewSet, basename='users')
+router.register(r'follows', FollowViewSet, basename='follows')
 
 urlpatterns = [
+    path('events/', post_events, name='post-events'),
     path('',include(router.urls))
 ]
\ No newline at end of file
@@ -1,49 +1,76 @@
 from urllib import request
+import json
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import Post, Comment
+from .models import Post, PostLike, Comment, Follow
 from .serializers import *
+from . import events, feed_cache, moderation, ranking, read_counts, tasks, timelines
+from .search import SEARCH_FIELDS, FullTextSearchFilter, search_posts
+from .pagination import (
+    CommentPagination, FeedPagination, FollowPagination, ModerationQueuePagination,
+    PostKeysetPagination, TrendingPagination,
+)
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied
+from backend.fastjson import ORJSONParser
+from backend.throttling import WRITE_THROTTLES
 
 User = get_user_model()
 
-class PostPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser] 
-    pagination_class = PostPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'content', 'author__email']
+    pagination_class = PostKeysetPagination
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
+    search_fields = SEARCH_FIELDS
     ordering_fields = ['created_at', 'read_count', 'likes_count']
     ordering = ['-created_at']
+    max_batch_size = 100
+    # Rate-limited actions set their own scope (backend.throttling)
+    throttle_scope = None
 
     def perform_create(self, serializer):
-        return serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        tasks.submit(timelines.fan_out, post.pk)
+        return post
     
     def get_queryset(self):
-        queryset = Post.objects.all()
+        queryset = Post.objects.with_engagement(self.request.user)
         if self.action == 'list':
             if self.request.user.is_authenticated:
                 queryset = queryset.filter(~Q(author=self.request.user))
         
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        return feed_cache.serve(
+            request, lambda: super(PostViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return feed_cache.serve(
+            request, lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs),
+            post_id=kwargs['pk'],
+        )
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(feed_cache.stats(), status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_posts(self, request):
-        posts = Post.objects.filter(author=request.user).order_by('-created_at')
+        posts = Post.objects.with_engagement(request.user).filter(
+            author=request.user
+        ).order_by('-created_at')
         page = self.paginate_queryset(posts)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -51,31 +78,114 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['get', 'post'], parser_classes=[ORJSONParser, FormParser])
+    def batch(self, request):
+        if request.method == 'POST':
+            raw_ids = request.data.get('ids', [])
+            if isinstance(raw_ids, str):
+                raw_ids = raw_ids.split(',')
+        else:
+            raw_ids = request.query_params.get('ids', '').split(',')
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in raw_ids if str(pk).strip()))
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_batch_size:
+            return Response({
+                'error': f'At most {self.max_batch_size} ids can be fetched at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        posts = Post.objects.with_engagement(request.user).in_bulk(ids)
+        found = [posts[pk] for pk in ids if pk in posts]
+        serializer = self.get_serializer(found, many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in posts],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Posts by the authors the user follows, newest first (``blog_app.timelines``)."""
+        posts = timelines.feed(request.user, Post.objects.with_engagement(request.user))
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(posts.order_by('-created_at'), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Posts by time-decayed engagement (``blog_app.ranking``), hottest first."""
+        posts = Post.objects.with_engagement(request.user).order_by('-hot_score')
+        paginator = TrendingPagination()
+        page = paginator.paginate_queryset(posts, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        terms = request.query_params.get('q', '').strip()
+        if not terms:
+            return Response({'error': 'Query parameter q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        posts = search_posts(Post.objects.with_engagement(request.user), terms)
+        page = self.paginate_queryset(posts)
+        if page is not None:
+            serializer = PostSearchSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        serializer = PostSearchSerializer(posts, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(
+        detail=True, methods=['post'], permission_classes=[IsAuthenticated],
+        throttle_classes=WRITE_THROTTLES, throttle_scope='like',
+    )
     def like(self, request, pk):
         post = self.get_object()
-        user = request.user
-        if user in post.likes.all():
-            post.likes.remove(user)
-            return Response({'message': 'Post Unliked'}, status=status.HTTP_200_OK)
-        else:
-            post.likes.add(user)
-            return Response({'message': 'Post Liked'}, status=status.HTTP_200_OK)
+        like = PostLike.objects.filter(post=post, customuser=request.user)
+        with transaction.atomic():
+            transaction.on_commit(lambda: feed_cache.invalidate_posts([post.pk], ordering=['likes_count']))
+            transaction.on_commit(lambda: events.publish_likes(post.pk))
+            liked_at = like.select_for_update().values_list('created_at', flat=True).first()
+            if liked_at is not None:
+                like.delete()
+                # Dated to the like itself, so liking and unliking again
+                # leaves hot_score where it was
+                Post.objects.filter(pk=post.pk, likes_count__gt=0).update(
+                    likes_count=F('likes_count') - 1,
+                    hot_score=ranking.without_event('like', when=liked_at),
+                )
+                return Response({'message': 'Post Unliked'}, status=status.HTTP_200_OK)
+            try:
+                with transaction.atomic():
+                    created = PostLike.objects.create(post=post, customuser=request.user)
+            except IntegrityError:
+                # A concurrent request already liked the post and counted it
+                return Response({'message': 'Post Liked'}, status=status.HTTP_200_OK)
+            Post.objects.filter(pk=post.pk).update(
+                likes_count=F('likes_count') + 1,
+                hot_score=ranking.with_event('like', when=created.created_at),
+            )
+        return Response({'message': 'Post Liked'}, status=status.HTTP_200_OK)
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=True, methods=['post'], permission_classes=[IsAuthenticated],
+        throttle_classes=WRITE_THROTTLES, throttle_scope='read',
+    )
     def increment_read_count(self, request, pk):
-        post = self.get_object()
-        post.read_count += 1
-        post.save()
+        post = get_object_or_404(Post.objects.only('id', 'read_count'), pk=pk)
+        if read_counts.record_view(post.pk, viewer=request.user.pk):
+            events.publish_read_count(post.pk, post.read_count + read_counts.pending(post.pk))
         return Response({'message': 'Post read count incremented'}, status=status.HTTP_200_OK)
 
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CommentPagination
 
     def get_queryset(self):
-        queryset = Comment.objects.all()
+        queryset = Comment.objects.select_related('user')
         post_id = self.request.query_params.get('post')
         if post_id is not None:
             if self.request.user.is_authenticated:
@@ -85,6 +195,27 @@ class CommentViewSet(viewsets.ModelViewSet):
             else:
                 queryset = queryset.filter(post__id=post_id, is_approved=True).order_by('-created_at')
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        With ``?post=`` the post's visible comments come back as threads:
+        top-level comments, newest first (a page of them with
+        ``?pagination=cursor``), each with its replies nested oldest first.
+        Replies whose parent isn't visible are left out.
+        """
+        if request.query_params.get('post') is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_queryset()
+        top_level = queryset.filter(parent__isnull=True)
+        page = self.paginate_queryset(top_level)
+        roots = list(top_level) if page is None else page
+        replies = queryset.filter(thread__in=[root.pk for root in roots]).order_by('created_at', 'pk')
+        attach_replies(roots, replies)
+        serializer = ThreadedCommentSerializer(roots, many=True, context=self.get_serializer_context())
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
     
     def perform_create(self, serializer):
         post_id = self.request.data.get('post')
@@ -107,10 +238,26 @@ class CommentViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You are not allowed to delete this comment.")
         return super().destroy(request, *args, **kwargs)
 
+def attach_replies(roots, replies):
+    """Nest ``replies`` (oldest first) under ``roots`` as ``thread_replies``."""
+    visible = {}
+    for comment in roots:
+        comment.thread_replies = []
+        visible[comment.pk] = comment
+    for reply in replies:
+        # A parent is always older than its replies, so it has been seen
+        parent = visible.get(reply.parent_id)
+        if parent is not None:
+            reply.thread_replies = []
+            parent.thread_replies.append(reply)
+            visible[reply.pk] = reply
+
 class AdminCommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.filter(is_approved=False)
+    queryset = Comment.objects.filter(is_approved=False).select_related('user').order_by('-created_at')
     serializer_class = CommentSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = ModerationQueuePagination
+    bulk_chunk_size = 1000
 
     def destroy(self, request, *args, **kwargs):
         comment = self.get_object()
@@ -120,16 +267,93 @@ class AdminCommentViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk):
         comment = self.get_object()
         comment.is_approved = True
-        comment.save()
+        comment.save(update_fields=['is_approved'])
+        Post.objects.filter(pk=comment.post_id).update(hot_score=ranking.with_event('comment'))
+        events.publish_comments([comment])
         return Response({"message": "Comment approved"}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
     def block(self, request, pk):
         comment = self.get_object()
         comment.is_approved = False
-        comment.save()
+        comment.save(update_fields=['is_approved'])
         return Response({"message": "Comment blocked"}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """
+        Approve, block or delete every comment matching ``ids`` and/or the
+        post, user, is_approved and created_after/created_before filters.
+        With ``?stream=1`` the running total is streamed as one JSON line per
+        chunk, for selections too large to wait on.
+        """
+        serializer = BulkModerationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        selection = dict(serializer.validated_data)
+        action_name = selection.pop('action')
+        chunks = moderation.apply(moderation.select(**selection), action_name, self.bulk_chunk_size)
+
+        if request.query_params.get('stream') in ('1', 'true'):
+            def progress():
+                affected = 0
+                for count in chunks:
+                    affected += count
+                    yield json.dumps({'action': action_name, 'affected': affected, 'done': False}) + '\n'
+                yield json.dumps({'action': action_name, 'affected': affected, 'done': True}) + '\n'
+            return StreamingHttpResponse(progress(), content_type='application/x-ndjson')
+
+        return Response({'action': action_name, 'affected': sum(chunks)}, status=status.HTTP_200_OK)
+
+class FollowViewSet(viewsets.GenericViewSet):
+    """
+    ``GET /follows/`` lists the authors the user follows, ``POST /follows/``
+    with ``{"author": id}`` follows one and ``DELETE /follows/{author id}/``
+    unfollows. Either change drops the user's timeline so the next
+    ``/posts/feed/`` rebuilds it.
+    """
+    serializer_class = FollowSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FollowPagination
+    lookup_field = 'author'
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        return Follow.objects.filter(follower=self.request.user).select_related('author').order_by('-created_at')
+
+    def list(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author = serializer.validated_data['author']
+        if author == request.user:
+            return Response({'error': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(follower=request.user, author=author)
+            if created:
+                User.objects.filter(pk=author.pk).update(follower_count=F('follower_count') + 1)
+                transaction.on_commit(lambda: timelines.drop(request.user.pk))
+        return Response(
+            self.get_serializer(follow).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def destroy(self, request, author):
+        with transaction.atomic():
+            unfollowed, _ = Follow.objects.filter(follower=request.user, author_id=author).delete()
+            if unfollowed:
+                User.objects.filter(pk=author, follower_count__gt=0).update(
+                    follower_count=F('follower_count') - 1
+                )
+                transaction.on_commit(lambda: timelines.drop(request.user.pk))
+        if not unfollowed:
+            return Response({'error': 'You are not following this author'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
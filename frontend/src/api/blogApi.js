@@ -4,6 +4,11 @@ const blogApi = {
   getPosts: (params = {}) => axiosInstance.get('/blog/posts/', { params }),
   getPost: (id) => axiosInstance.get(`/blog/posts/${id}/`),
   getMyPost: (params = {}) => axiosInstance.get('/blog/posts/my_posts/', { params }),
+  getTrendingPosts: (params = {}) => axiosInstance.get('/blog/posts/trending/', { params }),
+  getFeed: (params = {}) => axiosInstance.get('/blog/posts/feed/', { params }),
+  getFollows: (params = {}) => axiosInstance.get('/blog/follows/', { params }),
+  followAuthor: (authorId) => axiosInstance.post('/blog/follows/', { author: authorId }),
+  unfollowAuthor: (authorId) => axiosInstance.delete(`/blog/follows/${authorId}/`),
   incrementReadCount: (id) => axiosInstance.post(`/blog/posts/${id}/increment_read_count/`),
   createPost: (data) => axiosInstance.post('/blog/posts/', data, {
     headers: { 'Content-Type': 'multipart/form-data' },
@@ -17,10 +22,15 @@ const blogApi = {
   createComment: (data) => axiosInstance.post('/blog/comments/', data),
   updateComment: (id, data) => axiosInstance.put(`/blog/comments/${id}/`, data),
   deleteComment: (id) => axiosInstance.delete(`/blog/admin/comments/${id}/`),
-  getPendingComments: () => axiosInstance.get('/blog/admin/comments/'),
+  getPendingComments: (params = {}) => axiosInstance.get('/blog/admin/comments/', { params }),
+  bulkModerateComments: (data) => axiosInstance.post('/blog/admin/comments/bulk/', data),
   approveComment: (id) => axiosInstance.post(`/blog/admin/comments/${id}/approve/`),
   blockComment: (id) => axiosInstance.post(`/blog/admin/comments/${id}/block/`),
   getUsers: (params = {}) => axiosInstance.get('/blog/users/', { params }),
+  subscribeToPosts: (ids) => new EventSource(
+    `${import.meta.env.VITE_API_URL}/blog/events/?posts=${ids.join(',')}`,
+    { withCredentials: true },
+  ),
 };
 
 export default blogApi;
\ No newline at end of file
@@ -7,6 +7,7 @@ const AdminDashboard = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
   const [comments, setComments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [users, setUsers] = useState([]);
   const [userFormData, setUserFormData] = useState({ email: '', first_name: '', last_name: '', is_staff: false });
   const [editUserId, setEditUserId] = useState(null);
@@ -26,8 +27,7 @@ const AdminDashboard = () => {
       try {
         if (activeTab === 'comments') {
           // CHANGED: Fetch pending comments from admin/comments endpoint
-          const response = await blogApi.getPendingComments();
-          setComments(response.data);
+          await loadPendingComments();
         } else if (activeTab === 'users') {
           const response = await blogApi.getUsers();
           setUsers(response.data);
@@ -41,11 +41,24 @@ const AdminDashboard = () => {
     fetchData();
   }, [user, navigate, activeTab]);
 
+  const loadPendingComments = async (cursor = null) => {
+    const response = await blogApi.getPendingComments(cursor ? { cursor } : {});
+    setComments((prev) => (cursor ? [...prev, ...response.data.results] : response.data.results));
+    setNextCursor(response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null);
+  };
+
+  const handleLoadMoreComments = async () => {
+    try {
+      await loadPendingComments(nextCursor);
+    } catch (err) {
+      setError('Failed to fetch comments');
+    }
+  };
+
   const handleApproveComment = async (id) => {
     try {
       await blogApi.approveComment(id);
-      const response = await blogApi.getPendingComments();
-      setComments(response.data);
+      await loadPendingComments();
     } catch (err) {
       setError('Failed to approve comment');
     }
@@ -54,13 +67,21 @@ const AdminDashboard = () => {
   const handleDeleteComment = async (id) => {
     try {
       await blogApi.deleteComment(id);
-      const response = await blogApi.getPendingComments();
-      setComments(response.data);
+      await loadPendingComments();
     } catch (err) {
       setError('Failed to delete comment');
     }
   };
 
+  const handleBulkComments = async (action) => {
+    try {
+      await blogApi.bulkModerateComments({ action, ids: comments.map((comment) => comment.id) });
+      await loadPendingComments();
+    } catch (err) {
+      setError(`Failed to ${action} comments`);
+    }
+  };
+
   // CHANGED: Added modal confirmation handler
   const openModal = (action, commentId) => {
     setModal({ isOpen: true, action, commentId });
@@ -76,6 +97,8 @@ const AdminDashboard = () => {
         await handleApproveComment(modal.commentId);
       } else if (modal.action === 'delete') {
         await handleDeleteComment(modal.commentId);
+      } else if (modal.action === 'approve all' || modal.action === 'delete all') {
+        await handleBulkComments(modal.action.split(' ')[0]);
       }
       closeModal();
     } catch (err) {
@@ -122,7 +145,25 @@ const AdminDashboard = () => {
 
         {activeTab === 'comments' && (
           <>
-            <h2 className="text-2xl font-light text-slate-800 mb-4">Pending Comments</h2>
+            <div className="flex items-center justify-between mb-4">
+              <h2 className="text-2xl font-light text-slate-800">Pending Comments</h2>
+              {comments.length > 0 && (
+                <div className="flex space-x-4">
+                  <button
+                    onClick={() => openModal('approve all', null)}
+                    className="text-green-600 hover:text-green-800"
+                  >
+                    Approve all shown
+                  </button>
+                  <button
+                    onClick={() => openModal('delete all', null)}
+                    className="text-red-600 hover:text-red-800"
+                  >
+                    Delete all shown
+                  </button>
+                </div>
+              )}
+            </div>
             <div className="grid gap-6">
               {comments.length > 0 ? (
                 comments.map((comment) => (
@@ -151,6 +192,14 @@ const AdminDashboard = () => {
                 <p className="text-slate-600">No pending comments.</p>
               )}
             </div>
+            {nextCursor && (
+              <button
+                onClick={handleLoadMoreComments}
+                className="mt-6 px-4 py-2 bg-slate-200 text-slate-800 rounded-lg hover:bg-slate-300"
+              >
+                Load more
+              </button>
+            )}
           </>
         )}
 
@@ -174,10 +223,12 @@ const AdminDashboard = () => {
           <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
             <div className="bg-white p-6 rounded-lg shadow-lg max-w-sm w-full">
               <h3 className="text-lg font-medium text-slate-800 mb-4">
-                Confirm {modal.action === 'approve' ? 'Approval' : 'Deletion'}
+                Confirm {modal.action.startsWith('approve') ? 'Approval' : 'Deletion'}
               </h3>
               <p className="text-slate-600 mb-6">
-                Are you sure you want to {modal.action} this comment?
+                {modal.commentId
+                  ? `Are you sure you want to ${modal.action} this comment?`
+                  : `Are you sure you want to ${modal.action.split(' ')[0]} all ${comments.length} shown comments?`}
               </p>
               <div className="flex justify-end space-x-4">
                 <button
@@ -189,12 +240,12 @@ const AdminDashboard = () => {
                 <button
                   onClick={confirmAction}
                   className={`px-4 py-2 rounded-lg ${
-                    modal.action === 'approve'
+                    modal.action.startsWith('approve')
                       ? 'bg-green-600 text-white hover:bg-green-700'
                       : 'bg-red-600 text-white hover:bg-red-700'
                   }`}
                 >
-                  {modal.action === 'approve' ? 'Approve' : 'Delete'}
+                  {modal.action.startsWith('approve') ? 'Approve' : 'Delete'}
                 </button>
               </div>
             </div>
@@ -266,11 +266,19 @@ const MyPosts = () => {
                   <article key={post.id} className="bg-white p-6 rounded-lg shadow-sm border border-slate-200 hover:shadow-md transition-shadow duration-200">
                     {post.image_url && (
                       <div className="w-full h-48 bg-slate-100 mb-4">
-                        <img
-                          src={post.image_url}
-                          alt={post.title}
-                          className="w-full h-full object-contain bg-white rounded-lg"
-                        />
+                        <picture>
+                          {post.image_renditions?.sources.map((source) => (
+                            <source key={source.type} type={source.type} srcSet={source.srcset} sizes="(max-width: 768px) 100vw, 768px" />
+                          ))}
+                          <img
+                            src={post.image_renditions?.feed ?? post.image_url}
+                            srcSet={post.image_renditions?.srcset}
+                            sizes="(max-width: 768px) 100vw, 768px"
+                            loading="lazy"
+                            alt={post.title}
+                            className="w-full h-full object-contain bg-white rounded-lg"
+                          />
+                        </picture>
                       </div>
                     )}
                     <h2 className="text-xl font-medium text-slate-800 mb-2">{post.title}</h2>
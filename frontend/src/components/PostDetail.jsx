@@ -3,6 +3,26 @@ import { useParams, useNavigate, Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import blogApi from '../api/blogApi';
 
+// Threads come back nested under `replies`; render them depth-first
+const flattenThreads = (comments, depth = 0) =>
+  comments.flatMap((comment) => [
+    { comment, depth },
+    ...flattenThreads(comment.replies || [], depth + 1),
+  ]);
+
+// Put a newly approved comment into the thread tree, once
+const insertComment = (comments, comment) => {
+  if (flattenThreads(comments).some((entry) => entry.comment.id === comment.id)) return comments;
+  if (!comment.parent) return [comment, ...comments];
+  const attach = (list) =>
+    list.map((item) =>
+      item.id === comment.parent
+        ? { ...item, replies: [...(item.replies || []), comment] }
+        : { ...item, replies: attach(item.replies || []) }
+    );
+  return attach(comments);
+};
+
 const PostDetail = () => {
   const { id } = useParams();
   const { user } = useAuth();
@@ -58,6 +78,22 @@ const PostDetail = () => {
     readCountIncremented.current = false;
   }, [id]);
 
+  // Live likes, read counts and newly approved comments
+  useEffect(() => {
+    if (!user) return undefined;
+    const source = blogApi.subscribeToPosts([id]);
+    const update = (fields) => setPost((prev) => (prev ? { ...prev, ...fields } : prev));
+    source.addEventListener('likes', (e) => update(JSON.parse(e.data).data));
+    source.addEventListener('read_count', (e) => update(JSON.parse(e.data).data));
+    // The server's recount is the only source of comment_count
+    source.addEventListener('comment_count', (e) => update(JSON.parse(e.data).data));
+    source.addEventListener('comment', (e) => {
+      const comment = { ...JSON.parse(e.data).data, replies: [] };
+      setComments((prev) => insertComment(prev, comment));
+    });
+    return () => source.close();
+  }, [id, user]);
+
   const validateForm = (data) => {
     const errors = {};
     const titleRegex = /^[a-zA-Z0-9]/;
@@ -449,7 +485,7 @@ const PostDetail = () => {
                 )}
               </div>
             )}
-            <h2 className="text-2xl font-light text-slate-800 mb-4">Comments</h2>
+            <h2 className="text-2xl font-light text-slate-800 mb-4">Comments ({post.comment_count})</h2>
             {user && !isOwnPost ? (
               <form onSubmit={handleCommentSubmit} className="mb-6">
                 <textarea
@@ -485,8 +521,12 @@ const PostDetail = () => {
               </p>
             )}
             <div className="space-y-4">
-              {comments.map((comment) => (
-                <div key={comment.id} className="bg-white p-4 rounded-lg shadow-sm border border-slate-200">
+              {flattenThreads(comments).map(({ comment, depth }) => (
+                <div
+                  key={comment.id}
+                  className="bg-white p-4 rounded-lg shadow-sm border border-slate-200"
+                  style={{ marginLeft: `${Math.min(depth, 4) * 1.5}rem` }}
+                >
                   {editCommentId === comment.id ? (
                     <form onSubmit={(e) => handleUpdateComment(e, comment.id)} className="mb-4">
                       <textarea
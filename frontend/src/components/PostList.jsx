@@ -74,11 +74,19 @@ const PostList = () => {
               <article key={post.id} className="bg-white rounded-lg shadow-sm border border-slate-200 overflow-hidden hover:shadow-md transition-shadow duration-200">
                 {post.image_url && (
                   <div className="w-full h-64 bg-slate-100">
-                    <img 
-                      src={post.image_url} 
-                      alt={post.title} 
-                      className="w-full h-full object-contain bg-white"
-                    />
+                    <picture>
+                      {post.image_renditions?.sources.map((source) => (
+                        <source key={source.type} type={source.type} srcSet={source.srcset} sizes="(max-width: 768px) 100vw, 768px" />
+                      ))}
+                      <img
+                        src={post.image_renditions?.feed ?? post.image_url}
+                        srcSet={post.image_renditions?.srcset}
+                        sizes="(max-width: 768px) 100vw, 768px"
+                        loading="lazy"
+                        alt={post.title}
+                        className="w-full h-full object-contain bg-white"
+                      />
+                    </picture>
                   </div>
                 )}
                 
@@ -95,6 +103,7 @@ const PostList = () => {
                     <div className="flex items-center space-x-4">
                       <span>Views: {post.read_count}</span>
                       <span>Likes: {post.likes_count}</span>
+                      <span>Comments: {post.comment_count}</span>
                     </div>
                   </div>
                   